@@ -77,3 +77,14 @@ class UserProfileForm(forms.ModelForm):
                 'placeholder': 'Email Address'
             }),
         }
+
+
+class ExamAccessCodeForm(forms.Form):
+    access_code = forms.CharField(
+        max_length=64,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Enter your exam access code',
+            'autocomplete': 'off',
+        })
+    )
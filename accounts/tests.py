@@ -0,0 +1,98 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from exams.access_codes import redeem_access_code
+from exams.models import MockExam
+
+
+class ImportCandidatesTests(TestCase):
+    """Imported candidates are normalized, and clash with existing accounts whatever the case"""
+
+    def import_csv(self, content):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w') as csv_file:
+            csv_file.write(content)
+        call_command('import_candidates', path, workers=1, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_duplicates_found_case_insensitively(self):
+        User.objects.create_user('Existing', 'Taken@Example.com', 'password')
+        self.import_csv(
+            'username,email,password\n'
+            'existing,other@example.com,secret\n'
+            'someone,taken@EXAMPLE.com,secret\n'
+            'Fresh,Fresh@EXAMPLE.COM,secret\n'
+            'fresh2,fresh@example.com,secret\n'
+        )
+        self.assertEqual(
+            list(User.objects.exclude(username='Existing').values_list('username', 'email')),
+            [('Fresh', 'fresh@example.com')],
+        )
+
+    def test_duplicates_found_in_every_lookup_chunk(self):
+        User.objects.create_user('first', 'first@example.com', 'password')
+        User.objects.create_user('last', 'last@example.com', 'password')
+        rows = ''.join(f'new{number},new{number}@example.com,secret\n' for number in range(4))
+        with mock.patch('accounts.management.commands.import_candidates.LOOKUP_CHUNK_SIZE', 2):
+            with CaptureQueriesContext(connection) as queries:
+                self.import_csv('username,email,password\nFIRST,a@example.com,secret\n' + rows + 'b,LAST@example.com,secret\n')
+        # Six candidates, two per lookup; the clashes sit in the first and the last chunk
+        lookups = [query for query in queries.captured_queries if 'LOWER(' in query['sql']]
+        self.assertEqual(len(lookups), 3)
+        self.assertEqual(
+            sorted(User.objects.exclude(username__in=['first', 'last']).values_list('username', flat=True)),
+            [f'new{number}' for number in range(4)],
+        )
+
+
+class AccessCodeLoginTests(TestCase):
+    """Exam-day access codes sign a candidate in once, and only while they are valid"""
+
+    def setUp(self):
+        self.exam = MockExam.objects.create(name='Mock')
+        self.user = User.objects.create_user('candidate', 'candidate@example.com', 'password')
+
+    def issue(self, *args):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command('issue_access_codes', self.exam.id, '--users', 'candidate', '--output', path, *args, stderr=io.StringIO())
+        with open(path, newline='') as csv_file:
+            return next(csv.DictReader(csv_file))['access_code']
+
+    def login(self, code):
+        return self.client.post('/accounts/exam-login/', {'access_code': code})
+
+    def test_code_signs_in_once(self):
+        code = self.issue()
+        response = self.login(code)
+        self.assertRedirects(response, f'/exams/start/{self.exam.id}/', fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.id)
+
+        self.client.logout()
+        self.assertEqual(self.login(code).status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_expired_code_refused(self):
+        code = self.issue('--valid-from', (timezone.now() - timedelta(hours=2)).isoformat(), '--hours', '1')
+        with self.assertNumQueries(0):
+            self.assertIsNone(redeem_access_code(code))
+        self.assertEqual(self.login(code).status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_forged_code_refused_without_queries(self):
+        code_id, until, _ = self.issue().split('-')
+        later = int(until) + 3600
+        with self.assertNumQueries(0):
+            self.assertIsNone(redeem_access_code(f'{code_id}-{later}-0123456789abcdef'))
@@ -1,8 +1,8 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth import login
+from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .forms import CustomUserCreationForm, UserProfileForm
+from .forms import CustomUserCreationForm, UserProfileForm, ExamAccessCodeForm
 
 
 def signup(request):
@@ -21,6 +21,21 @@ def signup(request):
     return render(request, 'accounts/signup.html', {'form': form})
 
 
+def exam_login(request):
+    """Exam-day login with a single-use access code (no password hashing)"""
+    if request.method == 'POST':
+        form = ExamAccessCodeForm(request.POST)
+        if form.is_valid():
+            user = authenticate(request, access_code=form.cleaned_data['access_code'])
+            if user:
+                login(request, user)
+                return redirect('exams:start_exam', exam_id=request.exam_access_code.exam_id)
+            messages.error(request, 'This access code is invalid, expired or already used.')
+    else:
+        form = ExamAccessCodeForm()
+    return render(request, 'accounts/exam_login.html', {'form': form})
+
+
 @login_required
 def profile(request):
     """Enhanced user profile view with edit functionality"""
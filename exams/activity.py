@@ -0,0 +1,100 @@
+"""
+Coalesced recording of candidate activity.
+
+Auto-save calls only refresh ``ExamAttempt.last_activity`` and
+``SectionAttempt.current_question_index``. Those values are buffered in
+process memory and written in bulk with ``bulk_update`` on just those
+columns by a background thread in each worker, every
+``EXAM_ACTIVITY_FLUSH_INTERVAL`` seconds, so an idle worker does not sit
+on its buffer until the next request. The buffer is flushed once more
+when the worker exits normally; only a crash loses it, which only makes
+``last_activity`` slightly older.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import ExamAttempt, SectionAttempt
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending_activity = {}  # exam_attempt_id -> last activity timestamp
+_pending_progress = {}  # section_attempt_id -> current question index
+
+
+def record_activity(exam_attempt_id, section_attempt_id=None, question_index=None):
+    """Buffer an activity signal for the next flush"""
+    with _lock:
+        _pending_activity[exam_attempt_id] = timezone.now()
+        if section_attempt_id is not None and question_index is not None:
+            _pending_progress[section_attempt_id] = question_index
+    
+    if getattr(settings, 'EXAM_ACTIVITY_FLUSH_INTERVAL', 60):
+        start_activity_flusher()
+    else:
+        flush_activity()
+
+
+def flush_activity():
+    """Write all buffered activity with one bulk UPDATE per table"""
+    with _lock:
+        activity = dict(_pending_activity)
+        progress = dict(_pending_progress)
+        _pending_activity.clear()
+        _pending_progress.clear()
+    
+    if activity:
+        ExamAttempt.objects.bulk_update(
+            [ExamAttempt(id=attempt_id, last_activity=when) for attempt_id, when in activity.items()],
+            ['last_activity'],
+            batch_size=500,
+        )
+    if progress:
+        SectionAttempt.objects.bulk_update(
+            [SectionAttempt(id=attempt_id, current_question_index=index) for attempt_id, index in progress.items()],
+            ['current_question_index'],
+            batch_size=500,
+        )
+    return len(activity), len(progress)
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+_stopped = threading.Event()
+
+
+def start_activity_flusher():
+    """Start this process's background flush thread once, and flush again at exit"""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            interval = getattr(settings, 'EXAM_ACTIVITY_FLUSH_INTERVAL', 60)
+            _flusher = threading.Thread(target=run_activity_flusher, args=(interval,), name='activity-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(stop_activity_flusher)
+
+
+def run_activity_flusher(interval):
+    while not _stopped.wait(interval):
+        try:
+            flush_activity()
+        except Exception:
+            logger.exception("Flushing buffered activity failed; will retry")
+        finally:
+            close_old_connections()
+
+
+def stop_activity_flusher():
+    """Stop the flush thread and write what is still buffered; runs at interpreter exit"""
+    _stopped.set()
+    try:
+        flush_activity()
+    except Exception:
+        logger.exception("Flushing buffered activity at exit failed")
@@ -1,19 +1,80 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from django.db.models import Count, Avg
+from django.utils import timezone
+from django.db import IntegrityError
+from django.db.models import Count, Avg, Prefetch, Q, Case, When, F, FloatField
 from .models import (
     ExamSection, Question, QuestionOption, MockExam, 
-    ExamAttempt, SectionAttempt, UserAnswer, ExamConfiguration
+    ExamAttempt, SectionAttempt, UserAnswer, ExamConfiguration, ExamAccessCode,
+    MockExamSection, QuestionBankVersion, BackgroundTask, ArchivedAttempt
 )
+from .answers import bump_answer_revisions
+from .archive import rehydrate_attempt, restore_attempt
+from .bank import attempt_answer_key, publish_question_bank
+from .counters import fields_without_counters
+from .packed import is_packed, section_selections
+
+
+def packed_answer_rows(section_attempt):
+    """Unsaved UserAnswer instances for the packed answers of a section attempt, for display"""
+    selections = section_selections(section_attempt)
+    answer_key = attempt_answer_key(section_attempt.exam_attempt)
+    options = QuestionOption.objects.in_bulk(list(selections.values()))
+    answers = []
+    for question_id, option_id in selections.items():
+        answer = UserAnswer(section_attempt=section_attempt, question_id=question_id, selected_option=options.get(option_id))
+        answer.is_correct, answer.points_earned = answer_key.get(question_id).score(option_id)
+        answers.append(answer)
+    return answers
+
+
+def section_attempts_table(attempts):
+    """Per-section scores of an attempt as an HTML table"""
+    if not attempts:
+        return "No section attempts yet"
+    
+    html = "<table style='width:100%; border-collapse: collapse;'>"
+    html += "<tr style='background-color: #f0f0f0;'><th>Section</th><th>Score</th><th>Questions Correct</th><th>Completed</th></tr>"
+    
+    for attempt in attempts:
+        html += f"<tr>"
+        html += f"<td>{attempt.section.display_name}</td>"
+        html += f"<td>{attempt.score or 'N/A'}/{attempt.max_possible_score or 'N/A'}</td>"
+        html += f"<td>{attempt.questions_correct}/{attempt.questions_answered}</td>"
+        html += f"<td>{'Yes' if attempt.is_completed else 'No'}</td>"
+        html += f"</tr>"
+    
+    html += "</table>"
+    return mark_safe(html)
 
 
 class QuestionOptionInline(admin.TabularInline):
     model = QuestionOption
     extra = 4
     max_num = 4
-    fields = ['option_letter', 'option_text', 'is_correct']
+    fields = ['option_letter', 'option_text', 'is_correct', 'pick_count']
+    readonly_fields = ['pick_count']
+
+
+class MockExamSectionInline(admin.TabularInline):
+    model = MockExamSection
+    extra = 0
+    fields = ['position', 'section']
+    ordering = ['position']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('exam', 'section')
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'section':
+            # Every inline row offers the same sections; evaluate the choices once per request
+            if not hasattr(request, '_exam_section_choices'):
+                request._exam_section_choices = list(field.choices)
+            field.choices = request._exam_section_choices
+        return field
 
 
 @admin.register(ExamSection)
@@ -30,25 +91,37 @@ class ExamSectionAdmin(admin.ModelAdmin):
         ('Scoring Configuration', {
             'fields': ('duration_minutes', 'max_score', 'min_pass_score', 'has_negative_marking')
         }),
+        ('Paper', {
+            'fields': ('questions_per_paper',)
+        }),
         ('Instructions', {
             'fields': ('instructions',),
             'classes': ('collapse',)
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_question_count=Count('questions', filter=Q(questions__is_active=True))
+        )
+    
     def question_count(self, obj):
-        count = obj.questions.filter(is_active=True).count()
         url = reverse('admin:exams_question_changelist') + f'?section__id__exact={obj.id}'
-        return format_html('<a href="{}">{} questions</a>', url, count)
+        return format_html('<a href="{}">{} questions</a>', url, obj.active_question_count)
     question_count.short_description = 'Active Questions'
+    question_count.admin_order_field = 'active_question_count'
 
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ['question_preview', 'section', 'difficulty', 'points', 'negative_points', 'is_active', 'created_at']
+    list_display = [
+        'question_preview', 'section', 'difficulty', 'points', 'negative_points', 'is_active',
+        'times_served', 'times_answered', 'times_correct', 'correct_rate', 'created_at'
+    ]
     list_filter = ['section', 'difficulty', 'is_active', 'created_at']
     search_fields = ['question_text']
     ordering = ['section', '-created_at']
+    list_select_related = ['section']
     inlines = [QuestionOptionInline]
     
     fieldsets = (
@@ -62,17 +135,52 @@ class QuestionAdmin(admin.ModelAdmin):
             'fields': ('explanation', 'created_by'),
             'classes': ('collapse',)
         }),
+        ('Answer Statistics', {
+            'fields': ('times_served', 'times_answered', 'times_correct', 'correct_rate'),
+            'classes': ('collapse',)
+        }),
     )
+    readonly_fields = ['times_served', 'times_answered', 'times_correct', 'correct_rate']
+    
+    def get_queryset(self, request):
+        # The counters are columns, so the rate is computed in the list query and sortable
+        return super().get_queryset(request).annotate(
+            answer_correct_rate=Case(
+                When(times_answered__gt=0, then=F('times_correct') * 100.0 / F('times_answered')),
+                default=None,
+                output_field=FloatField(),
+            )
+        )
     
     def question_preview(self, obj):
         preview = obj.question_text[:100] + "..." if len(obj.question_text) > 100 else obj.question_text
         return preview
     question_preview.short_description = 'Question'
     
+    def correct_rate(self, obj):
+        rate = getattr(obj, 'answer_correct_rate', None)
+        return f"{rate:.1f}%" if rate is not None else "-"
+    correct_rate.short_description = 'Correct %'
+    correct_rate.admin_order_field = 'answer_correct_rate'
+    
     def save_model(self, request, obj, form, change):
         if not change:  # If creating new question
             obj.created_by = request.user
-        super().save_model(request, obj, form, change)
+            super().save_model(request, obj, form, change)
+        else:
+            # Answers move the counters while the form is open; saving them back would undo those increments
+            obj.save(update_fields=fields_without_counters(obj))
+    
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not QuestionOption:
+            return super().save_formset(request, form, formset, change)
+        for option in formset.save(commit=False):
+            if option.pk:
+                option.save(update_fields=fields_without_counters(option))
+            else:
+                option.save()
+        for option in formset.deleted_objects:
+            option.delete()
 
 
 @admin.register(MockExam)
@@ -80,10 +188,17 @@ class MockExamAdmin(admin.ModelAdmin):
     list_display = ['name', 'sections_list', 'total_duration_display', 'is_active', 'attempt_count', 'created_at']
     list_filter = ['is_active', 'created_at', 'sections']
     search_fields = ['name', 'description']
-    filter_horizontal = ['sections']
+    inlines = [MockExamSectionInline]
+    actions = ['publish_bank']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'sections',
+            Prefetch('section_plan', queryset=MockExamSection.objects.select_related('section')),
+        ).annotate(attempt_total=Count('examattempt', distinct=True))
     
     def sections_list(self, obj):
-        return ", ".join([section.display_name for section in obj.sections.all()])
+        return ", ".join([entry.section.display_name for entry in obj.section_plan.all()])
     sections_list.short_description = 'Sections'
     
     def total_duration_display(self, obj):
@@ -91,10 +206,44 @@ class MockExamAdmin(admin.ModelAdmin):
     total_duration_display.short_description = 'Total Duration'
     
     def attempt_count(self, obj):
-        count = obj.examattempt_set.count()
         url = reverse('admin:exams_examattempt_changelist') + f'?exam__id__exact={obj.id}'
-        return format_html('<a href="{}">{} attempts</a>', url, count)
+        return format_html('<a href="{}">{} attempts</a>', url, obj.attempt_total)
     attempt_count.short_description = 'Attempts'
+    attempt_count.admin_order_field = 'attempt_total'
+    
+    def publish_bank(self, request, queryset):
+        for exam in queryset:
+            version, created = publish_question_bank(exam, request.user)
+            if created:
+                self.message_user(request, f"Published {version}: {version.question_count} questions.")
+            else:
+                self.message_user(request, f"{exam.name}: no changes since {version}.")
+    publish_bank.short_description = 'Publish question bank for new attempts'
+
+
+@admin.register(QuestionBankVersion)
+class QuestionBankVersionAdmin(admin.ModelAdmin):
+    list_display = ['exam', 'number', 'question_count', 'published_at', 'published_by', 'attempt_count']
+    list_filter = ['exam', 'published_at']
+    list_select_related = ['exam', 'published_by']
+    readonly_fields = ['exam', 'number', 'question_count', 'checksum', 'published_at', 'published_by']
+    exclude = ['payload']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('payload').annotate(attempt_total=Count('examattempt'))
+    
+    def attempt_count(self, obj):
+        return obj.attempt_total
+    attempt_count.short_description = 'Pinned attempts'
+    attempt_count.admin_order_field = 'attempt_total'
+    
+    def has_add_permission(self, request):
+        # Versions are created by the publish action on mock exams
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        # Published versions are immutable
+        return False
 
 
 @admin.register(ExamAttempt)
@@ -102,12 +251,13 @@ class ExamAttemptAdmin(admin.ModelAdmin):
     list_display = ['user', 'exam', 'status', 'total_score', 'percentage_score', 'passed', 'start_time', 'duration_display']
     list_filter = ['status', 'passed', 'exam', 'start_time']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'exam__name']
-    readonly_fields = ['created_at', 'duration_display', 'section_attempts_summary']
+    readonly_fields = ['created_at', 'duration_display', 'section_attempts_summary', 'bank_version']
     ordering = ['-created_at']
+    list_select_related = ['user', 'exam']
     
     fieldsets = (
         ('Exam Information', {
-            'fields': ('user', 'exam', 'status', 'current_section')
+            'fields': ('user', 'exam', 'status', 'current_section', 'bank_version')
         }),
         ('Timing', {
             'fields': ('start_time', 'end_time', 'duration_display', 'created_at')
@@ -136,23 +286,7 @@ class ExamAttemptAdmin(admin.ModelAdmin):
     duration_display.short_description = 'Duration'
     
     def section_attempts_summary(self, obj):
-        attempts = obj.section_attempts.all()
-        if not attempts:
-            return "No section attempts yet"
-        
-        html = "<table style='width:100%; border-collapse: collapse;'>"
-        html += "<tr style='background-color: #f0f0f0;'><th>Section</th><th>Score</th><th>Questions Correct</th><th>Completed</th></tr>"
-        
-        for attempt in attempts:
-            html += f"<tr>"
-            html += f"<td>{attempt.section.display_name}</td>"
-            html += f"<td>{attempt.score or 'N/A'}/{attempt.max_possible_score or 'N/A'}</td>"
-            html += f"<td>{attempt.questions_correct}/{attempt.questions_answered}</td>"
-            html += f"<td>{'Yes' if attempt.is_completed else 'No'}</td>"
-            html += f"</tr>"
-        
-        html += "</table>"
-        return mark_safe(html)
+        return section_attempts_table(obj.section_attempts.select_related('section'))
     section_attempts_summary.short_description = 'Section Performance'
 
 
@@ -162,6 +296,7 @@ class SectionAttemptAdmin(admin.ModelAdmin):
     list_filter = ['section', 'is_completed', 'start_time']
     search_fields = ['exam_attempt__user__username', 'section__display_name']
     readonly_fields = ['answers_summary']
+    list_select_related = ['exam_attempt__user', 'section']
     
     def user_display(self, obj):
         return obj.exam_attempt.user.username
@@ -175,7 +310,10 @@ class SectionAttemptAdmin(admin.ModelAdmin):
     score_display.short_description = 'Score'
     
     def answers_summary(self, obj):
-        answers = obj.answers.all()
+        if is_packed(obj):
+            answers = packed_answer_rows(obj)
+        else:
+            answers = obj.answers.select_related('selected_option')
         if not answers:
             return "No answers recorded"
         
@@ -184,7 +322,7 @@ class SectionAttemptAdmin(admin.ModelAdmin):
         
         for answer in answers:
             html += f"<tr>"
-            html += f"<td>Q{answer.question.id}</td>"
+            html += f"<td>Q{answer.question_id}</td>"
             html += f"<td>{answer.selected_option.option_letter if answer.selected_option else 'Not answered'}</td>"
             html += f"<td>{'✓' if answer.is_correct else '✗' if answer.is_correct is not None else '-'}</td>"
             html += f"<td>{answer.points_earned}</td>"
@@ -200,14 +338,97 @@ class UserAnswerAdmin(admin.ModelAdmin):
     list_display = ['user_display', 'question_display', 'selected_option', 'is_correct', 'points_earned', 'answered_at']
     list_filter = ['is_correct', 'answered_at', 'question__section']
     search_fields = ['section_attempt__exam_attempt__user__username', 'question__question_text']
+    list_select_related = ['section_attempt__exam_attempt__user', 'question__section', 'selected_option__question__section']
     
     def user_display(self, obj):
         return obj.section_attempt.exam_attempt.user.username
     user_display.short_description = 'User'
     
     def question_display(self, obj):
-        return f"Q{obj.question.id} ({obj.question.section.display_name})"
+        return f"Q{obj.question_id} ({obj.question.section.display_name})"
     question_display.short_description = 'Question'
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_answer_revisions([obj.section_attempt_id])
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_answer_revisions([obj.section_attempt_id])
+    
+    def delete_queryset(self, request, queryset):
+        section_attempt_ids = set(queryset.values_list('section_attempt_id', flat=True))
+        super().delete_queryset(request, queryset)
+        bump_answer_revisions(section_attempt_ids)
+
+
+@admin.register(ArchivedAttempt)
+class ArchivedAttemptAdmin(admin.ModelAdmin):
+    list_display = ['user', 'exam', 'status', 'total_score', 'percentage_score', 'passed', 'end_time', 'archived_at']
+    list_filter = ['status', 'passed', 'exam', 'archived_at']
+    search_fields = ['user__username', 'user__first_name', 'user__last_name', 'exam__name']
+    list_select_related = ['user', 'exam']
+    readonly_fields = [
+        'attempt_id', 'user', 'exam', 'status', 'start_time', 'end_time', 'total_score', 'percentage_score',
+        'passed', 'archive_file', 'offset', 'length', 'archived_at', 'archived_sections',
+    ]
+    actions = ['restore_attempts']
+    
+    def archived_sections(self, obj):
+        # Read back from the archive file only on the change page
+        try:
+            _, section_attempts = rehydrate_attempt(obj)
+        except OSError as exc:
+            return f"Archive file unavailable: {exc}"
+        return section_attempts_table(section_attempts)
+    archived_sections.short_description = 'Section Performance'
+    
+    def has_add_permission(self, request):
+        # Summaries are created by manage.py archive_attempts
+        return False
+    
+    def restore_attempts(self, request, queryset):
+        restored = 0
+        for archived in queryset:
+            try:
+                restore_attempt(archived)
+                restored += 1
+            except (OSError, IntegrityError) as exc:
+                self.message_user(request, f"Could not restore {archived}: {exc}", level=messages.ERROR)
+        self.message_user(request, f"Restored {restored} attempt(s) to the live tables.")
+    restore_attempts.short_description = 'Restore to live tables'
+
+
+@admin.register(ExamAccessCode)
+class ExamAccessCodeAdmin(admin.ModelAdmin):
+    list_display = ['user', 'exam', 'valid_from', 'valid_until', 'used_at', 'created_at']
+    list_filter = ['exam', 'valid_from']
+    search_fields = ['user__username', 'user__email']
+    list_select_related = ['user', 'exam']
+    readonly_fields = ['used_at', 'created_at']
+
+
+@admin.register(BackgroundTask)
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_after', 'duration_ms', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'idempotency_key']
+    readonly_fields = [
+        'name', 'kwargs', 'idempotency_key', 'attempts', 'locked_by', 'locked_at', 'last_error',
+        'created_at', 'started_at', 'finished_at', 'duration_ms',
+    ]
+    actions = ['retry_tasks']
+    
+    def has_add_permission(self, request):
+        # Tasks are created by exams code through exams.tasks.defer
+        return False
+    
+    def retry_tasks(self, request, queryset):
+        count = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_after=timezone.now(), finished_at=None
+        )
+        self.message_user(request, f"Queued {count} failed task(s) again.")
+    retry_tasks.short_description = 'Retry failed tasks'
 
 
 @admin.register(ExamConfiguration)
@@ -0,0 +1,213 @@
+"""
+Admission control for exam-start bursts.
+
+An exam with an ``admission_cap`` lets at most that many candidates take it
+at once. Each admitted candidate holds one of ``admission_cap`` slots in the
+cache: a key written with ``cache.add`` and kept alive by the exam
+heartbeat for ``EXAM_ADMISSION_LEASE`` seconds at a time. The slot is
+released when the candidate submits the exam, and lapses on its own when
+their heartbeats stop (closed tab, lost connection), so candidates who
+never come back do not hold a place.
+
+Candidates without an attempt who reach ``take_exam`` while every slot is
+held draw a ticket and wait on the waiting-room page, which polls
+``queue_status`` through a public, cacheable endpoint that never touches
+the database. Tickets up to ``admitted + free slots`` may try to take a
+slot. When slots stay free for ``STALL_WINDOWS`` polling windows, the
+candidates ahead have left the queue, and every ticket may try.
+
+Slots are held in the candidate's name (their user id), so a candidate
+resuming an attempt, even from another device, takes their own slot back
+instead of a second one.
+
+Slots and counters must be visible to every worker, so admission needs a
+shared cache (Memcached, Redis) configured as ``EXAM_ADMISSION_CACHE``; the
+``exams.E001`` system check rejects a local-memory cache unless
+``EXAM_ADMISSION_ALLOW_LOCAL_CACHE`` is set for a single-process setup.
+"""
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .cacheutil import incr
+
+# Polling windows a free slot may go unclaimed before the whole queue may try for it
+STALL_WINDOWS = 3
+
+
+def _cache():
+    return caches[getattr(settings, 'EXAM_ADMISSION_CACHE', 'default')]
+
+
+def _key(exam_id, name):
+    return f'exams:admission:{exam_id}:{name}'
+
+
+def _slot_keys(exam_id, cap):
+    return [_key(exam_id, f'slot:{index}') for index in range(cap)]
+
+
+def _window():
+    return getattr(settings, 'EXAM_ADMISSION_WINDOW', 10)
+
+
+def _ttl():
+    return getattr(settings, 'EXAM_ADMISSION_TTL', 6 * 3600)
+
+
+def _lease():
+    return getattr(settings, 'EXAM_ADMISSION_LEASE', 300)
+
+
+def check_admission_cache(app_configs=None, **kwargs):
+    """System check: admission slots need a cache every worker shares"""
+    if isinstance(_cache(), LocMemCache) and not getattr(settings, 'EXAM_ADMISSION_ALLOW_LOCAL_CACHE', False):
+        return [checks.Error(
+            "Exam admission control is configured on a local-memory cache, which each worker keeps to itself.",
+            hint="Point EXAM_ADMISSION_CACHE at Memcached or Redis, or set EXAM_ADMISSION_ALLOW_LOCAL_CACHE "
+                 "for a single worker process.",
+            id='exams.E001',
+        )]
+    return []
+
+
+def queue_status(exam_id):
+    """Public queue state of an exam, computed from the cache alone"""
+    cache = _cache()
+    state = cache.get_many([_key(exam_id, name) for name in ('cap', 'tickets', 'admitted', 'free_since')])
+    cap = state.get(_key(exam_id, 'cap'), 0)
+    issued = state.get(_key(exam_id, 'tickets'), 0)
+    admitted = state.get(_key(exam_id, 'admitted'), 0)
+    active = len(cache.get_many(_slot_keys(exam_id, cap))) if cap else 0
+    free = max(0, cap - active)
+    serving = admitted + free
+    
+    free_since = state.get(_key(exam_id, 'free_since'))
+    if free and issued > serving:
+        if free_since is None:
+            cache.add(_key(exam_id, 'free_since'), time.time(), _ttl())
+        elif time.time() - free_since >= STALL_WINDOWS * _window():
+            serving = issued
+    elif free_since is not None:
+        cache.delete(_key(exam_id, 'free_since'))
+    
+    return {
+        'serving': serving,
+        'issued': issued,
+        'active': active,
+        'capacity': cap,
+        'window_seconds': _window(),
+    }
+
+
+def take_ticket(exam):
+    """Draw the next ticket for an exam"""
+    cache = _cache()
+    cache.set(_key(exam.id, 'cap'), exam.admission_cap, _ttl())
+    return incr(cache, _key(exam.id, 'tickets'), _ttl())
+
+
+def take_slot(exam, holder):
+    """
+    Hold a free slot of an exam for ``holder`` (the candidate), returning its
+    index, or None when all are held. A candidate who still holds a slot, e.g.
+    resuming on another device, gets the same one back.
+    """
+    cache = _cache()
+    cache.set(_key(exam.id, 'cap'), exam.admission_cap, _ttl())
+    keys = _slot_keys(exam.id, exam.admission_cap)
+    held = cache.get_many(keys)
+    for index, key in enumerate(keys):
+        if held.get(key) == holder:
+            cache.touch(key, _lease())
+            return index
+    for index, key in enumerate(keys):
+        if key not in held and cache.add(key, holder, _lease()):
+            incr(cache, _key(exam.id, 'admitted'), _ttl())
+            cache.delete(_key(exam.id, 'free_since'))
+            return index
+    return None
+
+
+def check_admission(request, exam, resuming=False):
+    """
+    Return True once the candidate may start the exam, issuing a ticket if
+    needed. Candidates resuming an attempt take a free slot without waiting
+    for their turn, and only queue while the exam is full.
+    """
+    session_key = f'exam_admission_{exam.id}'
+    admission = request.session.get(session_key)
+    if admission and admission.get('admitted'):
+        return True
+    
+    holder = str(request.user.pk)
+    if not admission:
+        if resuming:
+            slot = take_slot(exam, holder)
+            if slot is not None:
+                request.session[session_key] = {'admitted': True, 'slot': slot, 'token': holder}
+                return True
+        admission = {'ticket': take_ticket(exam), 'issued_at': time.time(), 'admitted': False}
+    
+    if admission['ticket'] <= queue_status(exam.id)['serving']:
+        slot = take_slot(exam, holder)
+        if slot is not None:
+            admission.update(admitted=True, slot=slot, token=holder)
+            record_admission(exam.id, time.time() - admission['issued_at'])
+    
+    request.session[session_key] = admission
+    return admission['admitted']
+
+
+def renew_admission(request, exam_id):
+    """Extend the lease on the candidate's slot; called from the exam heartbeat"""
+    admission = request.session.get(f'exam_admission_{exam_id}')
+    if not admission or 'slot' not in admission:
+        return
+    cache = _cache()
+    key = _key(exam_id, f"slot:{admission['slot']}")
+    # A lapsed lease is taken back if the slot is still free
+    if not cache.touch(key, _lease()):
+        cache.add(key, admission['token'], _lease())
+
+
+def release_admission(request, exam_id):
+    """Free the candidate's slot once their attempt is over; a new attempt queues again"""
+    admission = request.session.pop(f'exam_admission_{exam_id}', None)
+    if not admission or 'slot' not in admission:
+        return
+    cache = _cache()
+    key = _key(exam_id, f"slot:{admission['slot']}")
+    # Only our own lease; after it lapsed the slot may belong to someone else
+    if cache.get(key) == admission['token']:
+        cache.delete(key)
+
+
+def record_admission(exam_id, waited_seconds):
+    """Accumulate wait-time metrics for admitted candidates"""
+    cache = _cache()
+    incr(cache, _key(exam_id, 'wait_ms_total'), _ttl(), int(waited_seconds * 1000))
+    if waited_seconds * 1000 > cache.get(_key(exam_id, 'wait_ms_max'), 0):
+        cache.set(_key(exam_id, 'wait_ms_max'), int(waited_seconds * 1000), _ttl())
+
+
+def admission_metrics(exam_id):
+    """Queue depth and wait-time metrics of an exam"""
+    cache = _cache()
+    status = queue_status(exam_id)
+    admitted = cache.get(_key(exam_id, 'admitted'), 0)
+    wait_total = cache.get(_key(exam_id, 'wait_ms_total'), 0)
+    return {
+        'capacity': status['capacity'],
+        'active': status['active'],
+        'window_seconds': status['window_seconds'],
+        'tickets_issued': status['issued'],
+        'serving': status['serving'],
+        'queue_depth': max(0, status['issued'] - status['serving']),
+        'admitted': admitted,
+        'avg_wait_seconds': round(wait_total / admitted / 1000, 3) if admitted else 0,
+        'max_wait_seconds': cache.get(_key(exam_id, 'wait_ms_max'), 0) / 1000,
+    }
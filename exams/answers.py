@@ -0,0 +1,306 @@
+"""
+Applying candidate answer changes to the database.
+
+All answer writes coming from the exam client (answer sync, auto-save)
+go through ``apply_answer_changes`` so a batch is resolved with a fixed
+number of queries regardless of its size: one upsert of the answers set
+and one delete of the answers cleared. Views run these functions
+through ``writequeue.run_answer_write``. Section attempts with packed
+answers (see ``packed``) get their changes written into the packed column
+instead of ``UserAnswer`` rows. Every write also moves the per-question
+answer counters (see ``counters``) by the change it made, and bumps the
+``answer_revision`` of the section attempts it changed once per batch.
+
+With the answer journal enabled (see ``journal``), changes are appended
+to the journal and acknowledged at once; ``flush_answer_journal`` applies
+them in batches from a background thread in each worker, before any
+scoring, and at startup to recover whatever a crash left behind. Until a
+flush, answers read back from the database may lag by up to
+``EXAM_ANSWER_JOURNAL_FLUSH_INTERVAL``.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+
+from .models import ExamAttempt, Question, QuestionOption, SectionAttempt, UserAnswer
+from .bank import attempt_answer_key
+from .counters import AnswerCounterDelta
+from .journal import answer_journal, journal_enabled
+from .packed import is_packed, write_packed_answers
+from .papers import paper_question_ids, questions_per_paper
+from .tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+def bump_answer_revisions(section_attempt_ids):
+    """Invalidate the ETags of papers whose answers changed; once per batch of answer writes"""
+    if section_attempt_ids:
+        SectionAttempt.objects.filter(pk__in=section_attempt_ids).update(answer_revision=F('answer_revision') + 1)
+
+
+def store_answer(section_attempt, question_id, option_id, answer_key=None):
+    """Record a single selected option; returns the answer (left unsaved when the section is packed)"""
+    if is_packed(section_attempt):
+        answer = UserAnswer(section_attempt=section_attempt, question_id=question_id, selected_option_id=option_id)
+        if write_packed_answers(section_attempt.exam_attempt, section_attempt, {question_id: option_id}):
+            answer.is_correct, answer.points_earned = answer_key.get(question_id).score(option_id)
+        return answer
+    
+    # A concurrent first answer to the question wins the insert; the retry finds its row and updates it
+    for retry in (False, True):
+        try:
+            with transaction.atomic():
+                # The row lock keeps the previous answer, and so the counter change, current under concurrent saves
+                answer = UserAnswer.objects.select_for_update().filter(
+                    section_attempt=section_attempt, question_id=question_id
+                ).first()
+                if answer is None:
+                    answer = UserAnswer(section_attempt=section_attempt, question_id=question_id)
+                previous = (answer.selected_option_id, answer.is_correct)
+                answer.selected_option_id = option_id
+                answer.save(answer_key=answer_key)
+                bump_answer_revisions([section_attempt.pk])
+                
+                counters = AnswerCounterDelta()
+                counters.change(question_id, *previous, answer.selected_option_id, answer.is_correct)
+                counters.apply()
+            break
+        except IntegrityError:
+            if retry:
+                raise
+    return answer
+
+
+@traced
+def apply_answer_changes(exam_attempt, changes):
+    """
+    Apply a batch of {question_id, option_id} changes; a null option clears
+    the answer. Journaled changes also carry ``journaled_at`` (a timestamp)
+    and still apply to a section submitted after they were journaled.
+    """
+    # Only the last change per question matters
+    latest = {}
+    journaled_at = {}
+    for change in changes:
+        question_id = change.get('question_id')
+        if question_id:
+            option_id = change.get('option_id')
+            latest[int(question_id)] = int(option_id) if option_id else None
+            journaled_at[int(question_id)] = change.get('journaled_at')
+    if not latest:
+        return 0
+    
+    # Valid targets as question_id -> (section_id, question, option); pinned attempts resolve them from the answer key
+    answer_key = attempt_answer_key(exam_attempt)
+    targets = {}
+    if answer_key is not None:
+        for question_id, option_id in latest.items():
+            entry = answer_key.get(question_id)
+            if entry and (option_id is None or option_id in entry.option_ids):
+                targets[question_id] = (entry.section_id, None, option_id)
+    else:
+        questions = {
+            question.id: question
+            for question in Question.objects.filter(id__in=latest, is_active=True).select_related('section')
+        }
+        options = {
+            option.id: option
+            for option in QuestionOption.objects.filter(
+                id__in=[option_id for option_id in latest.values() if option_id],
+                question_id__in=questions
+            )
+        }
+        for question_id, option_id in latest.items():
+            question = questions.get(question_id)
+            option = options.get(option_id) if option_id else None
+            if question and (option_id is None or (option and option.question_id == question_id)):
+                targets[question_id] = (question.section_id, question, option)
+    
+    # Answers go to sections whose timer is running; provisioned sections are not started until shown.
+    # Completed sections only take journaled changes that arrived before the section was submitted
+    accepting = Q(is_completed=False, start_time__isnull=False)
+    if any(journaled_at.values()):
+        accepting |= Q(end_time__isnull=False)
+    section_attempts = {
+        section_attempt.section_id: section_attempt
+        for section_attempt in SectionAttempt.objects.filter(
+            accepting,
+            exam_attempt=exam_attempt,
+            section_id__in={section_id for section_id, _, _ in targets.values()}
+        ).select_related('section')
+    }
+    
+    # Sampled papers only accept answers to the questions drawn for this attempt
+    paper_ids = {
+        section_id: paper_question_ids(exam_attempt, section_attempt.section)
+        for section_id, section_attempt in section_attempts.items()
+        if questions_per_paper(exam_attempt, section_attempt.section) and not is_packed(section_attempt)
+    }
+    
+    existing = {
+        answer.question_id: answer
+        for answer in UserAnswer.objects.filter(
+            section_attempt__in=[section_attempt for section_attempt in section_attempts.values() if not is_packed(section_attempt)],
+            question_id__in=targets
+        )
+    }
+    
+    applied = 0
+    upserts, cleared = [], []
+    changed_sections = set()
+    counters = AnswerCounterDelta()
+    packed_selections = defaultdict(dict)
+    for question_id, (section_id, question, option) in targets.items():
+        section_attempt = section_attempts.get(section_id)
+        if not section_attempt:
+            continue
+        if section_attempt.is_completed and not (
+            journaled_at[question_id] and journaled_at[question_id] <= section_attempt.end_time.timestamp()
+        ):
+            continue
+        if journaled_at[question_id] and (
+            not section_attempt.start_time or journaled_at[question_id] < section_attempt.start_time.timestamp()
+        ):
+            continue
+        if is_packed(section_attempt):
+            # The paper layout only accepts questions on the attempt's paper
+            packed_selections[section_id][question_id] = latest[question_id]
+            continue
+        if section_id in paper_ids and question_id not in paper_ids[section_id]:
+            continue
+        
+        previous = existing.get(question_id)
+        if latest[question_id] is None:
+            if previous:
+                cleared.append(previous.pk)
+                counters.change(question_id, previous.selected_option_id, previous.is_correct, None, False)
+        else:
+            answer = UserAnswer(section_attempt=section_attempt, question_id=question_id)
+            if answer_key is not None:
+                answer.selected_option_id = latest[question_id]
+            else:
+                answer.question = question
+                answer.selected_option = option
+            answer.mark(answer_key)
+            upserts.append(answer)
+            if previous:
+                counters.change(question_id, previous.selected_option_id, previous.is_correct, answer.selected_option_id, answer.is_correct)
+            else:
+                counters.change(question_id, None, None, answer.selected_option_id, answer.is_correct)
+        changed_sections.add(section_attempt.pk)
+        applied += 1
+    
+    # One upsert and one delete for the whole batch, then one revision bump; packed writes bump their own
+    if upserts:
+        UserAnswer.objects.bulk_create(
+            upserts,
+            update_conflicts=True,
+            unique_fields=['section_attempt', 'question'],
+            update_fields=['selected_option', 'is_correct', 'points_earned'],
+        )
+    if cleared:
+        UserAnswer.objects.filter(pk__in=cleared).delete()
+    bump_answer_revisions(changed_sections)
+    
+    for section_id, selections in packed_selections.items():
+        applied += write_packed_answers(exam_attempt, section_attempts[section_id], selections, counters)
+    
+    counters.apply()
+    return applied
+
+
+def apply_answer_sync(exam_attempt, seq, changes):
+    """Claim a client sequence number and apply its changes at most once"""
+    with transaction.atomic():
+        # One conditional UPDATE on the primary key; a retried or duplicated batch matches no row
+        claimed = ExamAttempt.objects.filter(
+            pk=exam_attempt.pk,
+            answer_sync_seq__lt=seq
+        ).update(answer_sync_seq=seq)
+        applied = record_answer_changes(exam_attempt, changes) if claimed else 0
+    
+    ack = seq if claimed else exam_attempt.answer_sync_seq
+    return ack, applied, not claimed
+
+
+def record_answer_changes(exam_attempt, changes):
+    """Apply changes now, or journal them when the answer journal is enabled"""
+    if journal_enabled():
+        return journal_answer_changes(exam_attempt, changes)
+    return apply_answer_changes(exam_attempt, changes)
+
+
+def journal_answer_changes(exam_attempt, changes):
+    """Append changes to the journal; they are validated and applied by the next flush"""
+    now = time.time()
+    entries = [
+        {'t': now, 'a': exam_attempt.pk, 'q': int(change['question_id']), 'o': int(change['option_id']) if change.get('option_id') else None}
+        for change in changes
+        if change.get('question_id')
+    ]
+    if entries:
+        answer_journal().append(entries)
+        start_journal_flusher()
+    return len(entries)
+
+
+@traced
+def flush_answer_journal(wait=True):
+    """Apply every journaled change on this node to the database; returns the number of entries applied"""
+    if not journal_enabled():
+        return 0
+    
+    journal = answer_journal()
+    flushed = 0
+    with journal.flush_lock(blocking=wait) as locked:
+        if not locked:
+            return 0  # another process is flushing
+        
+        journal.seal()
+        for segment in journal.segments():
+            entries = journal.read(segment)
+            changes = defaultdict(list)
+            for entry in entries:
+                changes[entry['a']].append({'question_id': entry['q'], 'option_id': entry['o'], 'journaled_at': entry['t']})
+            
+            attempts = ExamAttempt.objects.in_bulk(list(changes))
+            with transaction.atomic():
+                for attempt_id, attempt_changes in changes.items():
+                    if attempt_id in attempts:
+                        apply_answer_changes(attempts[attempt_id], attempt_changes)
+            journal.remove(segment)
+            flushed += len(entries)
+    return flushed
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def start_journal_flusher():
+    """Start this process's background flush thread once"""
+    global _flusher
+    interval = getattr(settings, 'EXAM_ANSWER_JOURNAL_FLUSH_INTERVAL', 1.0)
+    if not interval or (_flusher is not None and _flusher.is_alive()):
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=run_journal_flusher, args=(interval,), name='answer-journal-flusher', daemon=True)
+            _flusher.start()
+
+
+def run_journal_flusher(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_answer_journal(wait=False)
+        except Exception:
+            logger.exception("Flushing the answer journal failed; will retry")
+        finally:
+            close_old_connections()
@@ -8,4 +8,8 @@ class ExamsConfig(AppConfig):
     
     def ready(self):
         # Import signals if any
-        pass
+        from . import signals  # noqa: F401
+        
+        from django.core import checks
+        from .admission import check_admission_cache
+        checks.register(check_admission_cache)
@@ -0,0 +1,178 @@
+"""
+Cold storage of completed attempts.
+
+``manage.py archive_attempts`` moves old completed attempts (the
+``ExamAttempt`` with its ``SectionAttempt`` and ``UserAnswer`` rows) into
+compressed chunk files under ``EXAM_ARCHIVE_DIR`` and leaves an
+``ArchivedAttempt`` summary row behind.
+
+Each attempt is one JSON line compressed as its own gzip member and
+appended to the current chunk file, so a chunk decompresses as a whole
+with ``zcat`` while a single attempt is read back with one seek. The
+summary row records the chunk file, offset and length. A ``.idx`` file
+next to each chunk lists the same offsets by attempt id in case the rows
+are lost.
+
+``rehydrate_attempt`` rebuilds unsaved model instances from the archive
+for the results page and the admin. ``restore_attempt`` writes them back
+into the live tables.
+"""
+import base64
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import ExamAttempt, ExamSection, QuestionOption, SectionAttempt, UserAnswer
+
+CHUNK_GLOB = 'attempts-*.jsonl.gz'
+ANSWER_FIELDS = ('id', 'question_id', 'selected_option_id', 'is_correct', 'points_earned', 'answered_at')
+
+
+def archive_dir():
+    return Path(getattr(settings, 'EXAM_ARCHIVE_DIR', settings.BASE_DIR / 'var' / 'archive'))
+
+
+def model_row(instance, exclude=()):
+    """Concrete field values of an instance by attribute name"""
+    return {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+        if field.attname not in exclude
+    }
+
+
+def from_row(model, row):
+    """Unsaved instance of ``model`` from a ``model_row`` read back from JSON"""
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    return model(**{name: fields[name].to_python(value) for name, value in row.items() if name in fields})
+
+
+def attempt_record(exam_attempt, section_attempts, answers):
+    """Archive record of an attempt; ``answers`` maps section attempt id to ANSWER_FIELDS tuples"""
+    sections = []
+    for section_attempt in section_attempts:
+        section = model_row(section_attempt, exclude=('packed_answers',))
+        if section_attempt.packed_answers is not None:
+            section['packed_answers'] = base64.b64encode(bytes(section_attempt.packed_answers)).decode()
+        section['answers'] = answers.get(section_attempt.id, [])
+        sections.append(section)
+    return {'attempt': model_row(exam_attempt), 'sections': sections}
+
+
+class ArchiveWriter:
+    """Appends attempt records to chunk files of at most ``chunk_size`` attempts"""
+
+    def __init__(self, directory, chunk_size):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.path = None
+        self.count = 0
+        self._data = None
+        self._index = None
+
+    def _open_chunk(self):
+        chunks = sorted(self.directory.glob(CHUNK_GLOB))
+        if chunks:
+            # Continue the last chunk of an earlier (possibly interrupted) run while it has room
+            last = chunks[-1]
+            count = 0
+            if self.index_path(last).exists():
+                with open(self.index_path(last), encoding='utf-8') as index:
+                    count = sum(1 for _ in index)
+            if count < self.chunk_size:
+                self.path, self.count = last, count
+        if self.path is None:
+            number = int(chunks[-1].name.split('-')[1].split('.')[0]) + 1 if chunks else 1
+            self.path, self.count = self.directory / f'attempts-{number:06d}.jsonl.gz', 0
+        self._data = open(self.path, 'ab')
+        self._index = open(self.index_path(self.path), 'a', encoding='utf-8')
+
+    @staticmethod
+    def index_path(chunk):
+        return chunk.with_name(chunk.name.replace('.jsonl.gz', '.idx'))
+
+    def write(self, record):
+        """Append a record; returns (chunk file name, offset, length)"""
+        if self._data is None or self.count >= self.chunk_size:
+            self.close()
+            self._open_chunk()
+        member = gzip.compress((json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n').encode(), mtime=0)
+        offset = self._data.seek(0, os.SEEK_END)
+        self._data.write(member)
+        self._index.write(json.dumps([record['attempt']['id'], offset, len(member)]) + '\n')
+        self.count += 1
+        return self.path.name, offset, len(member)
+
+    def sync(self):
+        """Make everything written so far durable, before the live rows are deleted"""
+        for handle in (self._data, self._index):
+            if handle is not None:
+                handle.flush()
+                os.fsync(handle.fileno())
+
+    def close(self):
+        self.sync()
+        for handle in (self._data, self._index):
+            if handle is not None:
+                handle.close()
+        self._data = self._index = None
+        self.path = None
+
+
+def read_record(archived):
+    """The archive record of an ArchivedAttempt"""
+    with open(archive_dir() / archived.archive_file, 'rb') as handle:
+        handle.seek(archived.offset)
+        return json.loads(gzip.decompress(handle.read(archived.length)))
+
+
+def rehydrate_attempt(archived):
+    """
+    Unsaved ExamAttempt and its SectionAttempts (sections attached, answers
+    in ``archived_answers``) rebuilt from the archive, for display.
+    """
+    record = read_record(archived)
+    exam_attempt = from_row(ExamAttempt, record['attempt'])
+    sections = ExamSection.objects.in_bulk([section['section_id'] for section in record['sections']])
+    section_attempts = []
+    for row in record['sections']:
+        section_attempt = from_row(SectionAttempt, {name: value for name, value in row.items() if name != 'answers'})
+        if row.get('packed_answers') is not None:
+            section_attempt.packed_answers = base64.b64decode(row['packed_answers'])
+        section_attempt.section = sections.get(section_attempt.section_id)
+        section_attempt.archived_answers = [
+            from_row(UserAnswer, dict(zip(ANSWER_FIELDS, answer), section_attempt_id=section_attempt.id))
+            for answer in row['answers']
+        ]
+        section_attempts.append(section_attempt)
+    return exam_attempt, section_attempts
+
+
+def restore_attempt(archived):
+    """Write an archived attempt back into the live tables and drop its summary row"""
+    exam_attempt, section_attempts = rehydrate_attempt(archived)
+    answers = [answer for section_attempt in section_attempts for answer in section_attempt.archived_answers]
+    # Answers to options deleted since archiving are dropped rather than blocking the restore
+    options = set(QuestionOption.objects.filter(
+        id__in=[answer.selected_option_id for answer in answers if answer.selected_option_id]
+    ).values_list('id', flat=True))
+    answers = [answer for answer in answers if answer.selected_option_id is None or answer.selected_option_id in options]
+    # Inserting stamps auto_now_add fields with the current time; put the archived times back afterwards
+    created_at = exam_attempt.created_at
+    answered_at = [answer.answered_at for answer in answers]
+    with transaction.atomic():
+        exam_attempt.save(force_insert=True)
+        ExamAttempt.objects.filter(pk=exam_attempt.pk).update(created_at=created_at)
+        SectionAttempt.objects.bulk_create(section_attempts)
+        UserAnswer.objects.bulk_create(answers)
+        for answer, timestamp in zip(answers, answered_at):
+            answer.answered_at = timestamp
+        UserAnswer.objects.bulk_update(answers, ['answered_at'], batch_size=500)
+        archived.delete()
+    return exam_attempt
@@ -0,0 +1,179 @@
+"""
+Published question-bank versions.
+
+Publishing a mock exam's question bank stores an immutable snapshot of
+the active questions and options of its sections, including the answer
+key and each section's ``questions_per_paper``. Attempts pin the latest version when they start and are served and
+scored from it, so editing questions mid-exam only affects attempts that
+start after the next publish.
+
+A version never changes once written, so its decoded form is cached
+without expiry. When the version has been compiled (see ``bankstore``) each
+worker maps the compiled file; otherwise the raw payload is kept in the
+shared cache and decoded once per worker into a ``BankSnapshot``.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import MockExamSection, Question, QuestionBankVersion, QuestionOption
+
+_snapshots = {}  # version_id -> BankSnapshot
+
+
+class AnswerKeyEntry(namedtuple('AnswerKeyEntry', 'section_id correct_option_id points penalty option_ids')):
+    """Published scoring data of one question"""
+    
+    __slots__ = ()
+    
+    def score(self, option_id):
+        """(is_correct, points_earned) for choosing ``option_id``"""
+        if option_id == self.correct_option_id:
+            return True, self.points
+        return False, -self.penalty
+
+
+class BankSnapshot:
+    """Decoded bank version: paper pools per section and the answer key"""
+    
+    __slots__ = ('version_id', 'pools', 'key', 'paper_sizes')
+    
+    def __init__(self, version_id, payload):
+        self.version_id = version_id
+        self.pools = {}
+        self.key = {}
+        self.paper_sizes = {}
+        for section_id, section in payload['sections'].items():
+            section_id = int(section_id)
+            self.paper_sizes[section_id] = section['questions_per_paper']
+            pool = []
+            for question_id, text, difficulty, points, negative_points, options in section['questions']:
+                pool.append({
+                    'id': question_id,
+                    'text': text,
+                    'difficulty': difficulty,
+                    'points': points,
+                    'negative_points': negative_points,
+                    'options': [
+                        {'id': option_id, 'letter': letter, 'text': option_text}
+                        for option_id, letter, option_text, _ in options
+                    ],
+                })
+                correct = next((option[0] for option in options if option[3]), None)
+                self.key[question_id] = AnswerKeyEntry(
+                    section_id,
+                    correct,
+                    points,
+                    negative_points if section['negative_marking'] else 0,
+                    frozenset(option[0] for option in options),
+                )
+            self.pools[section_id] = pool
+    
+    def section_pool(self, section_id):
+        return self.pools.get(section_id, [])
+    
+    def questions_per_paper(self, section_id):
+        return self.paper_sizes.get(section_id, 0)
+
+
+def build_bank_payload(exam):
+    """Compact snapshot of the active questions of every section in an exam"""
+    section_ids = MockExamSection.objects.filter(exam=exam).values_list('section_id', flat=True)
+    questions = Question.objects.filter(
+        section_id__in=section_ids,
+        is_active=True
+    ).select_related('section').prefetch_related(
+        Prefetch('options', queryset=QuestionOption.objects.order_by('option_letter'))
+    ).order_by('section_id', 'id')
+    
+    sections = {}
+    for question in questions:
+        section = sections.setdefault(str(question.section_id), {
+            'negative_marking': question.section.has_negative_marking,
+            'questions_per_paper': question.section.questions_per_paper,
+            'questions': [],
+        })
+        section['questions'].append([
+            question.id,
+            question.question_text,
+            question.difficulty,
+            question.points,
+            question.negative_points,
+            [
+                [option.id, option.option_letter, option.option_text, option.is_correct]
+                for option in question.options.all()
+            ],
+        ])
+    return {'sections': sections}
+
+
+def publish_question_bank(exam, user=None):
+    """Publish the current questions of an exam; returns (version, created)"""
+    payload = build_bank_payload(exam)
+    checksum = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    
+    with transaction.atomic():
+        latest = QuestionBankVersion.objects.select_for_update().filter(exam=exam).order_by('-number').first()
+        if latest and latest.checksum == checksum:
+            return latest, False
+        
+        version = QuestionBankVersion.objects.create(
+            exam=exam,
+            number=(latest.number if latest else 0) + 1,
+            payload=payload,
+            checksum=checksum,
+            question_count=sum(len(section['questions']) for section in payload['sections'].values()),
+            published_by=user,
+        )
+        transaction.on_commit(lambda: compile_bank_quietly(version))
+    return version, True
+
+
+def compile_bank_quietly(version):
+    """Compile a freshly published version; workers fall back to the JSON payload if this fails"""
+    from .bankstore import compile_bank
+    
+    try:
+        compile_bank(version)
+    except OSError:
+        pass
+
+
+def current_bank_version_id(exam):
+    """Id of the latest published version of an exam, or None if it was never published"""
+    return QuestionBankVersion.objects.filter(exam=exam).order_by('-number').values_list('id', flat=True).first()
+
+
+def load_bank(version_id):
+    """Decoded snapshot (or mapped compiled file) of a bank version"""
+    from .bankstore import open_bank_store
+    
+    snapshot = _snapshots.get(version_id)
+    if snapshot is not None:
+        return snapshot
+    
+    snapshot = open_bank_store(version_id)
+    if snapshot is not None:
+        _snapshots[version_id] = snapshot
+        return snapshot
+    
+    cache_key = f'exams:bank:{version_id}:2'
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload = QuestionBankVersion.objects.values_list('payload', flat=True).get(pk=version_id)
+        cache.set(cache_key, payload, timeout=None)
+    
+    snapshot = BankSnapshot(version_id, payload)
+    _snapshots[version_id] = snapshot
+    return snapshot
+
+
+def attempt_answer_key(exam_attempt):
+    """Pinned answer key of an attempt, or None when it is served from the live tables"""
+    if not exam_attempt.bank_version_id:
+        return None
+    return load_bank(exam_attempt.bank_version_id).key
@@ -0,0 +1,258 @@
+"""
+Compiled, memory-mapped question-bank files.
+
+A published ``QuestionBankVersion`` can be compiled into a read-only binary
+file in ``EXAM_BANK_STORE_DIR``. Workers open it with ``mmap``, so all
+processes on a host share one copy through the page cache. Looking up a
+question, its options or its answer key reads fixed-width records in place;
+only the texts of questions actually served are decoded.
+
+Layout (native byte order, every table aligned to 8 bytes)::
+
+    header      magic, version id, counts and table offsets
+    sections    section_id, first question, question count, questions per
+                paper, negative marking
+    questions   question_id, section_id, first option, text index, points,
+                negative points, option count, correct option index, difficulty
+    options     option_id, text index, letter
+    index       question ids sorted, then the matching question record numbers
+    offsets     n_texts + 1 offsets into the blob
+    blob        UTF-8 texts
+
+Questions are stored per section in pool order, options per question in
+letter order. A version without a compiled file is read from its JSON
+payload instead (see ``bank``).
+"""
+import bisect
+import mmap
+import os
+import struct
+from pathlib import Path
+
+from django.conf import settings
+
+from .bank import AnswerKeyEntry
+
+MAGIC = b'UASBANK2'
+HEADER = struct.Struct('=8sIIIIIIQQQQQQ')
+SECTION = struct.Struct('=IIIIB3x')
+QUESTION = struct.Struct('=QIIIIdBBBx')
+OPTION = struct.Struct('=QIc3x')
+NO_CORRECT_OPTION = 0xFF
+DIFFICULTIES = ['easy', 'medium', 'hard']
+
+
+def store_dir():
+    return Path(getattr(settings, 'EXAM_BANK_STORE_DIR', settings.BASE_DIR / 'var' / 'banks'))
+
+
+def store_path(version_id):
+    return store_dir() / f'bank-{version_id}.bin'
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def compile_bank(version):
+    """Write the binary file of a published version; returns its path"""
+    sections = []
+    questions = []
+    options = []
+    texts = []
+    
+    def add_text(text):
+        texts.append(text.encode('utf-8'))
+        return len(texts) - 1
+    
+    for section_id, section in sorted(version.payload['sections'].items(), key=lambda item: int(item[0])):
+        sections.append((
+            int(section_id), len(questions), len(section['questions']), section['questions_per_paper'], section['negative_marking'],
+        ))
+        for question_id, text, difficulty, points, negative_points, question_options in section['questions']:
+            correct = next((index for index, option in enumerate(question_options) if option[3]), NO_CORRECT_OPTION)
+            questions.append((
+                question_id, int(section_id), len(options), add_text(text), points, negative_points,
+                len(question_options), correct, DIFFICULTIES.index(difficulty),
+            ))
+            for option_id, letter, option_text, _ in question_options:
+                options.append((option_id, add_text(option_text), letter.encode('ascii')))
+    
+    index = sorted((question[0], number) for number, question in enumerate(questions))
+    
+    offsets = {}
+    position = _align(HEADER.size)
+    for name, size in (
+        ('sections', SECTION.size * len(sections)),
+        ('questions', QUESTION.size * len(questions)),
+        ('options', OPTION.size * len(options)),
+        ('index', 12 * len(index)),
+        ('offsets', 8 * (len(texts) + 1)),
+    ):
+        offsets[name] = position
+        position = _align(position + size)
+    offsets['blob'] = position
+    
+    path = store_path(version.id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.tmp{os.getpid()}')
+    with open(tmp_path, 'wb') as handle:
+        def pad_to(offset):
+            handle.write(b'\0' * (offset - handle.tell()))
+        
+        handle.write(HEADER.pack(
+            MAGIC, version.id, len(sections), len(questions), len(options), len(texts), 0,
+            offsets['sections'], offsets['questions'], offsets['options'],
+            offsets['index'], offsets['offsets'], offsets['blob'],
+        ))
+        pad_to(offsets['sections'])
+        for record in sections:
+            handle.write(SECTION.pack(*record))
+        pad_to(offsets['questions'])
+        for record in questions:
+            handle.write(QUESTION.pack(*record))
+        pad_to(offsets['options'])
+        for record in options:
+            handle.write(OPTION.pack(*record))
+        pad_to(offsets['index'])
+        handle.write(struct.pack(f'={len(index)}Q', *(question_id for question_id, _ in index)))
+        handle.write(struct.pack(f'={len(index)}I', *(number for _, number in index)))
+        pad_to(offsets['offsets'])
+        end = 0
+        text_offsets = [0]
+        for text in texts:
+            end += len(text)
+            text_offsets.append(end)
+        handle.write(struct.pack(f'={len(text_offsets)}Q', *text_offsets))
+        pad_to(offsets['blob'])
+        for text in texts:
+            handle.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_bank_store(version_id):
+    """Map the compiled file of a version, or None when it has not been compiled"""
+    try:
+        with open(store_path(version_id), 'rb') as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    
+    try:
+        bank = MappedBank(version_id, mapped)
+    except ValueError:
+        return None
+    return bank if bank.version_id == version_id else None
+
+
+class MappedBank:
+    """Read-only view of a compiled bank file"""
+    
+    __slots__ = ('version_id', 'key', '_mapped', '_view', '_sections', '_ids', '_numbers', '_text_offsets', '_blob', '_header')
+    
+    def __init__(self, version_id, mapped):
+        header = HEADER.unpack_from(mapped, 0)
+        if header[0] != MAGIC:
+            raise ValueError(f'{store_path(version_id)} is not a compiled question bank')
+        self._header = header
+        self._mapped = mapped
+        self._view = memoryview(mapped)
+        _, self.version_id, n_sections, n_questions, _, n_texts, _, sections_at, _, _, index_at, offsets_at, blob_at = header
+        
+        self._sections = {}
+        for number in range(n_sections):
+            section_id, first, count, per_paper, negative_marking = SECTION.unpack_from(mapped, sections_at + number * SECTION.size)
+            self._sections[section_id] = (first, count, per_paper, bool(negative_marking))
+        self._ids = self._view[index_at:index_at + 8 * n_questions].cast('Q')
+        self._numbers = self._view[index_at + 8 * n_questions:index_at + 12 * n_questions].cast('I')
+        self._text_offsets = self._view[offsets_at:offsets_at + 8 * (n_texts + 1)].cast('Q')
+        self._blob = blob_at
+        self.key = MappedAnswerKey(self)
+    
+    def text(self, index):
+        return str(self._view[self._blob + self._text_offsets[index]:self._blob + self._text_offsets[index + 1]], 'utf-8')
+    
+    def question_record(self, number):
+        return QUESTION.unpack_from(self._mapped, self._header[8] + number * QUESTION.size)
+    
+    def option_record(self, number):
+        return OPTION.unpack_from(self._mapped, self._header[9] + number * OPTION.size)
+    
+    def find_question(self, question_id):
+        """Record number of a question id, or None"""
+        position = bisect.bisect_left(self._ids, question_id)
+        if position < len(self._ids) and self._ids[position] == question_id:
+            return self._numbers[position]
+        return None
+    
+    def section_negative_marking(self, section_id):
+        return self._sections[section_id][3]
+    
+    def section_pool(self, section_id):
+        first, count, _, _ = self._sections.get(section_id, (0, 0, 0, False))
+        return MappedPool(self, first, count)
+    
+    def questions_per_paper(self, section_id):
+        return self._sections.get(section_id, (0, 0, 0, False))[2]
+    
+    def question(self, number):
+        """Paper entry of a question record"""
+        question_id, _, first_option, text_index, points, negative_points, option_count, _, difficulty = self.question_record(number)
+        options = []
+        for option_number in range(first_option, first_option + option_count):
+            option_id, option_text_index, letter = self.option_record(option_number)
+            options.append({'id': option_id, 'letter': letter.decode('ascii'), 'text': self.text(option_text_index)})
+        return {
+            'id': question_id,
+            'text': self.text(text_index),
+            'difficulty': DIFFICULTIES[difficulty],
+            'points': points,
+            'negative_points': negative_points,
+            'options': options,
+        }
+
+
+class MappedPool:
+    """Questions of one section, decoded only when accessed"""
+    
+    __slots__ = ('bank', 'first', 'count')
+    
+    def __init__(self, bank, first, count):
+        self.bank = bank
+        self.first = first
+        self.count = count
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.bank.question(self.first + index)
+    
+    def difficulty(self, index):
+        return DIFFICULTIES[self.bank.question_record(self.first + index)[8]]
+
+
+class MappedAnswerKey:
+    """Answer key lookups straight from the mapped question and option records"""
+    
+    __slots__ = ('bank',)
+    
+    def __init__(self, bank):
+        self.bank = bank
+    
+    def get(self, question_id, default=None):
+        number = self.bank.find_question(question_id)
+        if number is None:
+            return default
+        _, section_id, first_option, _, points, negative_points, option_count, correct, _ = self.bank.question_record(number)
+        option_ids = [self.bank.option_record(option_number)[0] for option_number in range(first_option, first_option + option_count)]
+        return AnswerKeyEntry(
+            section_id,
+            option_ids[correct] if correct != NO_CORRECT_OPTION else None,
+            points,
+            negative_points if self.bank.section_negative_marking(section_id) else 0,
+            frozenset(option_ids),
+        )
@@ -0,0 +1,87 @@
+"""
+Whole-exam offline bundle for the exam client.
+
+The bundle carries the paper of every section of a mock exam so the client
+can cache it once and switch sections without fetching questions again.
+Sections that have not started yet are compressed and encrypted with a key
+derived from the attempt and section; ``take_exam`` releases that key only
+once the section starts.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import zlib
+
+from django.utils.crypto import salted_hmac
+
+from .models import SectionAttempt
+from .papers import build_attempt_paper
+
+
+def bundle_version(exam, sections):
+    """Version of the bundle content, changing whenever any section changes"""
+    parts = [str(exam.id)] + [f'{section.id}.{section.content_version}' for section in sections]
+    return hashlib.sha1(':'.join(parts).encode()).hexdigest()[:16]
+
+
+def section_key(exam_attempt, section):
+    """Per-attempt key that unlocks the bundled paper of a section"""
+    return salted_hmac('exams.bundle', f'{exam_attempt.id}:{section.id}', algorithm='sha256').digest()
+
+
+def _keystream(key, nonce, length):
+    """HMAC-SHA256 in counter mode, mirrored by ExamManager.decryptSection"""
+    blocks = []
+    for counter in range((length + 31) // 32):
+        blocks.append(hmac.new(key, nonce + counter.to_bytes(4, 'big'), hashlib.sha256).digest())
+    return b''.join(blocks)[:length]
+
+
+def encrypt_section(paper, key, nonce):
+    """Compress and encrypt a section paper, returning base64 ciphertext"""
+    data = zlib.compress(json.dumps(paper, separators=(',', ':')).encode())
+    stream = _keystream(key, nonce, len(data))
+    cipher = (int.from_bytes(data, 'big') ^ int.from_bytes(stream, 'big')).to_bytes(len(data), 'big')
+    return base64.b64encode(cipher).decode()
+
+
+def build_bundle(exam, exam_attempt, sections):
+    """Build the bundle payload for an attempt, locking sections not yet started"""
+    version = bundle_version(exam, sections)
+    started = set(
+        SectionAttempt.objects.filter(
+            exam_attempt=exam_attempt,
+            start_time__isnull=False
+        ).values_list('section_id', 'is_completed')
+    )
+    completed_ids = {section_id for section_id, is_completed in started if is_completed}
+    started_ids = {section_id for section_id, is_completed in started}
+    
+    sections_data = []
+    for section in sections:
+        entry = {
+            'id': section.id,
+            'name': section.display_name,
+            'duration_minutes': section.duration_minutes,
+        }
+        if section.id in completed_ids:
+            entry['status'] = 'completed'
+        elif section.id in started_ids or section.id == exam_attempt.current_section_id:
+            entry['status'] = 'open'
+            entry['questions'] = build_attempt_paper(exam_attempt, section)
+        else:
+            nonce = hashlib.sha256(f'{version}:{section.id}'.encode()).digest()[:16]
+            entry['status'] = 'locked'
+            entry['nonce'] = nonce.hex()
+            entry['ciphertext'] = encrypt_section(
+                build_attempt_paper(exam_attempt, section), section_key(exam_attempt, section), nonce
+            )
+        sections_data.append(entry)
+    
+    return {
+        'version': version,
+        'exam_id': exam.id,
+        'attempt_id': exam_attempt.id,
+        'sections': sections_data,
+    }
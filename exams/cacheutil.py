@@ -0,0 +1,16 @@
+"""
+Helpers for counters kept in the Django cache.
+"""
+
+
+def incr(cache, key, timeout, delta=1):
+    """
+    Atomically add ``delta`` to a counter and return its new value, starting
+    the counter (with ``timeout``) if it is missing or was evicted.
+    """
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout):
+            return delta
+        return cache.incr(key, delta)
@@ -0,0 +1,40 @@
+"""
+Helpers for conditional GET handling on the exam JSON APIs.
+
+ETags are computed from cheap version counters (section content version,
+answer revision) so that a matching ``If-None-Match`` can be answered with
+a 304 before any questions are loaded or serialized.
+"""
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the given version components"""
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:24]}"'
+
+
+def etag_matches(request, etag):
+    """Check If-None-Match against an ETag (weak comparison, as GZip weakens ETags)"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    if '*' in candidates:
+        return True
+    return any(candidate.removeprefix('W/') == etag for candidate in candidates)
+
+
+def set_etag(response, etag):
+    """Attach the ETag and force the browser to revalidate on every use"""
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag):
+    """Empty 304 response for a matching ETag"""
+    return set_etag(HttpResponseNotModified(), etag)
@@ -0,0 +1,90 @@
+"""
+Per-question and per-option answer counters.
+
+``Question.times_served``, ``times_answered`` and ``times_correct`` and
+``QuestionOption.pick_count`` are kept current with F() increments so the
+admin can show and sort question statistics without counting answers.
+
+They count answers as they stand. A first answer adds to the question
+and to its option; changing the answer moves the pick from the previous
+option to the new one and adjusts ``times_correct``; clearing it takes
+both back. Answer writes report each change to an ``AnswerCounterDelta``,
+which turns a whole batch into one UPDATE per distinct increment.
+
+Packing and archiving move answers without changing them and leave the
+counters alone. Answers written or deleted any other way (deleting an
+attempt, a shell session) make them drift; ``manage.py
+rebuild_answer_counters`` recomputes them from the stored answers. Run it
+once after the counters are first added.
+"""
+from collections import defaultdict
+
+from django.db.models import F
+
+from .models import Question, QuestionOption
+from .papers import paper_question_ids
+
+QUESTION_COUNTERS = ('times_served', 'times_answered', 'times_correct')
+OPTION_COUNTERS = ('pick_count',)
+
+
+class AnswerCounterDelta:
+    """Counter changes of a batch of answer writes, applied together"""
+
+    __slots__ = ('questions', 'options')
+
+    def __init__(self):
+        self.questions = defaultdict(lambda: [0, 0])  # question_id -> [answered, correct]
+        self.options = defaultdict(int)  # option_id -> picks
+
+    def change(self, question_id, old_option_id, old_correct, new_option_id, new_correct):
+        """Record an answer going from one option (or None) to another"""
+        if old_option_id == new_option_id:
+            return
+        counts = self.questions[question_id]
+        if old_option_id is not None:
+            self.options[old_option_id] -= 1
+            counts[0] -= 1
+            counts[1] -= bool(old_correct)
+        if new_option_id is not None:
+            self.options[new_option_id] += 1
+            counts[0] += 1
+            counts[1] += bool(new_correct)
+
+    def apply(self):
+        """Write the accumulated changes; one UPDATE per distinct increment"""
+        questions = defaultdict(list)
+        for question_id, (answered, correct) in self.questions.items():
+            if answered or correct:
+                questions[(answered, correct)].append(question_id)
+        for (answered, correct), question_ids in questions.items():
+            Question.objects.filter(id__in=question_ids).update(
+                times_answered=F('times_answered') + answered,
+                times_correct=F('times_correct') + correct,
+            )
+
+        options = defaultdict(list)
+        for option_id, picks in self.options.items():
+            if picks:
+                options[picks].append(option_id)
+        for picks, option_ids in options.items():
+            QuestionOption.objects.filter(id__in=option_ids).update(pick_count=F('pick_count') + picks)
+
+        self.questions.clear()
+        self.options.clear()
+
+
+def count_served(exam_attempt, section):
+    """Count the questions of an attempt's paper as served, when the section is first shown"""
+    Question.objects.filter(id__in=paper_question_ids(exam_attempt, section)).update(
+        times_served=F('times_served') + 1
+    )
+
+
+def fields_without_counters(instance):
+    """``update_fields`` that save an edited question or option without writing back stale counters"""
+    counters = QUESTION_COUNTERS if isinstance(instance, Question) else OPTION_COUNTERS
+    return [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in counters
+    ]
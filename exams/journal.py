@@ -0,0 +1,148 @@
+"""
+Append-only journal of candidate answer changes.
+
+With ``EXAM_ANSWER_JOURNAL`` on, answer changes are appended to one file
+per node (``answers.log`` in ``EXAM_ANSWER_JOURNAL_DIR``) shared by every
+worker process, and applied to the database later in batches (see
+``answers.flush_answer_journal``). All workers on a node append to the same
+file with ``O_APPEND``, so the file order is the order the changes
+arrived in.
+
+A flush seals the live file by renaming it to ``answers-<ns>.sealed``;
+writers notice the rename and reopen a new ``answers.log``. Appends hold a
+shared ``flock`` on the file and sealing takes an exclusive one, so no
+append lands in a segment after it has been read. Sealed segments are
+removed once their changes are committed; segments (and the live file)
+left behind by a crash are simply applied by the next flush.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+LIVE_NAME = 'answers.log'
+SEGMENT_GLOB = 'answers-*.sealed'
+
+
+class AnswerJournal:
+    """The node's journal directory; one instance per process"""
+
+    def __init__(self, directory, fsync=False):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / LIVE_NAME
+        self.fsync = fsync
+        self.pid = os.getpid()
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        return self._fd
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _is_live(self, fd):
+        try:
+            return os.fstat(fd).st_ino == os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def append(self, entries):
+        """Append entries (dicts) as JSON lines; returns once they are in the file"""
+        data = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries).encode()
+        with self._lock:
+            while True:
+                fd = self._open()
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                try:
+                    # The file may have been sealed since it was opened; then write to a fresh one
+                    if self._is_live(fd):
+                        os.write(fd, data)
+                        if self.fsync:
+                            os.fsync(fd)
+                        return
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                self._close()
+
+    def seal(self):
+        """Turn the live file into a segment; returns its path or None when there is nothing to seal"""
+        segment = self.directory / f'answers-{time.time_ns()}.sealed'
+        try:
+            os.rename(self.path, segment)
+        except FileNotFoundError:
+            return None
+        # Wait for appends that started before the rename
+        fd = os.open(segment, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        finally:
+            os.close(fd)
+        return segment
+
+    def segments(self):
+        """Sealed segments, oldest first"""
+        return sorted(self.directory.glob(SEGMENT_GLOB))
+
+    def read(self, segment):
+        """Entries of a segment in file order; a line cut short by a crash is skipped"""
+        entries = []
+        with open(segment, encoding='utf-8') as handle:
+            for line in handle:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+    def remove(self, segment):
+        os.unlink(segment)
+
+    @contextmanager
+    def flush_lock(self, blocking=True):
+        """Serialise flushes across the node's processes; yields whether the lock was taken"""
+        fd = os.open(self.directory / 'flush.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    def pending_bytes(self):
+        paths = self.segments() + ([self.path] if self.path.exists() else [])
+        return sum(path.stat().st_size for path in paths)
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def journal_enabled():
+    return getattr(settings, 'EXAM_ANSWER_JOURNAL', False)
+
+
+def answer_journal():
+    """This process's handle on the journal (reopened in a forked child)"""
+    global _journal
+    if _journal is None or _journal.pid != os.getpid():
+        with _journal_lock:
+            if _journal is None or _journal.pid != os.getpid():
+                _journal = AnswerJournal(
+                    getattr(settings, 'EXAM_ANSWER_JOURNAL_DIR', settings.BASE_DIR / 'var' / 'journal'),
+                    fsync=getattr(settings, 'EXAM_ANSWER_JOURNAL_FSYNC', False),
+                )
+    return _journal
@@ -0,0 +1,111 @@
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from exams.archive import ANSWER_FIELDS, ArchiveWriter, archive_dir, attempt_record
+from exams.models import ArchivedAttempt, ExamAttempt, SectionAttempt, UserAnswer
+
+ARCHIVABLE_STATUSES = ['completed', 'auto_submitted', 'terminated']
+
+
+class Command(BaseCommand):
+    help = "Move completed attempts older than a threshold out of the live tables into compressed archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, dest='days',
+                            default=getattr(settings, 'EXAM_ARCHIVE_AFTER_DAYS', 180),
+                            help="Archive attempts that ended more than this many days ago")
+        parser.add_argument('--exam', type=int, help="Only attempts of this mock exam")
+        parser.add_argument('--batch-size', type=int, default=200, help="Attempts moved per transaction")
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'EXAM_ARCHIVE_CHUNK_ATTEMPTS', 5000),
+                            help="Attempts per archive file")
+        parser.add_argument('--limit', type=int, help="Stop after this many attempts (continue with another run)")
+        parser.add_argument('--dir', default=None, help="Archive directory (default: EXAM_ARCHIVE_DIR)")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the attempts that would be archived")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Attempts whose scoring has not finished yet stay live
+        attempts = ExamAttempt.objects.filter(
+            status__in=ARCHIVABLE_STATUSES,
+            end_time__lt=cutoff,
+            total_score__isnull=False,
+        ).order_by('id')
+        if options['exam']:
+            attempts = attempts.filter(exam_id=options['exam'])
+
+        if options['dry_run']:
+            self.stdout.write(f"{attempts.count()} attempt(s) ended before {cutoff:%Y-%m-%d %H:%M} would be archived")
+            return
+
+        # Progress lives in the database: an interrupted run leaves its unarchived attempts live for the next one
+        writer = ArchiveWriter(Path(options['dir']) if options['dir'] else archive_dir(), options['chunk_size'])
+        archived = 0
+        last_id = 0
+        try:
+            while options['limit'] is None or archived < options['limit']:
+                size = options['batch_size'] if options['limit'] is None else min(options['batch_size'], options['limit'] - archived)
+                batch = list(attempts.filter(id__gt=last_id)[:size])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                archived += self.archive_batch(writer, batch)
+                self.stdout.write(f"Archived {archived} attempt(s), up to id {last_id}, into {writer.path.name}")
+        finally:
+            writer.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} attempt(s) that ended before {cutoff:%Y-%m-%d %H:%M}"))
+
+    def archive_batch(self, writer, batch):
+        section_attempts = defaultdict(list)
+        for section_attempt in SectionAttempt.objects.filter(exam_attempt__in=batch).order_by('id'):
+            section_attempts[section_attempt.exam_attempt_id].append(section_attempt)
+        section_attempt_ids = [sa.id for attempt_sections in section_attempts.values() for sa in attempt_sections]
+
+        answers = defaultdict(list)
+        rows = UserAnswer.objects.filter(
+            section_attempt_id__in=section_attempt_ids
+        ).order_by('id').values_list('section_attempt_id', *ANSWER_FIELDS)
+        for section_attempt_id, *answer in rows:
+            answers[section_attempt_id].append(answer)
+
+        summaries = []
+        for exam_attempt in batch:
+            archive_file, offset, length = writer.write(
+                attempt_record(exam_attempt, section_attempts[exam_attempt.id], answers)
+            )
+            summaries.append(ArchivedAttempt(
+                attempt_id=exam_attempt.id,
+                user_id=exam_attempt.user_id,
+                exam_id=exam_attempt.exam_id,
+                status=exam_attempt.status,
+                start_time=exam_attempt.start_time,
+                end_time=exam_attempt.end_time,
+                total_score=exam_attempt.total_score,
+                percentage_score=exam_attempt.percentage_score,
+                passed=exam_attempt.passed,
+                archive_file=archive_file,
+                offset=offset,
+                length=length,
+            ))
+        # The records must be on disk before the rows they replace are deleted
+        writer.sync()
+
+        with transaction.atomic():
+            ArchivedAttempt.objects.bulk_create(summaries)
+            if section_attempt_ids:
+                # One statement instead of a delete signal per answer; archived attempts need no ETag bumps
+                placeholders = ', '.join(['%s'] * len(section_attempt_ids))
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'DELETE FROM {UserAnswer._meta.db_table} WHERE section_attempt_id IN ({placeholders})',
+                        section_attempt_ids,
+                    )
+            SectionAttempt.objects.filter(id__in=section_attempt_ids).delete()
+            ExamAttempt.objects.filter(id__in=[exam_attempt.id for exam_attempt in batch]).delete()
+        return len(batch)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.bankstore import compile_bank, open_bank_store
+from exams.models import QuestionBankVersion
+
+
+class Command(BaseCommand):
+    help = "Compile published question-bank versions into memory-mapped files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, help="Only versions of this mock exam")
+        parser.add_argument('--bank-version', type=int, dest='version_id', help="Only this bank version id")
+        parser.add_argument('--force', action='store_true', help="Recompile versions that already have a file")
+
+    def handle(self, *args, **options):
+        versions = QuestionBankVersion.objects.select_related('exam').order_by('id')
+        if options['exam']:
+            versions = versions.filter(exam_id=options['exam'])
+        if options['version_id']:
+            versions = versions.filter(id=options['version_id'])
+            if not versions.exists():
+                raise CommandError(f"Bank version {options['version_id']} does not exist")
+
+        compiled = 0
+        for version in versions.iterator():
+            # Files of an older format do not open and are compiled again
+            if not options['force'] and open_bank_store(version.id) is not None:
+                continue
+            path = compile_bank(version)
+            compiled += 1
+            self.stdout.write(f"{version}: {version.question_count} questions -> {path} ({path.stat().st_size} bytes)")
+
+        self.stdout.write(self.style.SUCCESS(f"Compiled {compiled} bank version(s)"))
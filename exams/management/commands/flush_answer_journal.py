@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from exams.answers import flush_answer_journal
+from exams.journal import answer_journal, journal_enabled
+
+
+class Command(BaseCommand):
+    help = "Apply journaled answer changes to the database (crash recovery, or a dedicated flusher with --every)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help="Keep flushing every N seconds")
+
+    def handle(self, *args, **options):
+        if not journal_enabled():
+            raise CommandError("The answer journal is disabled (EXAM_ANSWER_JOURNAL)")
+
+        journal = answer_journal()
+        while True:
+            pending = journal.pending_bytes()
+            started = time.perf_counter()
+            flushed = flush_answer_journal()
+            if flushed or not options['every']:
+                self.stdout.write(
+                    f"Applied {flushed} journaled changes ({pending} bytes) in {(time.perf_counter() - started) * 1000:.0f} ms"
+                )
+            if not options['every']:
+                break
+            close_old_connections()
+            time.sleep(options['every'])
@@ -0,0 +1,347 @@
+import math
+import random
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+WORDS = (
+    'analysis', 'argument', 'assumption', 'balance', 'capacity', 'claim', 'conclusion', 'context',
+    'data', 'decision', 'evidence', 'factor', 'function', 'graph', 'growth', 'hypothesis', 'impact',
+    'inference', 'interest', 'issue', 'logic', 'matrix', 'measure', 'method', 'model', 'outcome',
+    'pattern', 'principle', 'probability', 'process', 'ratio', 'reason', 'relation', 'result',
+    'sequence', 'series', 'signal', 'source', 'statement', 'strategy', 'structure', 'system',
+    'table', 'theory', 'trend', 'value', 'variable', 'vector', 'volume', 'weight',
+)
+STEMS = (
+    'Which of the following best describes', 'What is the most likely', 'Which statement about',
+    'Calculate the', 'Identify the', 'What follows from', 'Which option weakens',
+)
+FIRST_NAMES = ('Anna', 'Ben', 'Chen', 'Daria', 'Emil', 'Fatima', 'Goran', 'Hana', 'Ivan', 'Julia', 'Kai', 'Lena')
+LAST_NAMES = ('Berg', 'Costa', 'Dahl', 'Ek', 'Fischer', 'Garcia', 'Holm', 'Ito', 'Jensen', 'Kowalski', 'Lund', 'Meyer')
+DIFFICULTY_OFFSET = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0}
+
+
+def _init_worker():
+    # Spawned (non-forked) workers need their own Django setup
+    django.setup()
+
+
+def _hash(seed, *parts):
+    """Stable 32-bit hash; lets any process recompute a generated value without a query"""
+    return zlib.crc32(':'.join(map(str, (seed,) + parts)).encode())
+
+
+def question_difficulty(seed, number):
+    bucket = _hash(seed, 'difficulty', number) % 10
+    return 'easy' if bucket < 3 else 'medium' if bucket < 8 else 'hard'
+
+
+def correct_option_index(seed, number):
+    return _hash(seed, 'correct', number) % 4
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_questions(plan, start, stop):
+    """Insert questions ``start``..``stop`` (global numbers) and their options"""
+    from exams.models import Question, QuestionOption
+
+    seed, per_section = plan['seed'], plan['questions_per_section']
+    questions, options = [], []
+    for number in range(start, stop):
+        rng = random.Random(f"{seed}:question:{number}")
+        question_id = plan['question_base'] + number
+        questions.append(Question(
+            id=question_id,
+            section_id=plan['section_ids'][number // per_section],
+            question_text=f"{rng.choice(STEMS)} the {_sentence(rng, rng.randint(4, 14))}?",
+            difficulty=question_difficulty(seed, number),
+            explanation=_sentence(rng, 12),
+        ))
+        correct = correct_option_index(seed, number)
+        for index, letter in enumerate('ABCD'):
+            options.append(QuestionOption(
+                id=plan['option_base'] + number * 4 + index,
+                question_id=question_id,
+                option_letter=letter,
+                option_text=_sentence(rng, rng.randint(1, 6)),
+                is_correct=index == correct,
+            ))
+
+    with transaction.atomic():
+        Question.objects.bulk_create(questions, batch_size=plan['batch_size'])
+        QuestionOption.objects.bulk_create(options, batch_size=plan['batch_size'])
+    return len(questions)
+
+
+def generate_candidates(plan, start, stop):
+    """Insert candidates ``start``..``stop`` with their attempts, section attempts and answers"""
+    from exams.models import ExamAttempt, SectionAttempt, UserAnswer
+
+    seed = plan['seed']
+    sections = plan['sections']
+    per_section = plan['questions_per_section']
+    attempts_per_user = plan['attempts_per_user']
+    end = datetime.fromisoformat(plan['end'])
+
+    users, attempts, section_attempts, answers = [], [], [], []
+    for number in range(start, stop):
+        rng = random.Random(f"{seed}:candidate:{number}")
+        ability = rng.gauss(0, 1)
+        user_id = plan['user_base'] + number
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        starts = sorted(end - timedelta(days=plan['days'] * rng.random()) for _ in range(attempts_per_user))
+        users.append(User(
+            id=user_id,
+            username=f"{plan['prefix']}{number:07d}",
+            email=f"{plan['prefix']}{number:07d}@example.com",
+            first_name=first_name,
+            last_name=last_name,
+            password=plan['password'],
+            date_joined=starts[0] - timedelta(days=rng.randint(1, 30)),
+        ))
+
+        for attempt_number, started in enumerate(starts):
+            attempt_index = number * attempts_per_user + attempt_number
+            attempt_id = plan['attempt_base'] + attempt_index
+            roll = rng.random()
+            last = attempt_number == attempts_per_user - 1
+            status = 'in_progress' if last and roll < 0.03 else 'auto_submitted' if roll < 0.11 else 'completed'
+            sections_taken = rng.randint(1, len(sections) - 1) if status == 'in_progress' else len(sections)
+
+            clock = started
+            total_score = max_total = 0
+            passed = True
+            current_section_id = None
+            for position, section in enumerate(sections):
+                section_attempt_id = plan['section_attempt_base'] + attempt_index * len(sections) + position
+                max_total += section['max_score']
+                if position > sections_taken:
+                    # Pre-provisioned, not reached yet
+                    section_attempts.append(SectionAttempt(
+                        id=section_attempt_id, exam_attempt_id=attempt_id, section_id=section['id'],
+                        max_possible_score=section['max_score'],
+                    ))
+                    passed = False
+                    continue
+
+                current_section_id = section['id']
+                in_progress = position == sections_taken
+                duration = timedelta(minutes=section['duration_minutes'])
+                used = duration if status == 'auto_submitted' else duration * rng.uniform(0.5, 1.0)
+                section_start = clock + timedelta(seconds=rng.uniform(5, 90))
+                clock = section_start + used
+
+                count = int(min(plan['answers_per_section'], per_section) * rng.uniform(0.6, 1.0))
+                score = correct_count = 0
+                for question_number in rng.sample(range(per_section), count):
+                    global_number = section['index'] * per_section + question_number
+                    offset = DIFFICULTY_OFFSET[question_difficulty(seed, global_number)]
+                    correct = correct_option_index(seed, global_number)
+                    is_correct = rng.random() < 1 / (1 + math.exp(offset - ability - 0.5))
+                    choice = correct if is_correct else rng.choice([index for index in range(4) if index != correct])
+                    points = 1 if is_correct else (-0.25 if section['negative_marking'] else 0)
+                    score += points
+                    correct_count += is_correct
+                    answers.append(UserAnswer(
+                        section_attempt_id=section_attempt_id,
+                        question_id=plan['question_base'] + global_number,
+                        selected_option_id=plan['option_base'] + global_number * 4 + choice,
+                        is_correct=is_correct,
+                        points_earned=points,
+                    ))
+
+                score = max(0, score)
+                total_score += score
+                passed = passed and score >= section['min_pass_score']
+                section_attempts.append(SectionAttempt(
+                    id=section_attempt_id,
+                    exam_attempt_id=attempt_id,
+                    section_id=section['id'],
+                    start_time=section_start,
+                    end_time=None if in_progress else clock,
+                    score=None if in_progress else score,
+                    max_possible_score=section['max_score'],
+                    questions_answered=count,
+                    questions_correct=correct_count,
+                    is_completed=not in_progress,
+                    current_question_index=max(0, count - 1),
+                    answer_revision=count,
+                ))
+
+            finished = status != 'in_progress'
+            attempts.append(ExamAttempt(
+                id=attempt_id,
+                user_id=user_id,
+                exam_id=plan['exam_id'],
+                status=status,
+                start_time=started,
+                end_time=clock if finished else None,
+                current_section_id=current_section_id,
+                total_score=total_score if finished else None,
+                percentage_score=(total_score / max_total * 100 if max_total else 0) if finished else None,
+                passed=passed if finished else None,
+                last_activity=clock,
+                paper_seed=rng.randint(1, 2 ** 31 - 1),
+            ))
+
+    batch_size = plan['batch_size']
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+        ExamAttempt.objects.bulk_create(attempts, batch_size=batch_size)
+        SectionAttempt.objects.bulk_create(section_attempts, batch_size=batch_size)
+        UserAnswer.objects.bulk_create(answers, batch_size=batch_size)
+
+        # created_at and answered_at are auto_now_add; move them onto the generated timeline
+        first_attempt = plan['attempt_base'] + start * attempts_per_user
+        last_attempt = plan['attempt_base'] + stop * attempts_per_user
+        ExamAttempt.objects.filter(id__gte=first_attempt, id__lt=last_attempt).update(created_at=F('start_time'))
+        UserAnswer.objects.filter(
+            section_attempt_id__gte=plan['section_attempt_base'] + start * attempts_per_user * len(sections),
+            section_attempt_id__lt=plan['section_attempt_base'] + stop * attempts_per_user * len(sections),
+        ).update(answered_at=Subquery(
+            SectionAttempt.objects.filter(pk=OuterRef('section_attempt_id')).values(
+                when=Coalesce('end_time', 'start_time')
+            )[:1]
+        ))
+    return len(users), len(attempts), len(section_attempts), len(answers)
+
+
+def _run_chunk(task):
+    kind, plan, start, stop = task
+    if kind == 'questions':
+        return generate_questions(plan, start, stop)
+    return generate_candidates(plan, start, stop)
+
+
+class Command(BaseCommand):
+    help = "Generate a large, seeded synthetic dataset (questions, candidates, attempts, answers) for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--questions-per-section', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--attempts-per-user', type=int, default=2)
+        parser.add_argument('--answers-per-section', type=int, default=20, help="Questions a candidate answers per section at most")
+        parser.add_argument('--days', type=int, default=90, help="Attempts are spread over this many days before --end-date")
+        parser.add_argument('--end-date', help="YYYY-MM-DD the generated timeline ends on (default: today); fix it for identical output")
+        parser.add_argument('--prefix', help="Username prefix (default: synth<seed>_)")
+        parser.add_argument('--password', default='synthetic-pass-1', help="Password of every generated candidate")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Insert processes; keep 1 on SQLite, which allows a single writer")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Candidates (or 10x questions) per transaction")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        from exams.models import (
+            ExamAttempt, ExamSection, MockExam, MockExamSection, Question, QuestionOption, SectionAttempt,
+        )
+
+        started = time.perf_counter()
+        seed = options['seed']
+        prefix = options['prefix'] or f'synth{seed}_'
+        if User.objects.filter(username=f'{prefix}{0:07d}').exists():
+            raise CommandError(f"Candidates with prefix {prefix!r} already exist; use another --seed or --prefix")
+
+        end_date = parse_date(options['end_date']) if options['end_date'] else timezone.localdate()
+        if end_date is None:
+            raise CommandError("--end-date must be YYYY-MM-DD")
+        end = timezone.make_aware(datetime.combine(end_date, dt_time(18, 0)))
+
+        sections = []
+        for position, (name, display_name) in enumerate(ExamSection.SECTION_CHOICES):
+            section, _ = ExamSection.objects.get_or_create(
+                name=name, defaults={'display_name': display_name, 'duration_minutes': 25}
+            )
+            sections.append(section)
+        exam = MockExam.objects.create(name=f'Synthetic Mock Exam (seed {seed})')
+        MockExamSection.objects.bulk_create([
+            MockExamSection(exam=exam, section=section, position=position) for position, section in enumerate(sections)
+        ])
+
+        # Ids are assigned up front so every chunk can reference rows created by other chunks
+        def next_id(model):
+            return (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+
+        plan = {
+            'seed': seed,
+            'prefix': prefix,
+            'password': make_password(options['password']),
+            'end': end.isoformat(),
+            'days': options['days'],
+            'exam_id': exam.id,
+            'section_ids': [section.id for section in sections],
+            'sections': [
+                {
+                    'index': index,
+                    'id': section.id,
+                    'duration_minutes': section.duration_minutes,
+                    'max_score': section.max_score,
+                    'min_pass_score': section.min_pass_score,
+                    'negative_marking': section.has_negative_marking,
+                }
+                for index, section in enumerate(sections)
+            ],
+            'questions_per_section': options['questions_per_section'],
+            'attempts_per_user': options['attempts_per_user'],
+            'answers_per_section': options['answers_per_section'],
+            'batch_size': options['batch_size'],
+            'user_base': next_id(User),
+            'question_base': next_id(Question),
+            'option_base': next_id(QuestionOption),
+            'attempt_base': next_id(ExamAttempt),
+            'section_attempt_base': next_id(SectionAttempt),
+        }
+
+        total_questions = options['questions_per_section'] * len(sections)
+        question_chunk = options['chunk_size'] * 10
+        phases = [
+            ('questions', [('questions', plan, start, min(start + question_chunk, total_questions))
+                           for start in range(0, total_questions, question_chunk)]),
+            ('candidates', [('candidates', plan, start, min(start + options['chunk_size'], options['users']))
+                            for start in range(0, options['users'], options['chunk_size'])]),
+        ]
+
+        totals = {}
+        for phase, tasks in phases:
+            phase_started = time.perf_counter()
+            if options['workers'] > 1:
+                # Children must not share the parent's database connection
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                    results = list(pool.map(_run_chunk, tasks))
+            else:
+                results = [_run_chunk(task) for task in tasks]
+            totals[phase] = [sum(column) for column in zip(*results)] if phase == 'candidates' else [sum(results)]
+            self.stdout.write(f"{phase}: {len(tasks)} chunks in {time.perf_counter() - phase_started:.1f}s")
+
+        # Explicit ids leave sequences behind on backends that have them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Question, QuestionOption, ExamAttempt, SectionAttempt]
+            ):
+                cursor.execute(sql)
+        ExamSection.objects.filter(id__in=plan['section_ids']).update(content_version=F('content_version') + 1)
+        # Answers were bulk-inserted around the incremental counters; count them once at the end
+        call_command('rebuild_answer_counters', stdout=self.stdout, stderr=self.stderr)
+
+        users, attempts, section_attempts, answers = totals['candidates'] or [0, 0, 0, 0]
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated exam {exam.id}: {totals['questions'][0]} questions, {users} candidates, {attempts} attempts, "
+            f"{section_attempts} section attempts, {answers} answers in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,65 @@
+import csv
+import sys
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from exams.access_codes import format_access_code
+from exams.models import ExamAccessCode, MockExam
+
+
+class Command(BaseCommand):
+    help = "Issue single-use exam-day access codes for candidates of a mock exam"
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int)
+        parser.add_argument('--users', help="Comma-separated usernames (default: all active non-staff users)")
+        parser.add_argument('--valid-from', help="ISO datetime the codes become valid (default: now)")
+        parser.add_argument('--hours', type=float, default=4, help="Hours the codes stay valid")
+        parser.add_argument('--output', help="CSV file to write the codes to (default: stdout)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            exam = MockExam.objects.get(id=options['exam_id'])
+        except MockExam.DoesNotExist:
+            raise CommandError(f"Mock exam {options['exam_id']} does not exist")
+
+        valid_from = timezone.now()
+        if options['valid_from']:
+            valid_from = parse_datetime(options['valid_from'])
+            if valid_from is None:
+                raise CommandError("--valid-from must be an ISO datetime")
+            if timezone.is_naive(valid_from):
+                valid_from = timezone.make_aware(valid_from)
+        valid_until = valid_from + timedelta(hours=options['hours'])
+
+        users = User.objects.filter(is_active=True)
+        if options['users']:
+            users = users.filter(username__in=[name.strip() for name in options['users'].split(',')])
+        else:
+            users = users.filter(is_staff=False)
+        users = list(users.only('id', 'username', 'email').order_by('id'))
+
+        codes = ExamAccessCode.objects.bulk_create(
+            [ExamAccessCode(user=user, exam=exam, valid_from=valid_from, valid_until=valid_until) for user in users],
+            batch_size=options['batch_size'],
+        )
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            writer = csv.writer(output)
+            writer.writerow(['username', 'email', 'access_code', 'valid_from', 'valid_until'])
+            for code in codes:
+                writer.writerow([
+                    code.user.username, code.user.email, format_access_code(code),
+                    valid_from.isoformat(), valid_until.isoformat(),
+                ])
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS(f"Issued {len(codes)} access codes for {exam.name}"))
@@ -0,0 +1,155 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from exams.bank import attempt_answer_key
+from exams.models import SectionAttempt, UserAnswer
+from exams.packed import PackedLayoutError, paper_layout
+
+
+class Command(BaseCommand):
+    help = "Move the answers of completed pinned section attempts from UserAnswer rows into packed storage (or back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, help="Only attempts of this mock exam")
+        parser.add_argument('--batch-size', type=int, default=500, help="Section attempts converted per transaction")
+        parser.add_argument('--unpack', action='store_true', help="Turn packed answers back into UserAnswer rows")
+        parser.add_argument('--repair', action='store_true',
+                            help="Turn packed answers that no longer fit their paper's layout back into UserAnswer rows")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+
+    def handle(self, *args, **options):
+        if options['repair']:
+            self.repair(options)
+            return
+
+        # Sections still being answered keep their current storage; new attempts follow EXAM_PACKED_ANSWERS
+        section_attempts = SectionAttempt.objects.filter(
+            is_completed=True,
+            exam_attempt__bank_version__isnull=False,
+            packed_answers__isnull=not options['unpack'],
+        ).select_related('exam_attempt', 'section').order_by('id')
+        if options['exam']:
+            section_attempts = section_attempts.filter(exam_attempt__exam_id=options['exam'])
+
+        convert = self.unpack_batch if options['unpack'] else self.pack_batch
+        totals = {'converted': 0, 'skipped': 0, 'answers': 0, 'bytes': 0}
+        last_id = 0
+        while True:
+            batch = list(section_attempts.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            with transaction.atomic():
+                for key, value in convert(batch, options['dry_run']).items():
+                    totals[key] += value
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+            self.stdout.write(f"Section attempts up to id {last_id}: {totals['converted']} converted, {totals['skipped']} skipped")
+
+        verb = 'Would convert' if options['dry_run'] else 'Converted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['converted']} section attempt(s) with {totals['answers']} answer(s) "
+            f"({totals['bytes']} packed bytes); skipped {totals['skipped']}"
+        ))
+
+    def pack_batch(self, batch, dry_run):
+        selections = {section_attempt.id: {} for section_attempt in batch}
+        rows = UserAnswer.objects.filter(
+            section_attempt_id__in=selections,
+            selected_option__isnull=False
+        ).values_list('section_attempt_id', 'question_id', 'selected_option_id')
+        for section_attempt_id, question_id, option_id in rows:
+            selections[section_attempt_id][question_id] = option_id
+
+        counts = {'converted': 0, 'skipped': 0, 'answers': 0, 'bytes': 0}
+        packed_ids = []
+        for section_attempt in batch:
+            layout = paper_layout(section_attempt.exam_attempt, section_attempt.section)
+            packed = layout.encode(selections[section_attempt.id])
+            if layout.decode(packed) != selections[section_attempt.id]:
+                # An answer is not on the attempt's paper; keep the rows rather than lose it
+                self.stderr.write(f"Section attempt {section_attempt.id}: answers outside its paper, left as rows")
+                counts['skipped'] += 1
+                continue
+            SectionAttempt.objects.filter(pk=section_attempt.pk).update(
+                packed_answers=packed, answer_revision=F('answer_revision') + 1
+            )
+            packed_ids.append(section_attempt.id)
+            counts['converted'] += 1
+            counts['answers'] += len(selections[section_attempt.id])
+            counts['bytes'] += len(packed)
+
+        if packed_ids and not dry_run:
+            # One statement instead of a delete signal per row; completed sections need no ETag bumps per answer
+            placeholders = ', '.join(['%s'] * len(packed_ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {UserAnswer._meta.db_table} WHERE section_attempt_id IN ({placeholders})',
+                    packed_ids,
+                )
+        return counts
+
+    def repair(self, options):
+        # Bytes written before questions_per_paper was pinned may follow a paper drawn with another value
+        section_attempts = SectionAttempt.objects.filter(
+            exam_attempt__bank_version__isnull=False,
+            packed_answers__isnull=False,
+        ).select_related('exam_attempt', 'section').order_by('id')
+        if options['exam']:
+            section_attempts = section_attempts.filter(exam_attempt__exam_id=options['exam'])
+
+        repaired = 0
+        for section_attempt in section_attempts.iterator(chunk_size=options['batch_size']):
+            packed = bytes(section_attempt.packed_answers)
+            try:
+                paper_layout(section_attempt.exam_attempt, section_attempt.section).check(packed)
+                continue
+            except PackedLayoutError as error:
+                self.stderr.write(f"Section attempt {section_attempt.id}: {error}")
+
+            # A paper of n questions was drawn with questions_per_paper n (or the whole pool), so the length gives the layout
+            layout = paper_layout(section_attempt.exam_attempt, section_attempt.section, questions_per_paper=len(packed))
+            if len(layout) != len(packed):
+                self.stderr.write(f"Section attempt {section_attempt.id}: no layout fits its packed answers, left as is")
+                continue
+            answer_key = attempt_answer_key(section_attempt.exam_attempt)
+            answers = []
+            for question_id, option_id in layout.decode(packed).items():
+                answer = UserAnswer(section_attempt=section_attempt, question_id=question_id, selected_option_id=option_id)
+                answer.is_correct, answer.points_earned = answer_key.get(question_id).score(option_id)
+                answers.append(answer)
+            if options['dry_run']:
+                repaired += 1
+                continue
+            with transaction.atomic():
+                # The revision check skips a section written to since it was read; the next run picks it up
+                if SectionAttempt.objects.filter(pk=section_attempt.pk, answer_revision=section_attempt.answer_revision).update(
+                    packed_answers=None, answer_revision=F('answer_revision') + 1
+                ):
+                    UserAnswer.objects.bulk_create(answers)
+                    repaired += 1
+
+        verb = 'Would repair' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {repaired} section attempt(s) into UserAnswer rows"))
+
+    def unpack_batch(self, batch, dry_run):
+        counts = {'converted': 0, 'skipped': 0, 'answers': 0, 'bytes': 0}
+        answers = []
+        for section_attempt in batch:
+            layout = paper_layout(section_attempt.exam_attempt, section_attempt.section)
+            answer_key = attempt_answer_key(section_attempt.exam_attempt)
+            for question_id, option_id in layout.decode(section_attempt.packed_answers).items():
+                answer = UserAnswer(section_attempt=section_attempt, question_id=question_id, selected_option_id=option_id)
+                answer.is_correct, answer.points_earned = answer_key.get(question_id).score(option_id)
+                answers.append(answer)
+            counts['converted'] += 1
+            counts['bytes'] += len(section_attempt.packed_answers)
+
+        counts['answers'] = len(answers)
+        if not dry_run:
+            UserAnswer.objects.bulk_create(answers)
+            SectionAttempt.objects.filter(id__in=[section_attempt.id for section_attempt in batch]).update(
+                packed_answers=None, answer_revision=F('answer_revision') + 1
+            )
+        return counts
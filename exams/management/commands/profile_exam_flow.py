@@ -0,0 +1,260 @@
+import cProfile
+import io
+import json
+import pstats
+import random
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from exams.models import ExamAttempt, MockExam
+from exams.querylog import QueryRecorder, duplicate_groups
+
+# Files whose repeated queries the report singles out
+HIGHLIGHT_FILES = ('exams/views.py', 'exams/admin.py')
+
+ADMIN_MODELS = ['examsection', 'question', 'mockexam', 'questionbankversion', 'examattempt', 'sectionattempt', 'useranswer']
+
+
+class Command(BaseCommand):
+    help = "Drive one simulated candidate through the exam flow and report time, SQL and repeated queries per step"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, help="Mock exam id (default: the first active exam)")
+        parser.add_argument('--answers', type=int, default=10, help="Answers saved per section")
+        parser.add_argument('--seed', type=int, default=1, help="Seed for the options the candidate picks")
+        parser.add_argument('--admin', action='store_true', help="Also profile the exams admin pages as a superuser")
+        parser.add_argument('--output-dir', default=str(settings.BASE_DIR / 'var' / 'profiles'))
+        parser.add_argument('--format', choices=['json', 'html', 'both'], default='both')
+        parser.add_argument('--stack-depth', type=int, default=8, help="Project frames kept per SQL statement")
+        parser.add_argument('--top', type=int, default=25, help="Functions listed per profile")
+        parser.add_argument('--keep', action='store_true', help="Keep the created users and attempt instead of rolling back")
+
+    def handle(self, *args, **options):
+        exams = MockExam.objects.filter(is_active=True).order_by('id')
+        exam = exams.filter(id=options['exam']).first() if options['exam'] else exams.first()
+        if not exam:
+            raise CommandError("No active mock exam to profile")
+
+        self.stack_depth = options['stack_depth']
+        self.top = options['top']
+        self.steps = []
+        self.profiles = {}
+
+        # Rate limits and load shedding would turn a fast scripted candidate into 429/503s;
+        # query budgets and tracing would add their own overhead to the timings
+        with override_settings(
+            EXAM_API_RATE_LIMITS={},
+            EXAM_API_LOW_PRIORITY=[],
+            EXAM_QUERY_BUDGET_ENFORCE=False,
+            EXAM_TRACING=False,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ):
+            with transaction.atomic():
+                self.run_candidate(exam, options['answers'], random.Random(options['seed']))
+                if options['admin']:
+                    self.run_admin(exam)
+                if not options['keep']:
+                    transaction.set_rollback(True)
+
+        report = self.build_report(exam)
+        self.write_summary(report)
+
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stem = output_dir / f"exam-{exam.id}-{timezone.now():%Y%m%d-%H%M%S}"
+        if options['format'] in ('json', 'both'):
+            path = stem.with_suffix('.json')
+            path.write_text(json.dumps(report, indent=2, default=str))
+            self.stdout.write(f"Wrote {path}")
+        if options['format'] in ('html', 'both'):
+            path = stem.with_suffix('.html')
+            path.write_text(render_to_string('exams/reports/profile_exam_flow.html', report))
+            self.stdout.write(f"Wrote {path}")
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def run_candidate(self, exam, answers_per_section, rng):
+        candidate = User.objects.create_user(f'profile-{uuid.uuid4().hex[:12]}')
+        client = self.client_for(candidate)
+        # Skip the waiting room; admission is not what is being profiled
+        session = client.session
+        session[f'exam_admission_{exam.id}'] = {'admitted': True}
+        session.save()
+
+        self.step(client, 'start_exam', 'get', reverse('exams:start_exam', args=[exam.id]))
+        self.step(client, 'take_exam', 'get', reverse('exams:take_exam', args=[exam.id]))
+
+        results_url = reverse('exams:results', args=[exam.id])
+        for _ in range(exam.sections.count()):
+            response = self.step(client, 'get_questions', 'get', reverse('exams:get_questions', args=[exam.id]))
+            if response.status_code != 200:
+                raise CommandError(f"get_questions returned {response.status_code}")
+
+            for question in response.json()['questions'][:answers_per_section]:
+                self.step(
+                    client, 'save_answer', 'post', reverse('exams:save_answer'),
+                    data=json.dumps({'question_id': question['id'], 'option_id': rng.choice(question['options'])['id']}),
+                    content_type='application/json',
+                )
+
+            response = self.step(client, 'submit_section', 'post', reverse('exams:submit_section', args=[exam.id]))
+            if response.url == results_url:
+                break
+            self.step(client, 'take_exam', 'get', response.url)
+
+        self.step(client, 'exam_results', 'get', results_url)
+        self.attempt = ExamAttempt.objects.filter(user=candidate, exam=exam).first()
+
+    def run_admin(self, exam):
+        admin_user = User.objects.create_superuser(f'profile-admin-{uuid.uuid4().hex[:12]}')
+        client = self.client_for(admin_user)
+
+        for model in ADMIN_MODELS:
+            self.step(client, f'admin {model} list', 'get', reverse(f'admin:exams_{model}_changelist'))
+        self.step(client, 'admin mockexam change', 'get', reverse('admin:exams_mockexam_change', args=[exam.id]))
+        if self.attempt:
+            self.step(client, 'admin examattempt change', 'get', reverse('admin:exams_examattempt_change', args=[self.attempt.id]))
+
+    def step(self, client, label, method, url, **kwargs):
+        """Issue one request under cProfile and the query recorder"""
+        profiler = cProfile.Profile()
+        with QueryRecorder(stack_depth=self.stack_depth) as recorder:
+            started = time.perf_counter()
+            profiler.enable()
+            response = getattr(client, method)(url, **kwargs)
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if label in self.profiles:
+            self.profiles[label].add(profiler)
+        else:
+            self.profiles[label] = pstats.Stats(profiler, stream=io.StringIO())
+
+        self.steps.append({
+            'label': label,
+            'method': method.upper(),
+            'path': url,
+            'status': response.status_code,
+            'ms': elapsed_ms,
+            'query_count': len(recorder.queries),
+            'query_ms': recorder.total_ms,
+            'duplicates': duplicate_groups(recorder.queries),
+            'queries': recorder.queries,
+        })
+        return response
+
+    def top_functions(self, stats, project_only):
+        root = str(Path(settings.BASE_DIR).resolve())
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            if project_only and (not filename.startswith(root) or 'site-packages' in filename):
+                continue
+            if project_only:
+                filename = str(Path(filename).relative_to(root))
+            rows.append({
+                'function': function,
+                'file': filename,
+                'line': line,
+                'calls': calls,
+                'tottime_ms': total * 1000,
+                'cumtime_ms': cumulative * 1000,
+            })
+        rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+        return rows[:self.top]
+
+    def build_report(self, exam):
+        by_label = defaultdict(list)
+        for step in self.steps:
+            by_label[step['label']].append(step)
+
+        views = [
+            {
+                'label': label,
+                'calls': len(steps),
+                'total_ms': sum(step['ms'] for step in steps),
+                'mean_ms': sum(step['ms'] for step in steps) / len(steps),
+                'max_ms': max(step['ms'] for step in steps),
+                'queries_per_call': sum(step['query_count'] for step in steps) / len(steps),
+                'query_ms': sum(step['query_ms'] for step in steps),
+                'repeated_queries': sum(group['count'] - 1 for step in steps for group in step['duplicates']),
+                'functions': self.top_functions(self.profiles[label], project_only=True),
+            }
+            for label, steps in by_label.items()
+        ]
+        views.sort(key=lambda view: view['total_ms'], reverse=True)
+
+        # A group repeated within one request is an N+1 candidate; merge the same site across requests
+        sites = {}
+        for step in self.steps:
+            for group in step['duplicates']:
+                site = sites.setdefault((group['site'], group['normalized']), {
+                    'site': group['site'],
+                    'normalized': group['normalized'],
+                    'stack': group['stack'],
+                    'highlight': group['site'].startswith(HIGHLIGHT_FILES),
+                    'views': set(),
+                    'requests': 0,
+                    'repeated': 0,
+                    'max_per_request': 0,
+                    'total_ms': 0,
+                })
+                site['views'].add(step['label'])
+                site['requests'] += 1
+                site['repeated'] += group['count'] - 1
+                site['max_per_request'] = max(site['max_per_request'], group['count'])
+                site['total_ms'] += group['total_ms']
+        n_plus_one = sorted(sites.values(), key=lambda site: (site['highlight'], site['repeated'], site['total_ms']), reverse=True)
+        for site in n_plus_one:
+            site['views'] = sorted(site['views'])
+
+        overall = pstats.Stats(stream=io.StringIO())
+        overall.add(*self.profiles.values())
+
+        return {
+            'generated_at': timezone.now().isoformat(),
+            'exam': {'id': exam.id, 'name': exam.name},
+            'totals': {
+                'requests': len(self.steps),
+                'ms': sum(step['ms'] for step in self.steps),
+                'queries': sum(step['query_count'] for step in self.steps),
+                'query_ms': sum(step['query_ms'] for step in self.steps),
+            },
+            'views': views,
+            'n_plus_one': n_plus_one,
+            'functions': self.top_functions(overall, project_only=False),
+            'steps': self.steps,
+        }
+
+    def write_summary(self, report):
+        totals = report['totals']
+        self.stdout.write(
+            f"{report['exam']['name']}: {totals['requests']} requests in {totals['ms']:.0f} ms, "
+            f"{totals['queries']} queries ({totals['query_ms']:.0f} ms)"
+        )
+        self.stdout.write(f"{'view':<32}{'calls':>7}{'total ms':>10}{'mean ms':>9}{'queries':>9}{'repeated':>10}")
+        for view in report['views']:
+            self.stdout.write(
+                f"{view['label']:<32}{view['calls']:>7}{view['total_ms']:>10.1f}{view['mean_ms']:>9.1f}"
+                f"{view['queries_per_call']:>9.1f}{view['repeated_queries']:>10}"
+            )
+
+        flagged = [site for site in report['n_plus_one'] if site['highlight']]
+        if flagged:
+            self.stdout.write(self.style.WARNING(f"{len(flagged)} repeated-query site(s) in {', '.join(HIGHLIGHT_FILES)}:"))
+            for site in flagged:
+                self.stdout.write(f"  {site['site']}: up to {site['max_per_request']}x per request ({', '.join(site['views'])})")
@@ -0,0 +1,112 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from exams.archive import rehydrate_attempt
+from exams.counters import OPTION_COUNTERS, QUESTION_COUNTERS
+from exams.models import ArchivedAttempt, Question, QuestionOption, SectionAttempt, UserAnswer
+from exams.packed import is_packed, paper_layout
+from exams.papers import paper_question_ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-question and per-option answer counters from the stored answers. "
+        "Answers written while it runs may be missed; run it outside exam windows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--live-only', action='store_true',
+                            help="Leave archived attempts out instead of reading them back from the archive files")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows written per UPDATE batch")
+        parser.add_argument('--dry-run', action='store_true', help="Report how many counters are off without writing")
+
+    def handle(self, *args, **options):
+        self.served = Counter()
+        self.answered = Counter()
+        self.correct = Counter()
+        self.picks = Counter()
+
+        self.count_answer_rows()
+        self.count_live_sections()
+        if not options['live_only']:
+            self.count_archived_attempts()
+
+        questions = []
+        for question in Question.objects.only('id', *QUESTION_COUNTERS):
+            counts = (self.served[question.id], self.answered[question.id], self.correct[question.id])
+            if counts != (question.times_served, question.times_answered, question.times_correct):
+                question.times_served, question.times_answered, question.times_correct = counts
+                questions.append(question)
+        options_changed = []
+        for option in QuestionOption.objects.only('id', *OPTION_COUNTERS):
+            if option.pick_count != self.picks[option.id]:
+                option.pick_count = self.picks[option.id]
+                options_changed.append(option)
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(questions)} question(s) and {len(options_changed)} option(s) have counters to correct")
+            return
+
+        with transaction.atomic():
+            Question.objects.bulk_update(questions, QUESTION_COUNTERS, batch_size=options['batch_size'])
+            QuestionOption.objects.bulk_update(options_changed, OPTION_COUNTERS, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Corrected the counters of {len(questions)} question(s) and {len(options_changed)} option(s)"
+        ))
+
+    def count_answer_rows(self):
+        answers = UserAnswer.objects.filter(selected_option__isnull=False)
+        for question_id, answered, correct in answers.values('question_id').annotate(
+            answered=Count('id'), correct=Count('id', filter=Q(is_correct=True))
+        ).values_list('question_id', 'answered', 'correct'):
+            self.answered[question_id] += answered
+            self.correct[question_id] += correct
+        for option_id, picks in answers.values('selected_option_id').annotate(
+            picks=Count('id')
+        ).values_list('selected_option_id', 'picks'):
+            self.picks[option_id] += picks
+
+    def count_live_sections(self):
+        # Served questions and packed answers are only known per section attempt
+        section_attempts = SectionAttempt.objects.filter(
+            Q(start_time__isnull=False) | Q(packed_answers__isnull=False)
+        ).select_related('exam_attempt', 'section')
+        for section_attempt in section_attempts.iterator(chunk_size=2000):
+            self.count_section(section_attempt.exam_attempt, section_attempt)
+        self.stdout.write(f"Counted {sum(self.answered.values())} live answer(s)")
+
+    def count_archived_attempts(self):
+        archived = 0
+        for summary in ArchivedAttempt.objects.order_by('id').iterator(chunk_size=500):
+            exam_attempt, section_attempts = rehydrate_attempt(summary)
+            for section_attempt in section_attempts:
+                if section_attempt.section is None:
+                    continue  # the section was deleted after archiving
+                self.count_section(exam_attempt, section_attempt)
+                for answer in section_attempt.archived_answers:
+                    if answer.selected_option_id is not None:
+                        self.answered[answer.question_id] += 1
+                        self.correct[answer.question_id] += bool(answer.is_correct)
+                        self.picks[answer.selected_option_id] += 1
+            archived += 1
+        self.stdout.write(f"Counted {archived} archived attempt(s)")
+
+    def count_section(self, exam_attempt, section_attempt):
+        """Served questions of a section attempt, and its answers when they are packed"""
+        if exam_attempt.bank_version_id:
+            layout = paper_layout(exam_attempt, section_attempt.section)
+            if section_attempt.start_time:
+                self.served.update(layout.question_ids)
+            if is_packed(section_attempt):
+                for position, value in enumerate(bytes(section_attempt.packed_answers)):
+                    if value:
+                        question_id = layout.question_ids[position]
+                        self.answered[question_id] += 1
+                        self.correct[question_id] += value == layout.correct[position]
+                        self.picks[layout.option_ids[position][value - 1]] += 1
+        elif section_attempt.start_time:
+            # Unpinned papers follow the live question tables, so older attempts count today's paper
+            self.served.update(paper_question_ids(exam_attempt, section_attempt.section))
@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from exams.tasks import claim_tasks, execute_task, task_metrics, worker_id
+
+# A failed attempt that will be retried leaves the task queued
+STATUS_LABELS = {'queued': 'retrying'}
+
+
+def run_task(task_id):
+    """Pool entry point: run one task on this thread's or process's own connection"""
+    try:
+        return task_id, execute_task(task_id)
+    finally:
+        close_old_connections()
+
+
+def init_process():
+    # A forked child must open its own database connections; drop the inherited ones without closing them
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+class Command(BaseCommand):
+    help = "Run deferred background tasks (scoring, snapshots, stats) in a thread or process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--concurrency', type=int, default=4, help="Tasks run at the same time")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds between checks when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once no task is due")
+        parser.add_argument('--stats', action='store_true', help="Print per-task counts and timings and exit")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+
+        worker = worker_id()
+        concurrency = max(1, options['concurrency'])
+        if options['pool'] == 'process':
+            pool = ProcessPoolExecutor(max_workers=concurrency, initializer=init_process)
+        else:
+            pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='task')
+        self.stdout.write(f"Worker {worker}: {options['pool']} pool of {concurrency}")
+
+        counts = {}
+        running = set()
+        try:
+            while True:
+                free = concurrency - len(running)
+                claimed = claim_tasks(worker, free) if free else []
+                for task_id in claimed:
+                    running.add(pool.submit(run_task, task_id))
+
+                if not running:
+                    if options['once']:
+                        break
+                    close_old_connections()
+                    time.sleep(options['poll'])
+                    continue
+
+                # Claim more once a slot frees up, or after the poll interval when the queue ran dry
+                done, running = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_id, status = future.result()
+                    status = STATUS_LABELS.get(status, status)
+                    counts[status] = counts.get(status, 0) + 1
+                    self.stdout.write(f"Task {task_id}: {status}")
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping; waiting for running tasks")
+        finally:
+            pool.shutdown(wait=True)
+
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+        self.stdout.write(f"Done: {summary or 'no tasks run'}")
+
+    def print_stats(self):
+        rows = task_metrics()
+        if not rows:
+            self.stdout.write("No tasks recorded")
+            return
+        self.stdout.write(
+            f"{'queued':>7}{'running':>8}{'ok':>7}{'failed':>7}{'retries':>8}{'avg ms':>9}{'max ms':>9}  task"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['queued']:>7}{row['running']:>8}{row['succeeded']:>7}{row['failed']:>7}{row['retries'] or 0:>8}"
+                f"{row['avg_ms'] or 0:>9.1f}{row['max_ms'] or 0:>9.1f}  {row['name']}"
+            )
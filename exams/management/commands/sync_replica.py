@@ -0,0 +1,38 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from exams.routers import replica_alias
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the replica file (local stand-in for replication)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help="Keep copying every N seconds, simulating replication lag")
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if not alias:
+            raise CommandError("No replica database configured; set EXAM_REPLICA_DB")
+        for name in (DEFAULT_DB_ALIAS, alias):
+            if connections[name].vendor != 'sqlite':
+                raise CommandError(f"'{name}' is not SQLite; replicate it with the database server instead")
+
+        replica_path = connections[alias].settings_dict['NAME']
+        while True:
+            started = time.perf_counter()
+            primary = connections[DEFAULT_DB_ALIAS]
+            primary.ensure_connection()
+            target = sqlite3.connect(replica_path)
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"Copied {primary.settings_dict['NAME']} to {replica_path} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,122 @@
+import json
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from exams.tracing import trace_dir
+
+# Self time of the root span is spent in middleware around the view
+KIND_LABELS = {'request': 'middleware'}
+
+
+def walk(span, depth=0):
+    """(span, depth, self time) for a span tree, parents first"""
+    children = span.get('children', [])
+    yield span, depth, span['duration_ms'] - sum(child['duration_ms'] for child in children)
+    for child in children:
+        yield from walk(child, depth + 1)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = "Summarise request traces: time by span kind and the slowest spans per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Trace directory (default: EXAM_TRACE_DIR)")
+        parser.add_argument('--endpoint', help="Only this URL name, e.g. exams:get_questions")
+        parser.add_argument('--hours', type=float, help="Only traces started in the last N hours")
+        parser.add_argument('--top', type=int, default=10, help="Spans listed per endpoint")
+        parser.add_argument('--trace', help="Print the span tree of one trace id")
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir']) if options['dir'] else trace_dir()
+        files = sorted(directory.glob('traces-*.jsonl'))
+        if not files:
+            raise CommandError(f"No trace files in {directory}")
+
+        since = timezone.now() - timedelta(hours=options['hours']) if options['hours'] else None
+        traces = []
+        for path in files:
+            with open(path, encoding='utf-8') as handle:
+                for line in handle:
+                    try:
+                        trace = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crashed worker
+                    if options['trace']:
+                        if trace['trace_id'] == options['trace']:
+                            self.print_tree(trace)
+                            return
+                        continue
+                    if options['endpoint'] and trace['endpoint'] != options['endpoint']:
+                        continue
+                    if since and parse_datetime(trace['started_at']) < since:
+                        continue
+                    traces.append(trace)
+
+        if options['trace']:
+            raise CommandError(f"Trace {options['trace']} not found")
+        if not traces:
+            self.stdout.write("No matching traces")
+            return
+
+        by_endpoint = defaultdict(list)
+        for trace in traces:
+            by_endpoint[trace['endpoint'] or trace['path']].append(trace)
+
+        for endpoint, endpoint_traces in sorted(by_endpoint.items(), key=lambda item: -sum(t['duration_ms'] for t in item[1])):
+            self.report_endpoint(endpoint, endpoint_traces, options['top'])
+
+    def report_endpoint(self, endpoint, traces, top):
+        durations = [trace['duration_ms'] for trace in traces]
+        slow = sum(1 for trace in traces if trace['reason'] == 'slow')
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{endpoint}: {len(traces)} traces ({slow} slow), "
+            f"p50 {percentile(durations, 0.5):.1f} ms, p95 {percentile(durations, 0.95):.1f} ms, max {max(durations):.1f} ms"
+        ))
+
+        by_kind = defaultdict(float)
+        spans = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'self_ms': 0.0})
+        for trace in traces:
+            for span, depth, self_ms in walk(trace['root']):
+                by_kind[KIND_LABELS.get(span['kind'], span['kind'])] += self_ms
+                if depth == 0:
+                    continue
+                entry = spans[(span['kind'], span['name'])]
+                entry['count'] += 1
+                entry['total_ms'] += span['duration_ms']
+                entry['self_ms'] += self_ms
+                entry['max_ms'] = max(entry['max_ms'], span['duration_ms'])
+
+        total = sum(by_kind.values()) or 1
+        breakdown = ', '.join(
+            f"{kind} {ms / len(traces):.1f} ms ({ms / total:.0%})"
+            for kind, ms in sorted(by_kind.items(), key=lambda item: -item[1])
+        )
+        self.stdout.write(f"  mean self time: {breakdown}")
+
+        self.stdout.write(f"  {'kind':<10}{'count':>8}{'total ms':>11}{'self ms':>10}{'max ms':>9}  span")
+        ranked = sorted(spans.items(), key=lambda item: -item[1]['total_ms'])
+        for (kind, name), entry in ranked[:top]:
+            self.stdout.write(
+                f"  {kind:<10}{entry['count']:>8}{entry['total_ms']:>11.1f}{entry['self_ms']:>10.1f}{entry['max_ms']:>9.1f}  {name[:100]}"
+            )
+        self.stdout.write('')
+
+    def print_tree(self, trace):
+        self.stdout.write(
+            f"{trace['method']} {trace['path']} -> {trace['status']} in {trace['duration_ms']:.1f} ms "
+            f"({trace['reason']}, {trace['spans']} spans, {trace['dropped_spans']} dropped)"
+        )
+        for span, depth, self_ms in walk(trace['root']):
+            self.stdout.write(
+                f"{span['start_ms']:>9.1f} {span['duration_ms']:>9.2f} {self_ms:>9.2f}  {'  ' * depth}[{span['kind']}] {span['name'][:120]}"
+            )
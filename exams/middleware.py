@@ -0,0 +1,127 @@
+import math
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.middleware.gzip import GZipMiddleware
+
+from .querybudget import check_budget, view_budget
+from .querylog import QueryRecorder
+from .routers import PIN_COOKIE, begin_routing, end_routing, replica_alias
+from .throttling import consume_token, latency_tracker, load_shedding_active
+
+
+class ExamAPIGZipMiddleware(GZipMiddleware):
+    """Gzip JSON responses of the exam API once they exceed a size threshold"""
+
+    def process_response(self, request, response):
+        prefix = getattr(settings, 'EXAM_API_PATH_PREFIX', '/exams/api/')
+        if not request.path.startswith(prefix):
+            return response
+        if not response.get('Content-Type', '').startswith('application/json'):
+            return response
+        min_length = getattr(settings, 'EXAM_API_GZIP_MIN_LENGTH', 1024)
+        if not response.streaming and len(response.content) < min_length:
+            return response
+        return super().process_response(request, response)
+
+
+class ExamAPIThrottleMiddleware:
+    """Per-user token-bucket rate limits and load shedding for the exam API"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        prefix = getattr(settings, 'EXAM_API_PATH_PREFIX', '/exams/api/')
+        if not request.path.startswith(prefix):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        response = self.get_response(request)
+        if response.status_code not in (429, 503):
+            latency_tracker.record((time.perf_counter() - started) * 1000)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if not match or match.namespace != 'exams':
+            return None
+
+        # Low-priority polling degrades first when the API is slow
+        if match.url_name in getattr(settings, 'EXAM_API_LOW_PRIORITY', []) and load_shedding_active():
+            response = JsonResponse({'error': 'Service busy, try again later'}, status=503)
+            response['Retry-After'] = getattr(settings, 'EXAM_LOAD_SHED_RETRY_AFTER', 30)
+            return response
+
+        budget = getattr(settings, 'EXAM_API_RATE_LIMITS', {}).get(match.url_name)
+        if not budget:
+            return None
+
+        if request.user.is_authenticated:
+            client = f'user:{request.user.pk}'
+        else:
+            client = f"ip:{request.META.get('REMOTE_ADDR', '')}"
+        wait = consume_token(f'exams:ratelimit:{match.url_name}:{client}', *budget)
+        if wait:
+            response = JsonResponse({'error': 'Too many requests'}, status=429)
+            response['Retry-After'] = math.ceil(wait)
+            return response
+        return None
+
+
+class QueryBudgetMiddleware:
+    """Check each request's SQL against EXAM_QUERY_BUDGETS while budgets are enforced"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'EXAM_QUERY_BUDGET_ENFORCE', settings.DEBUG):
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        if match:
+            max_queries, max_repeats = view_budget(match.view_name)
+            check_budget(
+                recorder.queries, max_queries, max_repeats,
+                label=f'{match.view_name} ({request.path})',
+                raise_on_exceed=getattr(settings, 'EXAM_QUERY_BUDGET_RAISE', False),
+            )
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Serve reads of the EXAM_REPLICA_VIEWS from the replica, except to clients that just wrote"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_alias():
+            return self.get_response(request)
+
+        request.db_routing, token = begin_routing()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_routing(token)
+
+        # Keep this client's next reads on the primary until the replica has caught up
+        if request.db_routing.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'EXAM_READ_YOUR_WRITES_SECONDS', 30),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = getattr(request, 'db_routing', None)
+        if routing is None or request.method not in ('GET', 'HEAD') or PIN_COOKIE in request.COOKIES:
+            return None
+        if request.resolver_match.view_name in getattr(settings, 'EXAM_REPLICA_VIEWS', []):
+            routing.read_alias = replica_alias()
+        return None
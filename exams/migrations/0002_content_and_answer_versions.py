@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsection',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped whenever questions or options of this section change'),
+        ),
+        migrations.AddField(
+            model_name='sectionattempt',
+            name='answer_revision',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped whenever an answer in this section changes'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0002_content_and_answer_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='answer_sync_seq',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Last answer-sync sequence number applied'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0003_answer_sync_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examattempt',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sectionattempt',
+            name='current_question_index',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
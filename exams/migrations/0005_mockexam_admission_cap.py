@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_activity_and_progress_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mockexam',
+            name='admission_cap',
+            field=models.PositiveIntegerField(default=0, help_text='Candidates admitted per admission window at exam start (0 disables the waiting room)'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SECTION_ORDER = ['reasoning', 'english', 'mathematical', 'advanced_math', 'ethical', 'emotional']
+
+
+def assign_positions(apps, schema_editor):
+    """Number existing plans in the order the sections are listed in ExamSection.SECTION_CHOICES"""
+    MockExamSection = apps.get_model('exams', 'MockExamSection')
+    entries = list(MockExamSection.objects.select_related('section'))
+    for entry in entries:
+        name = entry.section.name
+        entry.position = SECTION_ORDER.index(name) if name in SECTION_ORDER else len(SECTION_ORDER)
+    MockExamSection.objects.bulk_update(entries, ['position'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_exam_access_codes'),
+    ]
+
+    operations = [
+        # The existing many-to-many table becomes the through table
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='MockExamSection',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('exam', models.ForeignKey(db_column='mockexam_id', on_delete=django.db.models.deletion.CASCADE, related_name='section_plan', to='exams.mockexam')),
+                        ('section', models.ForeignKey(db_column='examsection_id', on_delete=django.db.models.deletion.CASCADE, to='exams.examsection')),
+                    ],
+                    options={
+                        'db_table': 'exams_mockexam_sections',
+                        'unique_together': {('exam', 'section')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='mockexam',
+                    name='sections',
+                    field=models.ManyToManyField(through='exams.MockExamSection', to='exams.examsection'),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='mockexamsection',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AddField(
+            model_name='mockexamsection',
+            name='position',
+            field=models.PositiveIntegerField(default=0, help_text='Sections are taken in ascending position'),
+        ),
+        migrations.AlterModelOptions(
+            name='mockexamsection',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.RunPython(assign_positions, migrations.RunPython.noop),
+    ]
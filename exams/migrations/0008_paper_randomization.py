@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:01
+
+from django.db import migrations, models
+import exams.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0007_mockexam_section_plan'),
+    ]
+
+    operations = [
+        # Attempts that already exist keep the unshuffled paper they were shown
+        migrations.AddField(
+            model_name='examattempt',
+            name='paper_seed',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Seed of this attempt's question and option order (0 keeps the pool order)"),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='examattempt',
+            name='paper_seed',
+            field=models.PositiveIntegerField(default=exams.models.new_paper_seed, editable=False, help_text="Seed of this attempt's question and option order (0 keeps the pool order)"),
+        ),
+        migrations.AddField(
+            model_name='examsection',
+            name='questions_per_paper',
+            field=models.PositiveIntegerField(default=0, help_text='Questions drawn per candidate from the active pool, stratified by difficulty (0 uses the whole pool)'),
+        ),
+    ]
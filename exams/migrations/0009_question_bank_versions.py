@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('exams', '0008_paper_randomization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionBankVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('payload', models.JSONField(editable=False)),
+                ('checksum', models.CharField(editable=False, max_length=64)),
+                ('question_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('published_at', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bank_versions', to='exams.mockexam')),
+                ('published_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['exam', '-number'],
+                'unique_together': {('exam', 'number')},
+            },
+        ),
+        migrations.AddField(
+            model_name='examattempt',
+            name='bank_version',
+            field=models.ForeignKey(blank=True, help_text='Published question bank this attempt is served and scored from', null=True, on_delete=django.db.models.deletion.RESTRICT, to='exams.questionbankversion'),
+        ),
+    ]
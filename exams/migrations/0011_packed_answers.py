@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0010_background_tasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sectionattempt',
+            name='packed_answers',
+            field=models.BinaryField(blank=True, help_text='One byte per paper position (0 unanswered, else 1 + option index); null when answers are UserAnswer rows', null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('exams', '0011_packed_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_id', models.PositiveBigIntegerField(help_text='Id the attempt had in ExamAttempt', unique=True)),
+                ('status', models.CharField(choices=[('not_started', 'Not Started'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('auto_submitted', 'Auto Submitted'), ('terminated', 'Terminated')], max_length=20)),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('total_score', models.FloatField(blank=True, null=True)),
+                ('percentage_score', models.FloatField(blank=True, null=True)),
+                ('passed', models.BooleanField(blank=True, null=True)),
+                ('archive_file', models.CharField(help_text='Chunk file in EXAM_ARCHIVE_DIR', max_length=255)),
+                ('offset', models.PositiveBigIntegerField(help_text="Start of the attempt's gzip member in the chunk file")),
+                ('length', models.PositiveIntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exams.mockexam')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-end_time'],
+                'indexes': [models.Index(fields=['user', 'exam'], name='exams_archi_user_id_52efa8_idx')],
+            },
+        ),
+    ]
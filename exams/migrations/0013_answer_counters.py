@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_archived_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='times_answered',
+            field=models.IntegerField(default=0, editable=False, help_text='Candidates with an answer to it'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='times_correct',
+            field=models.IntegerField(default=0, editable=False, help_text='Candidates whose answer is correct'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='times_served',
+            field=models.IntegerField(default=0, editable=False, help_text='Papers this question appeared on'),
+        ),
+        migrations.AddField(
+            model_name='questionoption',
+            name='pick_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Candidates whose answer is this option'),
+        ),
+    ]
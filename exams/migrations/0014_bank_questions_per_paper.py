@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:12
+
+from django.db import migrations
+
+
+def add_questions_per_paper(apps, schema_editor):
+    """Record each section's current questions_per_paper in versions published before it was part of the payload"""
+    ExamSection = apps.get_model('exams', 'ExamSection')
+    QuestionBankVersion = apps.get_model('exams', 'QuestionBankVersion')
+    per_paper = dict(ExamSection.objects.values_list('id', 'questions_per_paper'))
+    for version in QuestionBankVersion.objects.iterator():
+        sections = version.payload['sections']
+        if all('questions_per_paper' in section for section in sections.values()):
+            continue
+        for section_id, section in sections.items():
+            section.setdefault('questions_per_paper', per_paper.get(int(section_id), 0))
+        version.save(update_fields=['payload'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0013_answer_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_questions_per_paper, migrations.RunPython.noop),
+    ]
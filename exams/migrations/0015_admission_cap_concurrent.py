@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0014_bank_questions_per_paper'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mockexam',
+            name='admission_cap',
+            field=models.PositiveIntegerField(default=0, help_text='Candidates taking the exam at once; later arrivals wait in a queue (0 disables the waiting room)'),
+        ),
+    ]
@@ -2,6 +2,12 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 import json
+import secrets
+
+
+def new_paper_seed():
+    """Random seed from which an attempt's question papers are derived"""
+    return secrets.randbelow(2 ** 31 - 1) + 1
 
 
 class ExamSection(models.Model):
@@ -22,7 +28,9 @@ class ExamSection(models.Model):
     min_pass_score = models.FloatField(default=1.0, help_text="Minimum score to pass this section")
     has_negative_marking = models.BooleanField(default=True)
     instructions = models.TextField(blank=True)
+    questions_per_paper = models.PositiveIntegerField(default=0, help_text="Questions drawn per candidate from the active pool, stratified by difficulty (0 uses the whole pool)")
     is_active = models.BooleanField(default=True)
+    content_version = models.PositiveIntegerField(default=1, editable=False, help_text="Bumped whenever questions or options of this section change")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -49,6 +57,10 @@ class Question(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # Kept current with F() increments as answers change (see exams/counters.py)
+    times_served = models.IntegerField(default=0, editable=False, help_text="Papers this question appeared on")
+    times_answered = models.IntegerField(default=0, editable=False, help_text="Candidates with an answer to it")
+    times_correct = models.IntegerField(default=0, editable=False, help_text="Candidates whose answer is correct")
     
     class Meta:
         ordering = ['section', 'id']
@@ -63,6 +75,7 @@ class QuestionOption(models.Model):
     option_text = models.TextField()
     is_correct = models.BooleanField(default=False)
     option_letter = models.CharField(max_length=1, choices=[('A', 'A'), ('B', 'B'), ('C', 'C'), ('D', 'D')])
+    pick_count = models.IntegerField(default=0, editable=False, help_text="Candidates whose answer is this option")
     
     class Meta:
         ordering = ['option_letter']
@@ -76,8 +89,9 @@ class MockExam(models.Model):
     """A complete mock exam instance"""
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    sections = models.ManyToManyField(ExamSection)
+    sections = models.ManyToManyField(ExamSection, through='MockExamSection')
     is_active = models.BooleanField(default=True)
+    admission_cap = models.PositiveIntegerField(default=0, help_text="Candidates taking the exam at once; later arrivals wait in a queue (0 disables the waiting room)")
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -90,6 +104,39 @@ class MockExam(models.Model):
         return section_time + transition_time
 
 
+class MockExamSection(models.Model):
+    """Position of a section in a mock exam's section plan"""
+    exam = models.ForeignKey(MockExam, on_delete=models.CASCADE, db_column='mockexam_id', related_name='section_plan')
+    section = models.ForeignKey(ExamSection, on_delete=models.CASCADE, db_column='examsection_id')
+    position = models.PositiveIntegerField(default=0, help_text="Sections are taken in ascending position")
+    
+    class Meta:
+        db_table = 'exams_mockexam_sections'
+        ordering = ['position', 'id']
+        unique_together = ['exam', 'section']
+    
+    def __str__(self):
+        return f"{self.exam.name} - {self.position}. {self.section.display_name}"
+
+
+class QuestionBankVersion(models.Model):
+    """Immutable published snapshot of a mock exam's questions, options and answer key"""
+    exam = models.ForeignKey(MockExam, on_delete=models.CASCADE, related_name='bank_versions')
+    number = models.PositiveIntegerField()
+    payload = models.JSONField(editable=False)
+    checksum = models.CharField(max_length=64, editable=False)
+    question_count = models.PositiveIntegerField(default=0, editable=False)
+    published_at = models.DateTimeField(auto_now_add=True)
+    published_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        ordering = ['exam', '-number']
+        unique_together = ['exam', 'number']
+    
+    def __str__(self):
+        return f"{self.exam.name} - bank v{self.number}"
+
+
 class ExamAttempt(models.Model):
     """User's attempt at taking a mock exam"""
     STATUS_CHOICES = [
@@ -109,6 +156,10 @@ class ExamAttempt(models.Model):
     total_score = models.FloatField(null=True, blank=True)
     percentage_score = models.FloatField(null=True, blank=True)
     passed = models.BooleanField(null=True, blank=True)
+    answer_sync_seq = models.PositiveIntegerField(default=0, editable=False, help_text="Last answer-sync sequence number applied")
+    last_activity = models.DateTimeField(null=True, blank=True)
+    bank_version = models.ForeignKey(QuestionBankVersion, on_delete=models.RESTRICT, null=True, blank=True, help_text="Published question bank this attempt is served and scored from")
+    paper_seed = models.PositiveIntegerField(default=new_paper_seed, editable=False, help_text="Seed of this attempt's question and option order (0 keeps the pool order)")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -138,6 +189,12 @@ class SectionAttempt(models.Model):
     questions_answered = models.PositiveIntegerField(default=0)
     questions_correct = models.PositiveIntegerField(default=0)
     is_completed = models.BooleanField(default=False)
+    current_question_index = models.PositiveIntegerField(default=0)
+    answer_revision = models.PositiveIntegerField(default=0, editable=False, help_text="Bumped whenever an answer in this section changes")
+    packed_answers = models.BinaryField(
+        null=True, blank=True,
+        help_text="One byte per paper position (0 unanswered, else 1 + option index); null when answers are UserAnswer rows"
+    )
     
     class Meta:
         unique_together = ['exam_attempt', 'section']
@@ -161,17 +218,40 @@ class UserAnswer(models.Model):
     def __str__(self):
         return f"{self.section_attempt.exam_attempt.user.username} - Q{self.question.id}"
     
-    def save(self, *args, **kwargs):
-        """Auto-calculate if answer is correct and points earned"""
-        if self.selected_option:
+    def mark(self, answer_key=None):
+        """Set whether the answer is correct and the points earned (from the pinned answer key when given)"""
+        entry = answer_key.get(self.question_id) if answer_key and self.selected_option_id else None
+        if entry:
+            self.is_correct, self.points_earned = entry.score(self.selected_option_id)
+        elif self.selected_option:
             self.is_correct = self.selected_option.is_correct
             if self.is_correct:
                 self.points_earned = self.question.points
             else:
                 self.points_earned = -self.question.negative_points if self.question.section.has_negative_marking else 0
+    
+    def save(self, *args, answer_key=None, **kwargs):
+        """Auto-calculate if answer is correct and points earned"""
+        self.mark(answer_key)
         super().save(*args, **kwargs)
 
 
+class ExamAccessCode(models.Model):
+    """Single-use, time-boxed exam-day login code for one candidate and exam"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exam_access_codes')
+    exam = models.ForeignKey(MockExam, on_delete=models.CASCADE)
+    valid_from = models.DateTimeField()
+    valid_until = models.DateTimeField()
+    used_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.exam.name} ({'used' if self.used_at else 'unused'})"
+
+
 class ExamConfiguration(models.Model):
     """Global exam configuration settings"""
     exam_instructions = models.TextField(default="Please read all instructions carefully before starting the exam.")
@@ -189,3 +269,59 @@ class ExamConfiguration(models.Model):
     
     def __str__(self):
         return f"Exam Configuration (Updated: {self.updated_at.strftime('%Y-%m-%d %H:%M')})"
+
+
+class BackgroundTask(models.Model):
+    """Deferred call of a function in exams code, run by manage.py run_tasks"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=200, help_text="Dotted path of the task function")
+    kwargs = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(null=True, blank=True, help_text="Run time of the last attempt")
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class ArchivedAttempt(models.Model):
+    """Summary of a completed attempt moved out of the live tables by manage.py archive_attempts"""
+    attempt_id = models.PositiveBigIntegerField(unique=True, help_text="Id the attempt had in ExamAttempt")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_attempts')
+    exam = models.ForeignKey(MockExam, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=ExamAttempt.STATUS_CHOICES)
+    start_time = models.DateTimeField(null=True, blank=True)
+    end_time = models.DateTimeField(null=True, blank=True)
+    total_score = models.FloatField(null=True, blank=True)
+    percentage_score = models.FloatField(null=True, blank=True)
+    passed = models.BooleanField(null=True, blank=True)
+    archive_file = models.CharField(max_length=255, help_text="Chunk file in EXAM_ARCHIVE_DIR")
+    offset = models.PositiveBigIntegerField(help_text="Start of the attempt's gzip member in the chunk file")
+    length = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-end_time']
+        indexes = [models.Index(fields=['user', 'exam'])]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.exam.name} (archived {self.status})"
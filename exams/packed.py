@@ -0,0 +1,220 @@
+"""
+Packed answer storage.
+
+With ``EXAM_PACKED_ANSWERS`` on, attempts pinned to a published bank
+version keep each section's answers in ``SectionAttempt.packed_answers``
+instead of ``UserAnswer`` rows: one byte per question of the attempt's
+paper, in paper order, holding 0 for unanswered or 1 + the index of the
+chosen option in the order the paper shows them. A pinned paper never
+changes, so the bytes identify the same answers for the life of the
+attempt, and a 100-question section is one 100-byte column.
+
+Unpinned attempts follow the live question tables, whose papers can change
+under them, so they always use rows. ``packed_answers`` is null for a
+section attempt stored as rows; an empty value means packed with nothing
+answered yet. ``manage.py pack_answers`` converts completed sections
+between the two forms.
+
+Stored bytes are only meaningful against the layout they were written
+with; bytes whose length does not match the attempt's paper raise
+``PackedLayoutError`` rather than being read against the wrong questions.
+``pack_answers --repair`` turns such sections back into rows.
+"""
+from array import array
+
+from django.conf import settings
+from django.db.models import F
+
+from .bank import attempt_answer_key
+from .counters import AnswerCounterDelta
+from .models import SectionAttempt, UserAnswer
+from .papers import build_attempt_paper
+
+UNANSWERED = 0
+LAYOUT_CACHE_SIZE = 4096
+
+_layouts = {}  # (bank_version_id, paper_seed, section_id, questions_per_paper override) -> PaperLayout
+
+
+class PackedLayoutError(ValueError):
+    """Stored packed answers that do not fit the layout of the attempt's paper"""
+
+
+class PaperLayout:
+    """Positions and option order of one pinned paper, with its answer key per position"""
+
+    __slots__ = ('question_ids', 'positions', 'option_ids', 'correct', 'points', 'penalties')
+
+    def __init__(self, paper, answer_key):
+        self.question_ids = array('q', (question['id'] for question in paper))
+        self.positions = {question_id: position for position, question_id in enumerate(self.question_ids)}
+        self.option_ids = [tuple(option['id'] for option in question['options']) for question in paper]
+        if any(len(options) > 255 for options in self.option_ids):
+            raise ValueError("A packed answer holds at most 255 options per question")
+
+        # Packed value of the correct option at each position (0 when the key has none)
+        self.correct = bytearray(len(paper))
+        self.points = array('d', bytes(8 * len(paper)))
+        self.penalties = array('d', bytes(8 * len(paper)))
+        for position, question_id in enumerate(self.question_ids):
+            entry = answer_key.get(question_id)
+            if entry is None:
+                continue
+            options = self.option_ids[position]
+            if entry.correct_option_id in options:
+                self.correct[position] = options.index(entry.correct_option_id) + 1
+            self.points[position] = entry.points
+            self.penalties[position] = entry.penalty
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def check(self, packed):
+        """Raise PackedLayoutError unless ``packed`` is empty or holds one byte per question of this paper"""
+        if packed and len(packed) != len(self):
+            raise PackedLayoutError(f"{len(packed)} packed answers do not fit a paper of {len(self)} questions")
+
+    def expand(self, packed):
+        """Mutable full-length copy of stored packed answers"""
+        self.check(packed)
+        values = bytearray(packed or b'')
+        values.extend(bytes(len(self) - len(values)))
+        return values
+
+    def set(self, values, question_id, option_id):
+        """Record a selection (None clears it) in ``values``; returns False if it is not on this paper"""
+        position = self.positions.get(question_id)
+        if position is None:
+            return False
+        if option_id is None:
+            values[position] = UNANSWERED
+            return True
+        try:
+            values[position] = self.option_ids[position].index(option_id) + 1
+        except ValueError:
+            return False
+        return True
+
+    def encode(self, selections):
+        """Packed bytes of {question_id: option_id}; selections not on this paper are left out"""
+        values = bytearray(len(self))
+        for question_id, option_id in selections.items():
+            self.set(values, question_id, option_id)
+        return bytes(values)
+
+    def decode(self, packed):
+        """{question_id: option_id} of the answered positions"""
+        self.check(packed)
+        return {
+            self.question_ids[position]: self.option_ids[position][value - 1]
+            for position, value in enumerate(bytes(packed or b''))
+            if value
+        }
+
+    def count_changes(self, previous, values, counters=None):
+        """Report the positions that differ between two expanded answer values to an AnswerCounterDelta"""
+        apply = counters is None
+        if apply:
+            counters = AnswerCounterDelta()
+        for position, (before, after) in enumerate(zip(previous, values)):
+            if before != after:
+                counters.change(
+                    self.question_ids[position],
+                    self.option_ids[position][before - 1] if before else None, before == self.correct[position],
+                    self.option_ids[position][after - 1] if after else None, after == self.correct[position],
+                )
+        if apply:
+            counters.apply()
+
+    def score(self, packed):
+        """(score, answered, correct) of packed answers, before the section score is floored at zero"""
+        self.check(packed)
+        total = 0
+        answered = 0
+        correct = 0
+        for position, value in enumerate(bytes(packed or b'')):
+            if not value:
+                continue
+            answered += 1
+            if value == self.correct[position]:
+                correct += 1
+                total += self.points[position]
+            else:
+                total -= self.penalties[position]
+        return total, answered, correct
+
+
+def packs_answers(exam_attempt):
+    """Whether new section attempts of ``exam_attempt`` store their answers packed"""
+    return bool(getattr(settings, 'EXAM_PACKED_ANSWERS', False) and exam_attempt.bank_version_id)
+
+
+def is_packed(section_attempt):
+    return section_attempt.packed_answers is not None
+
+
+def paper_layout(exam_attempt, section, questions_per_paper=None):
+    """
+    Layout of an attempt's paper for a section, shared by attempts with the
+    same paper. Everything it depends on is pinned with the bank version;
+    ``questions_per_paper`` overrides the published value (for repairs).
+    """
+    key = (exam_attempt.bank_version_id, exam_attempt.paper_seed, section.id, questions_per_paper)
+    layout = _layouts.get(key)
+    if layout is None:
+        if not exam_attempt.bank_version_id:
+            raise ValueError("Only attempts pinned to a bank version have packed answers")
+        if len(_layouts) >= LAYOUT_CACHE_SIZE:
+            _layouts.clear()
+        paper = build_attempt_paper(exam_attempt, section, questions_per_paper=questions_per_paper)
+        layout = _layouts[key] = PaperLayout(paper, attempt_answer_key(exam_attempt))
+    return layout
+
+
+def write_packed_answers(exam_attempt, section_attempt, selections, counters=None):
+    """
+    Apply {question_id: option_id or None} to a packed section attempt;
+    returns how many were applied. Answer counter changes go to ``counters``
+    when given, otherwise they are applied at once.
+    """
+    layout = paper_layout(exam_attempt, section_attempt.section)
+    while True:
+        previous = layout.expand(section_attempt.packed_answers)
+        values = bytearray(previous)
+        applied = sum(layout.set(values, question_id, option_id) for question_id, option_id in selections.items())
+        if not applied:
+            return 0
+
+        # The revision check keeps two concurrent writes to one section from losing either's answers
+        revision = section_attempt.answer_revision
+        packed = bytes(values)
+        if SectionAttempt.objects.filter(pk=section_attempt.pk, answer_revision=revision).update(
+            packed_answers=packed,
+            answer_revision=F('answer_revision') + 1,
+        ):
+            section_attempt.packed_answers = packed
+            section_attempt.answer_revision = revision + 1
+            layout.count_changes(previous, values, counters)
+            return applied
+        section_attempt.refresh_from_db(fields=['packed_answers', 'answer_revision'])
+
+
+def section_selections(section_attempt, exam_attempt=None):
+    """{question_id: option_id} of a section attempt's answered questions, packed or not"""
+    if is_packed(section_attempt):
+        layout = paper_layout(exam_attempt or section_attempt.exam_attempt, section_attempt.section)
+        return layout.decode(section_attempt.packed_answers)
+    return dict(
+        UserAnswer.objects.filter(
+            section_attempt=section_attempt,
+            selected_option__isnull=False
+        ).values_list('question_id', 'selected_option_id')
+    )
+
+
+def answered_count(section_attempt):
+    """Number of answers recorded in a section attempt"""
+    if is_packed(section_attempt):
+        packed = bytes(section_attempt.packed_answers)
+        return len(packed) - packed.count(UNANSWERED)
+    return UserAnswer.objects.filter(section_attempt=section_attempt).count()
@@ -0,0 +1,214 @@
+"""
+Building the question papers served to candidates.
+
+A section's pool is its active questions with their options. Attempts
+pinned to a published bank version take it from that version (see
+``bank``); others take it from the live tables, kept per
+``content_version`` in a ``CompactPool``. Compact pools are flat arrays and
+text blobs rather than model instances, so pools warmed in a preloading
+master (``warm_up``) stay shared copy-on-write with forked workers.
+
+The paper of an attempt is derived from the pool and
+``ExamAttempt.paper_seed``: the pool is sampled down to
+``ExamSection.questions_per_paper`` (proportionally per difficulty; pinned
+attempts use the value published with their bank version), then
+the questions and each question's options are shuffled. Nothing is stored
+per attempt, the same seed and pool always give the same paper.
+
+Option letters in a paper are positional, the first option shown is "A".
+Answers are always recorded by option id, so scoring does not depend on
+the order an option was shown in.
+"""
+import random
+from array import array
+
+from .bank import load_bank
+from .models import ExamSection, Question, QuestionBankVersion, QuestionOption
+from .tracing import traced
+
+DISPLAY_LETTERS = 'ABCDEFGH'
+DIFFICULTIES = [value for value, _ in Question.DIFFICULTY_CHOICES]
+
+_pools = {}  # section_id -> (content_version, CompactPool)
+
+
+class CompactPool:
+    """Active questions of a section in flat arrays and two text blobs instead of model instances"""
+    
+    __slots__ = (
+        'ids', 'difficulties', 'points', 'negative_points', 'text_offsets', 'texts',
+        'option_starts', 'option_ids', 'option_letters', 'option_text_offsets', 'option_texts',
+    )
+    
+    def __init__(self, questions, options):
+        """Build from (id, text, difficulty, points, negative_points) rows and
+        (question_id, id, letter, text) rows, both ordered by question"""
+        self.ids = array('q')
+        self.difficulties = bytearray()
+        self.points = array('I')
+        self.negative_points = array('d')
+        self.text_offsets = array('I', [0])
+        self.option_starts = array('I', [0])
+        self.option_ids = array('q')
+        self.option_letters = []
+        self.option_text_offsets = array('I', [0])
+        texts = []
+        option_texts = []
+        
+        options_by_question = {}
+        for question_id, option_id, letter, text in options:
+            options_by_question.setdefault(question_id, []).append((option_id, letter, text))
+        
+        for question_id, text, difficulty, points, negative_points in questions:
+            self.ids.append(question_id)
+            self.difficulties.append(DIFFICULTIES.index(difficulty))
+            self.points.append(points)
+            self.negative_points.append(negative_points)
+            texts.append(text)
+            self.text_offsets.append(self.text_offsets[-1] + len(text))
+            for option_id, letter, option_text in options_by_question.get(question_id, ()):
+                self.option_ids.append(option_id)
+                self.option_letters.append(letter)
+                option_texts.append(option_text)
+                self.option_text_offsets.append(self.option_text_offsets[-1] + len(option_text))
+            self.option_starts.append(len(self.option_ids))
+        
+        self.texts = ''.join(texts)
+        self.option_texts = ''.join(option_texts)
+        self.option_letters = ''.join(self.option_letters)
+    
+    @classmethod
+    def load(cls, section):
+        questions = Question.objects.filter(
+            section=section,
+            is_active=True
+        ).order_by('id').values_list('id', 'question_text', 'difficulty', 'points', 'negative_points')
+        options = QuestionOption.objects.filter(
+            question__section=section,
+            question__is_active=True
+        ).order_by('question_id', 'option_letter').values_list('question_id', 'id', 'option_letter', 'option_text')
+        return cls(questions, options)
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def __getitem__(self, index):
+        if not 0 <= index < len(self.ids):
+            raise IndexError(index)
+        return {
+            'id': self.ids[index],
+            'text': self.texts[self.text_offsets[index]:self.text_offsets[index + 1]],
+            'difficulty': DIFFICULTIES[self.difficulties[index]],
+            'points': self.points[index],
+            'negative_points': self.negative_points[index],
+            'options': [
+                {
+                    'id': self.option_ids[option],
+                    'letter': self.option_letters[option],
+                    'text': self.option_texts[self.option_text_offsets[option]:self.option_text_offsets[option + 1]],
+                }
+                for option in range(self.option_starts[index], self.option_starts[index + 1])
+            ],
+        }
+    
+    def difficulty(self, index):
+        return DIFFICULTIES[self.difficulties[index]]
+
+
+def section_pool(section):
+    """The question pool of a section, reloaded whenever its content version changes"""
+    cached = _pools.get(section.id)
+    if cached and cached[0] == section.content_version:
+        return cached[1]
+    
+    pool = CompactPool.load(section)
+    _pools[section.id] = (section.content_version, pool)
+    return pool
+
+
+def warm_up():
+    """Load the pools of all active sections and the latest published banks, e.g. before workers fork"""
+    sections = list(ExamSection.objects.filter(is_active=True))
+    for section in sections:
+        section_pool(section)
+    
+    versions = QuestionBankVersion.objects.order_by('exam_id', '-number').values_list('exam_id', 'id')
+    latest = {}
+    for exam_id, version_id in versions:
+        latest.setdefault(exam_id, version_id)
+    for version_id in latest.values():
+        load_bank(version_id)
+    return len(sections), len(latest)
+
+
+def stratified_sample(indexes, count, rng, difficulty_of):
+    """Draw ``count`` pool indexes keeping the pool's share of each difficulty"""
+    strata = {}
+    for index in indexes:
+        strata.setdefault(difficulty_of(index), []).append(index)
+    
+    # Largest-remainder apportionment of the quota over the difficulties
+    shares = {difficulty: count * len(questions) / len(indexes) for difficulty, questions in strata.items()}
+    quotas = {difficulty: int(share) for difficulty, share in shares.items()}
+    by_remainder = sorted(strata, key=lambda difficulty: shares[difficulty] - quotas[difficulty], reverse=True)
+    for difficulty in by_remainder[:count - sum(quotas.values())]:
+        quotas[difficulty] += 1
+    
+    sample = []
+    for difficulty, questions in strata.items():
+        sample.extend(rng.sample(questions, quotas[difficulty]))
+    return sample
+
+
+@traced
+def build_attempt_paper(exam_attempt, section, questions_per_paper=None):
+    """The paper of a section as shown to one attempt (drawn with ``questions_per_paper`` when given)"""
+    if exam_attempt.bank_version_id:
+        bank = load_bank(exam_attempt.bank_version_id)
+        pool = bank.section_pool(section.id)
+        per_paper = bank.questions_per_paper(section.id)
+    else:
+        pool = section_pool(section)
+        per_paper = section.questions_per_paper
+    if questions_per_paper is not None:
+        per_paper = questions_per_paper
+    
+    # Work on pool indexes so compiled pools only decode the questions drawn
+    indexes = list(range(len(pool)))
+    seed = exam_attempt.paper_seed
+    rng = random.Random(f'{seed}:{section.id}')
+    
+    if seed:
+        if 0 < per_paper < len(indexes):
+            difficulty_of = getattr(pool, 'difficulty', lambda index: pool[index]['difficulty'])
+            indexes = stratified_sample(indexes, per_paper, rng, difficulty_of)
+        rng.shuffle(indexes)
+    
+    paper = []
+    for question in map(pool.__getitem__, indexes):
+        options = list(question['options'])
+        if seed:
+            rng.shuffle(options)
+        paper.append({
+            'id': question['id'],
+            'text': question['text'],
+            'points': question['points'],
+            'negative_points': question['negative_points'],
+            'options': [
+                {'id': option['id'], 'letter': DISPLAY_LETTERS[index], 'text': option['text']}
+                for index, option in enumerate(options)
+            ],
+        })
+    return paper
+
+
+def questions_per_paper(exam_attempt, section):
+    """Questions drawn per paper of a section for an attempt (0 for the whole pool)"""
+    if exam_attempt.bank_version_id:
+        return load_bank(exam_attempt.bank_version_id).questions_per_paper(section.id)
+    return section.questions_per_paper
+
+
+def paper_question_ids(exam_attempt, section):
+    """Ids of the questions in an attempt's paper for a section"""
+    return {question['id'] for question in build_attempt_paper(exam_attempt, section)}
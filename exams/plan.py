@@ -0,0 +1,91 @@
+"""
+Ordered section plans for mock exams.
+
+The order in which a candidate takes the sections of a mock exam comes
+from ``MockExamSection.position``. Plans are kept in process memory so a
+section transition is a dictionary lookup instead of a query over the
+exam's sections. Changes made through the admin clear the local plan
+cache right away (see ``signals``); other workers pick them up after
+``EXAM_SECTION_PLAN_TTL`` seconds.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import ExamSection, MockExamSection, SectionAttempt
+from .packed import packs_answers
+
+_lock = threading.Lock()
+_plans = {}  # exam_id -> (loaded at, SectionPlan)
+
+
+class SectionPlan:
+    """Active section ids of a mock exam in the order they are taken"""
+    
+    __slots__ = ('section_ids', 'positions')
+    
+    def __init__(self, section_ids):
+        self.section_ids = tuple(section_ids)
+        self.positions = {section_id: index for index, section_id in enumerate(self.section_ids)}
+    
+    def __len__(self):
+        return len(self.section_ids)
+    
+    def first(self):
+        return self.section_ids[0] if self.section_ids else None
+    
+    def next_after(self, section_id):
+        """Section id following ``section_id``, or None when it is the last one"""
+        index = self.positions.get(section_id)
+        if index is not None and index + 1 < len(self.section_ids):
+            return self.section_ids[index + 1]
+        return None
+
+
+def get_section_plan(exam_id):
+    """Cached section plan of a mock exam"""
+    ttl = getattr(settings, 'EXAM_SECTION_PLAN_TTL', 60)
+    now = time.monotonic()
+    cached = _plans.get(exam_id)
+    if cached and now - cached[0] < ttl:
+        return cached[1]
+    
+    plan = SectionPlan(
+        MockExamSection.objects.filter(
+            exam_id=exam_id,
+            section__is_active=True
+        ).order_by('position', 'id').values_list('section_id', flat=True)
+    )
+    with _lock:
+        _plans[exam_id] = (now, plan)
+    return plan
+
+
+def clear_section_plans():
+    """Drop all cached plans of this process"""
+    with _lock:
+        _plans.clear()
+
+
+def plan_sections(plan):
+    """Fresh ExamSection rows of a plan, in plan order"""
+    sections = ExamSection.objects.in_bulk(plan.section_ids)
+    return [sections[section_id] for section_id in plan.section_ids if section_id in sections]
+
+
+def provision_section_attempts(exam_attempt, sections):
+    """Create the SectionAttempt rows of every planned section in one query"""
+    packed_answers = b'' if packs_answers(exam_attempt) else None
+    SectionAttempt.objects.bulk_create(
+        [
+            SectionAttempt(
+                exam_attempt=exam_attempt,
+                section=section,
+                max_possible_score=section.max_score,
+                packed_answers=packed_answers,
+            )
+            for section in sections
+        ],
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,105 @@
+"""
+Query budgets: how much SQL a request or block of code may issue.
+
+A budget caps the number of statements and how often one statement shape may
+repeat from the same call site (the signature of an N+1 loop). ``query_budget``
+works as a context manager or decorator in views and tests and raises
+``QueryBudgetExceeded`` when it is overrun. ``QueryBudgetMiddleware`` (in
+``middleware``) checks every request against ``EXAM_QUERY_BUDGETS`` while
+``EXAM_QUERY_BUDGET_ENFORCE`` is on, logging the offending stacks.
+"""
+import logging
+from contextlib import ContextDecorator
+
+from django.conf import settings
+
+from .querylog import QueryRecorder, duplicate_groups
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block issued more queries, or more repeats of one query, than its budget allows"""
+
+
+def view_budget(view_name):
+    """(max queries, max repeats) configured for a URL name such as ``exams:get_questions``"""
+    return (
+        getattr(settings, 'EXAM_QUERY_BUDGETS', {}).get(view_name),
+        getattr(settings, 'EXAM_QUERY_BUDGET_REPEATS', 3),
+    )
+
+
+def budget_violations(queries, max_queries=None, max_repeats=None):
+    """Messages describing how a list of recorded queries overruns a budget"""
+    violations = []
+    if max_queries is not None and len(queries) > max_queries:
+        violations.append(f'{len(queries)} queries, budget is {max_queries}')
+    if max_repeats is not None:
+        for group in duplicate_groups(queries, min_count=max_repeats + 1):
+            stack = '\n'.join(f'    {filename}:{line} in {function}' for filename, line, function in group['stack'])
+            violations.append(
+                f"{group['count']} repeats of one query from {group['site']}, budget is {max_repeats}:\n"
+                f"    {group['normalized']}\n{stack}"
+            )
+    return violations
+
+
+def check_budget(queries, max_queries=None, max_repeats=None, label='block', raise_on_exceed=True):
+    """Log and optionally raise when recorded queries overrun a budget; returns the violations"""
+    violations = budget_violations(queries, max_queries, max_repeats)
+    if violations:
+        message = f'Query budget exceeded in {label}: ' + '\n'.join(violations)
+        if settings.DEBUG:
+            logger.warning(message)
+        if raise_on_exceed:
+            raise QueryBudgetExceeded(message)
+    return violations
+
+
+class query_budget(ContextDecorator):
+    """
+    Fail when the wrapped code overruns a query budget.
+
+        with query_budget(8):
+            client.get(url)
+
+        @query_budget(view_name='exams:get_questions')
+        def test_questions(self): ...
+
+    Limits not given explicitly come from ``view_budget(view_name)`` when a view
+    name is passed.
+    """
+
+    def __init__(self, max_queries=None, max_repeats=None, view_name=None, using='default', raise_on_exceed=True):
+        if view_name:
+            configured_queries, configured_repeats = view_budget(view_name)
+            max_queries = configured_queries if max_queries is None else max_queries
+            max_repeats = configured_repeats if max_repeats is None else max_repeats
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.label = view_name or 'block'
+        self.using = using
+        self.raise_on_exceed = raise_on_exceed
+        self.recorder = None
+        self.violations = []
+
+    def _recreate_cm(self):
+        # Each decorated call records into its own recorder
+        return type(self)(self.max_queries, self.max_repeats, using=self.using, raise_on_exceed=self.raise_on_exceed)
+
+    def __enter__(self):
+        self.recorder = QueryRecorder(self.using).__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.recorder.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.violations = check_budget(
+                self.recorder.queries, self.max_queries, self.max_repeats, self.label, self.raise_on_exceed
+            )
+        return False
+
+    @property
+    def queries(self):
+        return self.recorder.queries if self.recorder else []
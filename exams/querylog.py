@@ -0,0 +1,118 @@
+"""
+Recording and grouping the SQL statements issued by a block of code.
+
+``QueryRecorder`` hooks ``connection.execute_wrapper`` and keeps every
+statement with its duration and the project stack frames that issued it.
+``normalize_sql`` reduces a statement to its shape, so the same query run
+with different parameters (the signature of an N+1 loop) groups together in
+``duplicate_groups``.
+"""
+import re
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Shape of a statement: literals and placeholders become ``?``, IN lists collapse"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _project_root():
+    return str(Path(settings.BASE_DIR).resolve())
+
+
+def project_stack(limit=8, skip=__file__):
+    """Innermost-last (file, line, function) frames that belong to the project"""
+    root = _project_root()
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < limit:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and filename != skip and 'site-packages' not in filename:
+            frames.append((str(Path(filename).relative_to(root)), frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def call_site(stack):
+    """``path:line in function`` of the innermost project frame of a stack"""
+    if not stack:
+        return '<unknown>'
+    filename, line, function = stack[-1]
+    return f'{filename}:{line} in {function}'
+
+
+class QueryRecorder:
+    """Context manager recording the statements run on a database connection"""
+
+    def __init__(self, using='default', stack_depth=8):
+        self.using = using
+        self.stack_depth = stack_depth
+        self.queries = []
+        self._wrapper = None
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'normalized': normalize_sql(sql),
+                'duration_ms': (time.perf_counter() - started) * 1000,
+                'many': many,
+                'stack': project_stack(self.stack_depth) if self.stack_depth else [],
+            })
+
+    @property
+    def total_ms(self):
+        return sum(query['duration_ms'] for query in self.queries)
+
+    def duplicates(self, min_count=2):
+        return duplicate_groups(self.queries, min_count)
+
+
+def duplicate_groups(queries, min_count=2):
+    """Statements of the same shape from the same call site, most repeated first"""
+    groups = defaultdict(list)
+    for query in queries:
+        groups[(query['normalized'], call_site(query['stack']))].append(query)
+
+    duplicates = [
+        {
+            'normalized': normalized,
+            'site': site,
+            'count': len(group),
+            'total_ms': sum(query['duration_ms'] for query in group),
+            'stack': group[0]['stack'],
+        }
+        for (normalized, site), group in groups.items()
+        if len(group) >= min_count
+    ]
+    duplicates.sort(key=lambda group: (group['count'], group['total_ms']), reverse=True)
+    return duplicates
@@ -0,0 +1,104 @@
+"""
+Read-replica routing.
+
+When ``EXAM_REPLICA_ALIAS`` names a configured database, reads of the
+``EXAM_REPLICA_APPS`` models go to it inside ``use_replica()`` blocks and
+during safe (GET/HEAD) requests to the ``EXAM_REPLICA_VIEWS`` URL names
+(``ReplicaRoutingMiddleware``). Everything else, and every write, uses
+``default``.
+
+Read-your-writes: a write routed through ``ReplicaRouter`` switches the
+rest of the block or request back to the primary, and a request that wrote
+sets a cookie that keeps that client's reads on the primary for
+``EXAM_READ_YOUR_WRITES_SECONDS``, longer than the replica is expected to
+lag. Without a replica configured the router changes nothing.
+"""
+import contextvars
+from contextlib import ContextDecorator
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'exam_primary_reads'
+
+_routing = contextvars.ContextVar('exam_db_routing', default=None)
+
+
+class RoutingState:
+    """Where reads of the current request or block go, and whether it has written"""
+
+    __slots__ = ('read_alias', 'wrote')
+
+    def __init__(self, read_alias=None):
+        self.read_alias = read_alias
+        self.wrote = False
+
+
+def replica_alias():
+    """Alias of the configured replica, or None"""
+    alias = getattr(settings, 'EXAM_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def begin_routing(read_alias=None):
+    """Start a routing scope; pass the returned token to ``end_routing``"""
+    state = RoutingState(read_alias)
+    return state, _routing.set(state)
+
+
+def end_routing(token):
+    _routing.reset(token)
+
+
+class use_replica(ContextDecorator):
+    """
+    Read from the replica inside a block (exports, analytics, reports).
+
+        with use_replica():
+            rows = list(ExamAttempt.objects.filter(...))
+    """
+
+    def __enter__(self):
+        self._state, self._token = begin_routing(replica_alias())
+        return self._state
+
+    def __exit__(self, *exc_info):
+        end_routing(self._token)
+        return False
+
+    def _recreate_cm(self):
+        return type(self)()
+
+
+class ReplicaRouter:
+    """Send reads to the replica while a routing scope asks for it; writes always to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.read_alias or state.wrote:
+            return None
+        if model._meta.app_label not in getattr(settings, 'EXAM_REPLICA_APPS', ['exams']):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related rows come from the database the instance was read from
+            return instance._state.db
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives schema and rows from the primary
+        if db == replica_alias():
+            return False
+        return None
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import ExamSection, MockExamSection, Question, QuestionOption
+from .plan import clear_section_plans
+
+
+def bump_section_version(section_id):
+    """Invalidate cached papers for a section by bumping its content version"""
+    ExamSection.objects.filter(pk=section_id).update(content_version=F('content_version') + 1)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_section_version(instance.section_id)
+
+
+@receiver(post_save, sender=QuestionOption)
+@receiver(post_delete, sender=QuestionOption)
+def option_changed(sender, instance, **kwargs):
+    # Options are saved through their question (admin inlines, imports), which is usually loaded already
+    if QuestionOption.question.is_cached(instance):
+        section_id = instance.question.section_id
+    else:
+        section_id = Question.objects.filter(pk=instance.question_id).values_list('section_id', flat=True).first()
+    if section_id:
+        bump_section_version(section_id)
+
+
+@receiver(post_save, sender=MockExamSection)
+@receiver(post_delete, sender=MockExamSection)
+@receiver(post_save, sender=ExamSection)
+@receiver(post_delete, sender=ExamSection)
+def section_plan_changed(sender, **kwargs):
+    """Reorders and (de)activated sections take effect immediately in this worker"""
+    clear_section_plans()
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply EXAM_SQLITE_PRAGMAS to each new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'EXAM_SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,184 @@
+"""
+Background tasks without a broker.
+
+``defer(func, **kwargs)`` stores a call of a module-level function as a
+``BackgroundTask`` row and returns at once, so a view can hand off heavy
+post-submit work (scoring, results snapshots, stats rollups) and answer
+straight away. ``manage.py run_tasks`` claims queued rows and runs them in
+a thread or process pool.
+
+- Keyword arguments are stored as JSON; pass ids, not model instances.
+- An idempotency ``key`` makes deferring the same work twice return the
+  task already queued under it. Tasks themselves should still be safe to
+  run again: a worker that dies mid-task leaves its row ``running``, and it
+  is queued again after ``EXAM_TASK_STALE_AFTER`` seconds.
+- A task that raises is retried up to ``max_attempts`` times with
+  exponential backoff from ``EXAM_TASK_RETRY_DELAY``, then marked failed
+  with its traceback in ``last_error``.
+- Each row records how long its last attempt ran; ``task_metrics()`` sums
+  them up per task name (``manage.py run_tasks --stats``).
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def worker_id():
+    """Name a worker (or one pool of workers) records on the tasks it claims"""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def defer(func, *, key=None, delay=0, max_attempts=None, **kwargs):
+    """Queue ``func(**kwargs)`` for a worker; with a key already used, return that task instead"""
+    if key is not None:
+        existing = BackgroundTask.objects.filter(idempotency_key=key).first()
+        if existing is not None:
+            return existing
+
+    task = BackgroundTask(
+        name=task_name(func),
+        kwargs=kwargs,
+        idempotency_key=key,
+        max_attempts=max_attempts or getattr(settings, 'EXAM_TASK_MAX_ATTEMPTS', 3),
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    try:
+        with transaction.atomic():
+            task.save()
+    except IntegrityError:
+        if key is None:
+            raise
+        # Deferred concurrently under the same key
+        return BackgroundTask.objects.get(idempotency_key=key)
+    return task
+
+
+def requeue_stale(now=None):
+    """Queue again tasks whose worker stopped reporting; returns how many"""
+    now = now or timezone.now()
+    stale = BackgroundTask.objects.filter(
+        status='running',
+        locked_at__lt=now - timedelta(seconds=getattr(settings, 'EXAM_TASK_STALE_AFTER', 300)),
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, last_error='Worker stopped while running the task', locked_by='', locked_at=None,
+    )
+    return failed + stale.update(status='queued', run_after=now, locked_by='', locked_at=None)
+
+
+def claim_tasks(worker, limit):
+    """Mark up to ``limit`` due tasks as running for ``worker``; returns their ids"""
+    now = timezone.now()
+    requeue_stale(now)
+    due = list(
+        BackgroundTask.objects.filter(status='queued', run_after__lte=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    # Another worker may claim some of the same rows; the status check hands each to one of them
+    BackgroundTask.objects.filter(id__in=due, status='queued').update(
+        status='running', locked_by=worker, locked_at=now, started_at=now, attempts=F('attempts') + 1,
+    )
+    return list(
+        BackgroundTask.objects.filter(id__in=due, status='running', locked_by=worker, locked_at=now)
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)
+    )
+
+
+def execute_task(task_id):
+    """Run a claimed task once and record the outcome; returns the task's new status"""
+    task = BackgroundTask.objects.get(id=task_id)
+    claimed = BackgroundTask.objects.filter(id=task.id, status='running', locked_by=task.locked_by)
+
+    started = time.perf_counter()
+    try:
+        import_string(task.name)(**task.kwargs)
+    except Exception:
+        duration_ms = (time.perf_counter() - started) * 1000
+        error = traceback.format_exc()
+        now = timezone.now()
+        if task.attempts < task.max_attempts:
+            delay = getattr(settings, 'EXAM_TASK_RETRY_DELAY', 5) * 2 ** (task.attempts - 1)
+            logger.warning("Task %s (%s) failed on attempt %d, retrying in %ss", task.id, task.name, task.attempts, delay, exc_info=True)
+            status = 'queued'
+            claimed.update(
+                status=status, run_after=now + timedelta(seconds=delay), locked_by='', locked_at=None,
+                last_error=error, duration_ms=duration_ms,
+            )
+        else:
+            logger.error("Task %s (%s) failed after %d attempts", task.id, task.name, task.attempts, exc_info=True)
+            status = 'failed'
+            claimed.update(
+                status=status, finished_at=now, locked_by='', locked_at=None, last_error=error, duration_ms=duration_ms,
+            )
+        return status
+
+    claimed.update(
+        status='succeeded', finished_at=timezone.now(), locked_by='', locked_at=None,
+        duration_ms=(time.perf_counter() - started) * 1000,
+    )
+    return 'succeeded'
+
+
+def complete_task(key, wait=5.0):
+    """
+    Make sure the task deferred under ``key`` has run before a page shows its
+    result: run it here if no worker has claimed it yet, or wait up to
+    ``wait`` seconds for the worker running it. Returns the task's status,
+    or None when nothing was deferred under the key.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        task = BackgroundTask.objects.filter(idempotency_key=key).only('id', 'status').first()
+        if task is None or task.status in ('succeeded', 'failed'):
+            return task and task.status
+        if task.status == 'queued':
+            now = timezone.now()
+            if BackgroundTask.objects.filter(id=task.id, status='queued').update(
+                status='running', locked_by=f'inline:{os.getpid()}', locked_at=now, started_at=now,
+                attempts=F('attempts') + 1,
+            ):
+                return execute_task(task.id)
+            continue
+        if time.monotonic() >= deadline:
+            return task.status
+        time.sleep(0.1)
+
+
+def task_metrics(since=None):
+    """Per task name: counts by status, retries and run time of finished attempts"""
+    tasks = BackgroundTask.objects.all()
+    if since is not None:
+        tasks = tasks.filter(created_at__gte=since)
+    rows = tasks.values('name').annotate(
+        total=Count('id'),
+        queued=Count('id', filter=Q(status='queued')),
+        running=Count('id', filter=Q(status='running')),
+        succeeded=Count('id', filter=Q(status='succeeded')),
+        failed=Count('id', filter=Q(status='failed')),
+        retries=Sum(F('attempts') - 1, filter=Q(attempts__gt=1)),
+        avg_ms=Avg('duration_ms'),
+        max_ms=Max('duration_ms'),
+    ).order_by('name')
+    return list(rows)
@@ -0,0 +1,1131 @@
+import base64
+import gzip
+import io
+import json
+import shutil
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Max
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from exams import activity, bank, bundle, journal, packed, papers, plan
+from exams.admission import check_admission_cache, queue_status
+from exams.answers import flush_answer_journal, journal_answer_changes, store_answer
+from exams.archive import restore_attempt
+from exams.bank import BankSnapshot, publish_question_bank
+from exams.bankstore import MappedBank, compile_bank, open_bank_store
+from exams.cacheutil import incr
+from exams.models import ArchivedAttempt, BackgroundTask, ExamAttempt, ExamSection, MockExam, MockExamSection, Question, QuestionOption, SectionAttempt, UserAnswer
+from exams.packed import is_packed, section_selections
+from exams.papers import build_attempt_paper
+from exams.querybudget import QueryBudgetExceeded, query_budget
+from exams.querylog import normalize_sql
+from exams.routers import PIN_COOKIE, ReplicaRouter, use_replica
+from exams.tasks import claim_tasks, defer, execute_task, worker_id
+from exams.throttling import consume_token
+from exams.views import calculate_section_score
+from exams.writequeue import PendingWrite, WriteQueue
+
+SECTION_NAMES = ['reasoning', 'english', 'mathematical']
+
+
+def create_exam(questions_per_section=6):
+    """A mock exam over the three sections; option A is correct for every even question, B for odd ones"""
+    sections = []
+    for name in SECTION_NAMES:
+        section = ExamSection.objects.create(name=name, display_name=name.title(), duration_minutes=30)
+        for number in range(questions_per_section):
+            question = Question.objects.create(section=section, question_text=f'{name} {number}')
+            for index, letter in enumerate('ABCD'):
+                QuestionOption.objects.create(
+                    question=question, option_letter=letter, option_text=letter, is_correct=index == number % 2
+                )
+        sections.append(section)
+    exam = MockExam.objects.create(name='Mock')
+    MockExamSection.objects.bulk_create([
+        MockExamSection(exam=exam, section=section, position=position) for position, section in enumerate(sections)
+    ])
+    return exam
+
+
+def reset_process_caches():
+    """Forget what workers keep in memory and in the cache; ids are reused from one test to the next"""
+    cache.clear()
+    bank._snapshots.clear()
+    packed._layouts.clear()
+    papers._pools.clear()
+    plan._plans.clear()
+    activity._pending_activity.clear()
+    activity._pending_progress.clear()
+
+
+def run_tasks():
+    """Run every due background task in this thread, as ``run_tasks --once`` would"""
+    worker = worker_id()
+    while True:
+        claimed = claim_tasks(worker, 10)
+        if not claimed:
+            return
+        for task_id in claimed:
+            execute_task(task_id)
+
+
+def failing_task(message):
+    raise RuntimeError(message)
+
+
+@override_settings(EXAM_API_RATE_LIMITS={}, EXAM_TRACING=False)
+class ExamClientTestCase(TestCase):
+    """Drives an attempt through the candidate views"""
+
+    def setUp(self):
+        reset_process_caches()
+        self.addCleanup(reset_process_caches)
+        # Compiled banks are named by version id, which the next test reuses
+        bank_store = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, bank_store)
+        settings = override_settings(EXAM_BANK_STORE_DIR=bank_store)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.exam = create_exam()
+        self.user = User.objects.create_user('candidate', 'candidate@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def start_attempt(self):
+        self.client.get(f'/exams/start/{self.exam.id}/')
+        self.client.get(f'/exams/take/{self.exam.id}/')
+        return ExamAttempt.objects.get(user=self.user, exam=self.exam)
+
+    def current_questions(self):
+        return self.client.get(f'/exams/api/questions/{self.exam.id}/').json()['questions']
+
+    def correct_option(self, question):
+        return QuestionOption.objects.get(question_id=question['id'], is_correct=True).id
+
+    def save_answer(self, question_id, option_id):
+        return self.client.post(
+            '/exams/api/save-answer/',
+            json.dumps({'question_id': question_id, 'option_id': option_id}),
+            content_type='application/json',
+        )
+
+    def sync_answers(self, seq, changes):
+        response = self.client.post(
+            f'/exams/api/sync-answers/{self.exam.id}/',
+            json.dumps({'seq': seq, 'changes': changes}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def answer_sections(self, answered=5):
+        """Answer ``answered`` questions of each section correctly through answer sync, submitting each section"""
+        for seq in range(1, len(SECTION_NAMES) + 1):
+            questions = self.current_questions()[:answered]
+            self.sync_answers(seq, [
+                {'question_id': question['id'], 'option_id': self.correct_option(question)} for question in questions
+            ])
+            self.client.post(f'/exams/submit-section/{self.exam.id}/')
+            if seq < len(SECTION_NAMES):
+                self.client.get(f'/exams/take/{self.exam.id}/')
+
+
+class AnswerJournalScoringTests(ExamClientTestCase):
+    """Journaled answers are applied before sections are scored, whether scoring runs in the request or a task"""
+
+    def setUp(self):
+        super().setUp()
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir)
+        settings = override_settings(
+            EXAM_ANSWER_JOURNAL=True, EXAM_ANSWER_JOURNAL_DIR=self.journal_dir, EXAM_ANSWER_JOURNAL_FLUSH_INTERVAL=0
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # The journal handle is kept per process; open one on this test's directory
+        journal._journal = None
+        self.addCleanup(setattr, journal, '_journal', None)
+
+    def assert_scored(self, attempt):
+        sections = SectionAttempt.objects.filter(exam_attempt=attempt)
+        self.assertEqual([section.questions_answered for section in sections], [5, 5, 5])
+        self.assertEqual([section.questions_correct for section in sections], [5, 5, 5])
+        self.assertEqual(UserAnswer.objects.filter(section_attempt__exam_attempt=attempt).count(), 15)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.total_score, 15)
+
+    def test_journaled_answers_scored_in_request(self):
+        attempt = self.start_attempt()
+        self.answer_sections()
+        self.assert_scored(attempt)
+
+    @override_settings(EXAM_DEFER_SCORING=True)
+    def test_journaled_answers_scored_by_deferred_task(self):
+        attempt = self.start_attempt()
+        self.answer_sections()
+        run_tasks()
+        self.assert_scored(attempt)
+
+    def test_flush_recovers_sealed_segments(self):
+        attempt = self.start_attempt()
+        first, second = self.current_questions()[:2]
+        journal_answer_changes(attempt, [{'question_id': first['id'], 'option_id': self.correct_option(first)}])
+        # A flush that sealed its segment and then crashed, followed by more changes in a new live file
+        journal.answer_journal().seal()
+        journal_answer_changes(attempt, [{'question_id': second['id'], 'option_id': self.correct_option(second)}])
+        self.assertFalse(UserAnswer.objects.exists())
+
+        self.assertEqual(flush_answer_journal(), 2)
+        self.assertEqual(
+            set(UserAnswer.objects.values_list('question_id', flat=True)), {first['id'], second['id']}
+        )
+        self.assertEqual(journal.answer_journal().segments(), [])
+        self.assertEqual(journal.answer_journal().pending_bytes(), 0)
+
+    def test_duplicate_sync_batch_journaled_once(self):
+        self.start_attempt()
+        question = self.current_questions()[0]
+        changes = [{'question_id': question['id'], 'option_id': self.correct_option(question)}]
+        self.assertFalse(self.sync_answers(1, changes)['duplicate'])
+        self.assertTrue(self.sync_answers(1, changes)['duplicate'])
+        self.assertEqual(flush_answer_journal(), 1)
+
+    def test_flush_applies_changes_journaled_before_submit(self):
+        # Changes journaled on another node reach this one only after the section was submitted
+        attempt = self.start_attempt()
+        question = self.current_questions()[0]
+        journal_answer_changes(attempt, [{'question_id': question['id'], 'option_id': self.correct_option(question)}])
+        section_attempt = SectionAttempt.objects.get(exam_attempt=attempt, section=attempt.current_section)
+        SectionAttempt.objects.filter(pk=section_attempt.pk).update(is_completed=True, end_time=timezone.now() + timedelta(minutes=1))
+        flush_answer_journal()
+        self.assertTrue(UserAnswer.objects.filter(section_attempt=section_attempt, question_id=question['id']).exists())
+
+        # A change journaled after the submit is still rejected
+        SectionAttempt.objects.filter(pk=section_attempt.pk).update(end_time=timezone.now() - timedelta(minutes=1))
+        journal_answer_changes(attempt, [{'question_id': question['id'], 'option_id': None}])
+        flush_answer_journal()
+        self.assertTrue(UserAnswer.objects.filter(section_attempt=section_attempt, question_id=question['id']).exists())
+
+
+
+    def test_flush_writes_a_batch_in_fixed_queries(self):
+        attempt = self.start_attempt()
+        questions = self.current_questions()
+
+        def flush_queries(changes):
+            journal_answer_changes(attempt, changes)
+            with CaptureQueriesContext(connection) as queries:
+                flush_answer_journal()
+            return len(queries)
+
+        small = flush_queries([{'question_id': question['id'], 'option_id': self.correct_option(question)} for question in questions[:2]])
+        # An unchanged answer and more new ones cost no more
+        large = flush_queries([{'question_id': question['id'], 'option_id': self.correct_option(question)} for question in questions[1:6]])
+        self.assertEqual(large, small)
+
+        flush_queries([{'question_id': questions[0]['id'], 'option_id': None}])
+        self.assertEqual(
+            set(UserAnswer.objects.values_list('question_id', flat=True)), {question['id'] for question in questions[1:6]}
+        )
+        self.assertEqual(SectionAttempt.objects.get(exam_attempt=attempt, section=attempt.current_section).answer_revision, 3)
+
+
+class ConditionalResponseTests(ExamClientTestCase):
+    """Exam JSON APIs answer unchanged papers with 304 and compress large bodies"""
+
+    def questions(self, **headers):
+        return self.client.get(f'/exams/api/questions/{self.exam.id}/', **headers)
+
+    def test_questions_not_modified_until_answers_or_content_change(self):
+        self.start_attempt()
+        etag = self.questions()['ETag']
+        response = self.questions(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # An answer sync bumps the revision once, for the whole batch
+        questions = self.current_questions()[:3]
+        self.assertFalse(SectionAttempt.objects.filter(answer_revision__gt=0).exists())
+        self.sync_answers(1, [{'question_id': question['id'], 'option_id': self.correct_option(question)} for question in questions])
+        self.assertEqual(SectionAttempt.objects.get(answer_revision__gt=0).answer_revision, 1)
+        response = self.questions(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # Editing an option of the section changes its content version
+        option = QuestionOption.objects.select_related('question').get(id=self.correct_option(questions[0]))
+        option.option_text = 'edited'
+        with self.assertNumQueries(2):
+            option.save()
+        self.assertEqual(self.questions(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_large_responses_gzipped(self):
+        self.start_attempt()
+        plain = self.client.get(f'/exams/api/bundle/{self.exam.id}/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        response = self.client.get(f'/exams/api/bundle/{self.exam.id}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+
+        with self.settings(EXAM_API_GZIP_MIN_LENGTH=10 ** 6):
+            response = self.client.get(f'/exams/api/bundle/{self.exam.id}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class BundleTests(ExamClientTestCase):
+    """The offline bundle carries every section, and only the released key opens a locked one"""
+
+    def bundle(self, **headers):
+        return self.client.get(f'/exams/api/bundle/{self.exam.id}/', **headers)
+
+    def test_bundle_not_modified_until_content_changes(self):
+        self.start_attempt()
+        etag = self.bundle()['ETag']
+        self.assertEqual(self.bundle(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Any section of the exam changing changes the bundle, locked ones included
+        question = Question.objects.filter(section__name=SECTION_NAMES[-1]).first()
+        question.question_text = 'edited'
+        question.save()
+        response = self.bundle(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_locked_section_decrypts_with_its_key(self):
+        attempt = self.start_attempt()
+        sections = self.bundle().json()['sections']
+        self.assertEqual([entry['status'] for entry in sections], ['open', 'locked', 'locked'])
+        self.assertNotIn('questions', sections[1])
+
+        section = ExamSection.objects.get(pk=sections[1]['id'])
+        cipher = base64.b64decode(sections[1]['ciphertext'])
+        stream = bundle._keystream(bundle.section_key(attempt, section), bytes.fromhex(sections[1]['nonce']), len(cipher))
+        plain = bytes(byte ^ key for byte, key in zip(cipher, stream))
+        self.assertEqual(json.loads(zlib.decompress(plain)), build_attempt_paper(attempt, section))
+
+        # Another attempt's key does not open it
+        other = bundle.section_key(ExamAttempt(id=attempt.id + 1), section)
+        stream = bundle._keystream(other, bytes.fromhex(sections[1]['nonce']), len(cipher))
+        with self.assertRaises(zlib.error):
+            zlib.decompress(bytes(byte ^ key for byte, key in zip(cipher, stream)))
+
+    def test_key_released_when_section_starts(self):
+        attempt = self.start_attempt()
+        response = self.client.get(f'/exams/take/{self.exam.id}/')
+        self.assertEqual(response.context['section_key'], bundle.section_key(attempt, attempt.current_section).hex())
+
+
+class BackgroundTaskTests(ExamClientTestCase):
+    """Deferred scoring runs once per key, and failing tasks are retried with backoff until they give up"""
+
+    @override_settings(EXAM_DEFER_SCORING=True)
+    def test_deferred_scoring_matches_request_scoring(self):
+        attempt = self.start_attempt()
+        self.answer_sections(answered=4)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.status, 'completed')
+        self.assertIsNone(attempt.total_score)
+        self.assertEqual(BackgroundTask.objects.filter(status='queued').count(), 4)
+
+        # The results page runs the attempt's own task inline when no worker has got to it yet
+        self.assertEqual(self.client.get(f'/exams/results/{self.exam.id}/').status_code, 200)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.total_score, 12)
+        self.assertIsNotNone(attempt.passed)
+        run_tasks()
+        self.assertEqual(set(BackgroundTask.objects.values_list('status', flat=True)), {'succeeded'})
+
+    def test_defer_is_idempotent_per_key(self):
+        first = defer(failing_task, key='once', message='boom')
+        self.assertEqual(defer(failing_task, key='once', message='other').pk, first.pk)
+        self.assertEqual(BackgroundTask.objects.count(), 1)
+
+    @override_settings(EXAM_TASK_MAX_ATTEMPTS=2, EXAM_TASK_RETRY_DELAY=60)
+    def test_failed_task_retried_then_given_up(self):
+        task = defer(failing_task, message='boom')
+        with self.assertLogs('exams.tasks', 'WARNING'):
+            run_tasks()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('queued', 1))
+        self.assertIn('boom', task.last_error)
+        self.assertGreater(task.run_after, timezone.now() + timedelta(seconds=50))
+
+        # Not due again until the backoff has passed
+        run_tasks()
+        task.refresh_from_db()
+        self.assertEqual(task.attempts, 1)
+
+        BackgroundTask.objects.filter(pk=task.pk).update(run_after=timezone.now())
+        with self.assertLogs('exams.tasks', 'ERROR'):
+            run_tasks()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('failed', 2))
+        self.assertIsNotNone(task.finished_at)
+
+
+class PinnedPaperTests(ExamClientTestCase):
+    """Papers of attempts pinned to a bank version do not follow later edits of their sections"""
+
+    def setUp(self):
+        super().setUp()
+        ExamSection.objects.update(questions_per_paper=4)
+        publish_question_bank(self.exam)
+
+    def paper_ids(self, attempt, section):
+        section.refresh_from_db()
+        bank._snapshots.clear()
+        return [question['id'] for question in build_attempt_paper(attempt, section)]
+
+    def test_questions_per_paper_pinned(self):
+        attempt = self.start_attempt()
+        section = attempt.current_section
+        paper = self.paper_ids(attempt, section)
+        self.assertEqual(len(paper), 4)
+
+        ExamSection.objects.filter(pk=section.pk).update(questions_per_paper=2)
+        self.assertEqual(self.paper_ids(attempt, section), paper)
+        ExamSection.objects.filter(pk=section.pk).update(questions_per_paper=0)
+        self.assertEqual(self.paper_ids(attempt, section), paper)
+
+    def test_questions_per_paper_pinned_in_compiled_bank(self):
+        attempt = self.start_attempt()
+        section = attempt.current_section
+        paper = self.paper_ids(attempt, section)
+
+        compile_bank(attempt.bank_version)
+        ExamSection.objects.filter(pk=section.pk).update(questions_per_paper=2)
+        self.assertEqual(self.paper_ids(attempt, section), paper)
+        self.assertIsInstance(bank._snapshots[attempt.bank_version_id], MappedBank)
+
+    def test_save_answer_validated_against_pinned_key(self):
+        attempt = self.start_attempt()
+        question = self.current_questions()[0]
+        option_id = self.correct_option(question)
+        # Deactivated and moved to another section after publishing
+        other_section = ExamSection.objects.exclude(pk=attempt.current_section_id).first()
+        Question.objects.filter(pk=question['id']).update(is_active=False, section=other_section)
+
+        response = self.save_answer(question['id'], option_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['is_correct'], True)
+        self.assertTrue(UserAnswer.objects.filter(
+            section_attempt__section=attempt.current_section, question_id=question['id'], selected_option_id=option_id
+        ).exists())
+
+        other_option = QuestionOption.objects.exclude(question_id=question['id']).first()
+        self.assertEqual(self.save_answer(question['id'], other_option.id).status_code, 404)
+        self.assertEqual(self.save_answer(question['id'], 'x').status_code, 400)
+
+
+
+class CompiledBankTests(ExamClientTestCase):
+    """A compiled bank file reads back exactly what the JSON snapshot of its version holds"""
+
+    def test_compiled_bank_matches_snapshot(self):
+        first, second = ExamSection.objects.order_by('id')[:2]
+        ExamSection.objects.filter(pk=first.pk).update(has_negative_marking=True, questions_per_paper=4)
+        Question.objects.filter(pk=Question.objects.filter(section=second).first().pk).update(question_text='Théorème ∑ 😀')
+        QuestionOption.objects.filter(question=Question.objects.filter(section=second).last()).update(is_correct=False)
+        version, _ = publish_question_bank(self.exam)
+
+        compile_bank(version)
+        compiled = open_bank_store(version.id)
+        self.assertIsInstance(compiled, MappedBank)
+        snapshot = BankSnapshot(version.id, version.payload)
+
+        for section_id, pool in snapshot.pools.items():
+            self.assertEqual(list(compiled.section_pool(section_id)), pool)
+            self.assertEqual(compiled.questions_per_paper(section_id), snapshot.questions_per_paper(section_id))
+        for question_id, entry in snapshot.key.items():
+            self.assertEqual(compiled.key.get(question_id), entry)
+        self.assertEqual(snapshot.key[Question.objects.filter(section=second).last().id].correct_option_id, None)
+        self.assertTrue(any(entry.penalty for entry in snapshot.key.values()))
+        self.assertIsNone(compiled.key.get(max(snapshot.key) + 1))
+
+
+class WarmUpTests(ExamClientTestCase):
+    """warm_up loads what workers would otherwise each load on their first requests"""
+
+    def test_pools_and_latest_banks_loaded(self):
+        ExamSection.objects.filter(name=SECTION_NAMES[-1]).update(is_active=False)
+        publish_question_bank(self.exam)
+        Question.objects.filter(section__name=SECTION_NAMES[0]).update(question_text='edited')
+        latest, _ = publish_question_bank(self.exam)
+
+        self.assertEqual(papers.warm_up(), (2, 1))
+        self.assertEqual(set(bank._snapshots), {latest.id})
+        sections = list(ExamSection.objects.filter(is_active=True))
+        self.assertEqual(set(papers._pools), {section.id for section in sections})
+
+        # Served from memory afterwards
+        with self.assertNumQueries(0):
+            for section in sections:
+                self.assertEqual(len(papers.section_pool(section)), 6)
+            bank.load_bank(latest.id)
+
+
+class AnswerSyncTests(ExamClientTestCase):
+    """Sequenced answer batches apply at most once, and never over a later batch"""
+
+    def setUp(self):
+        super().setUp()
+        self.start_attempt()
+        self.question = self.current_questions()[0]
+        self.options = list(QuestionOption.objects.filter(question_id=self.question['id']).values_list('id', flat=True))
+
+    def sync(self, seq, option_index):
+        return self.sync_answers(seq, [{'question_id': self.question['id'], 'option_id': self.options[option_index]}])
+
+    def selected(self):
+        return UserAnswer.objects.get(question_id=self.question['id']).selected_option_id
+
+    def test_duplicate_batch_applied_once(self):
+        self.assertEqual(self.sync(1, 0), {'success': True, 'ack': 1, 'applied': 1, 'duplicate': False})
+        # A retry of seq 1 carrying other changes is acknowledged but not applied
+        self.assertEqual(self.sync(1, 1), {'success': True, 'ack': 1, 'applied': 0, 'duplicate': True})
+        self.assertEqual(self.selected(), self.options[0])
+
+    def test_out_of_order_batch_ignored(self):
+        self.assertFalse(self.sync(3, 2)['duplicate'])
+        # Batch 2 arrives after batch 3; applying it would undo the newer change
+        self.assertEqual(self.sync(2, 1), {'success': True, 'ack': 3, 'applied': 0, 'duplicate': True})
+        self.assertEqual(self.selected(), self.options[2])
+        self.assertEqual(self.sync(4, 3)['ack'], 4)
+        self.assertEqual(self.selected(), self.options[3])
+
+
+class AnswerTargetTests(ExamClientTestCase):
+    """Answers are only taken, and scored, for questions on the paper of the section being taken"""
+
+    def future_question(self, attempt):
+        last = SectionAttempt.objects.filter(exam_attempt=attempt).exclude(section=attempt.current_section).last()
+        return Question.objects.filter(section=last.section).first(), last
+
+    def test_future_section_answer_rejected(self):
+        attempt = self.start_attempt()
+        question, section_attempt = self.future_question(attempt)
+        self.assertIsNone(section_attempt.start_time)
+        option_id = QuestionOption.objects.get(question=question, is_correct=True).id
+
+        self.assertEqual(self.save_answer(question.id, option_id).status_code, 400)
+        self.assertEqual(self.sync_answers(1, [{'question_id': question.id, 'option_id': option_id}])['applied'], 0)
+        self.assertFalse(UserAnswer.objects.filter(section_attempt=section_attempt).exists())
+
+    def off_paper_questions(self, attempt):
+        on_paper = {question['id'] for question in self.current_questions()}
+        return Question.objects.filter(section=attempt.current_section).exclude(id__in=on_paper)
+
+    def test_off_paper_answer_rejected(self):
+        ExamSection.objects.update(questions_per_paper=2)
+        attempt = self.start_attempt()
+        off_paper = self.off_paper_questions(attempt)
+        self.assertEqual(len(off_paper), 4)
+        for question in off_paper:
+            option_id = QuestionOption.objects.get(question=question, is_correct=True).id
+            self.assertEqual(self.save_answer(question.id, option_id).status_code, 404)
+        self.assertFalse(UserAnswer.objects.exists())
+
+    def test_off_paper_answer_not_scored(self):
+        ExamSection.objects.update(questions_per_paper=2)
+        attempt = self.start_attempt()
+        section_attempt = SectionAttempt.objects.get(exam_attempt=attempt, section=attempt.current_section)
+        # Stored some other way, e.g. before papers were sampled
+        for question in self.off_paper_questions(attempt):
+            UserAnswer.objects.create(
+                section_attempt=section_attempt, question=question,
+                selected_option=QuestionOption.objects.get(question=question, is_correct=True),
+            )
+        on_paper = self.current_questions()[0]
+        self.save_answer(on_paper['id'], self.correct_option(on_paper))
+
+        calculate_section_score(section_attempt)
+        self.assertEqual((section_attempt.questions_answered, section_attempt.questions_correct, section_attempt.score), (1, 1, 1))
+
+
+@override_settings(EXAM_PACKED_ANSWERS=True)
+class PackedAnswerTests(ExamClientTestCase):
+    """Packed answers read back, score and convert like rows, against the pinned paper only"""
+
+    def setUp(self):
+        super().setUp()
+        ExamSection.objects.update(questions_per_paper=4)
+        publish_question_bank(self.exam)
+
+    def section_attempts(self, attempt):
+        return list(SectionAttempt.objects.filter(exam_attempt=attempt).select_related('exam_attempt', 'section'))
+
+    def test_round_trip(self):
+        attempt = self.start_attempt()
+        self.answer_sections(answered=3)
+        section_attempts = self.section_attempts(attempt)
+        self.assertTrue(all(is_packed(section_attempt) for section_attempt in section_attempts))
+        self.assertFalse(UserAnswer.objects.exists())
+        selections = [section_selections(section_attempt) for section_attempt in section_attempts]
+        self.assertEqual([len(selection) for selection in selections], [3, 3, 3])
+        self.assertEqual([section_attempt.questions_correct for section_attempt in section_attempts], [3, 3, 3])
+
+        call_command('pack_answers', unpack=True, stdout=io.StringIO())
+        self.assertEqual(UserAnswer.objects.filter(is_correct=True).count(), 9)
+        for section_attempt, selection in zip(self.section_attempts(attempt), selections):
+            self.assertFalse(is_packed(section_attempt))
+            self.assertEqual(section_selections(section_attempt), selection)
+            self.assertEqual(calculate_section_score(section_attempt).questions_correct, 3)
+
+        call_command('pack_answers', stdout=io.StringIO())
+        self.assertFalse(UserAnswer.objects.exists())
+        for section_attempt, selection in zip(self.section_attempts(attempt), selections):
+            self.assertEqual(section_selections(section_attempt), selection)
+            self.assertEqual(calculate_section_score(section_attempt).score, 3)
+
+    def test_layout_ignores_live_questions_per_paper(self):
+        attempt = self.start_attempt()
+        questions = self.current_questions()[:2]
+        self.sync_answers(1, [{'question_id': question['id'], 'option_id': self.correct_option(question)} for question in questions])
+        section_attempt = self.section_attempts(attempt)[0]
+        selections = section_selections(section_attempt)
+
+        ExamSection.objects.update(questions_per_paper=2)
+        section_attempt = self.section_attempts(attempt)[0]
+        self.assertEqual(section_selections(section_attempt), selections)
+
+    def test_mismatched_layout_rejected_and_repaired(self):
+        attempt = self.start_attempt()
+        section_attempt = self.section_attempts(attempt)[0]
+        # Bytes written against a two-question draw of the same pool, as before questions_per_paper was pinned
+        written_with = packed.paper_layout(attempt, section_attempt.section, questions_per_paper=2)
+        question_id = written_with.question_ids[1]
+        option_id = written_with.option_ids[1][0]
+        SectionAttempt.objects.filter(pk=section_attempt.pk).update(packed_answers=written_with.encode({question_id: option_id}))
+
+        section_attempt = self.section_attempts(attempt)[0]
+        with self.assertRaises(packed.PackedLayoutError):
+            section_selections(section_attempt)
+
+        call_command('pack_answers', repair=True, stdout=io.StringIO(), stderr=io.StringIO())
+        section_attempt = self.section_attempts(attempt)[0]
+        self.assertFalse(is_packed(section_attempt))
+        self.assertEqual(section_selections(section_attempt), {question_id: option_id})
+
+
+@override_settings(EXAM_QUERY_BUDGET_ENFORCE=True, EXAM_QUERY_BUDGET_RAISE=True)
+class QueryBudgetTests(ExamClientTestCase):
+    """Every view with a budget in EXAM_QUERY_BUDGETS stays within it; QueryBudgetMiddleware raises otherwise"""
+
+    def test_candidate_views_within_budget(self):
+        self.assertEqual(self.client.get('/exams/').status_code, 200)
+        self.assertEqual(self.client.get(f'/exams/start/{self.exam.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/exams/take/{self.exam.id}/').status_code, 200)
+        for position in range(len(SECTION_NAMES)):
+            questions = self.current_questions()
+            for question in questions[:3]:
+                response = self.client.post(
+                    '/exams/api/save-answer/',
+                    json.dumps({'question_id': question['id'], 'option_id': self.correct_option(question)}),
+                    content_type='application/json',
+                )
+                self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.client.post(f'/exams/submit-section/{self.exam.id}/').status_code, 302)
+            if position < len(SECTION_NAMES) - 1:
+                self.assertEqual(self.client.get(f'/exams/take/{self.exam.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/exams/results/{self.exam.id}/').status_code, 200)
+
+    def test_admin_views_within_budget(self):
+        self.start_attempt()
+        self.answer_sections(answered=3)
+        attempt = ExamAttempt.objects.get(user=self.user)
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'password'))
+        for url in [
+            '/admin/exams/examsection/',
+            '/admin/exams/question/',
+            '/admin/exams/mockexam/',
+            f'/admin/exams/mockexam/{self.exam.id}/change/',
+            '/admin/exams/examattempt/',
+            f'/admin/exams/examattempt/{attempt.id}/change/',
+            '/admin/exams/sectionattempt/',
+            '/admin/exams/useranswer/',
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_overrun_raises(self):
+        with override_settings(EXAM_QUERY_BUDGETS={'exams:exam_list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/exams/')
+
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(max_repeats=2):
+                for section in SECTION_NAMES:
+                    ExamSection.objects.get(name=section)
+
+
+class ArchiveTests(ExamClientTestCase):
+    """Archiving moves a completed attempt out of the live tables; restoring brings back the same rows"""
+
+    def setUp(self):
+        super().setUp()
+        publish_question_bank(self.exam)
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        settings = override_settings(EXAM_ARCHIVE_DIR=archive_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def snapshot(self, attempt):
+        # The archive keeps timestamps to the millisecond
+        def rounded(rows):
+            return [tuple(
+                value.replace(microsecond=value.microsecond // 1000 * 1000) if isinstance(value, datetime) else value
+                for value in row
+            ) for row in rows]
+
+        sections = SectionAttempt.objects.filter(exam_attempt=attempt).order_by('section_id')
+        return (
+            rounded(ExamAttempt.objects.filter(pk=attempt.pk).values_list('status', 'total_score', 'passed', 'start_time', 'end_time')),
+            rounded(sections.values_list('section_id', 'score', 'questions_answered', 'questions_correct', 'start_time', 'end_time')),
+            rounded(UserAnswer.objects.filter(section_attempt__exam_attempt=attempt).order_by('id').values_list(
+                'id', 'question_id', 'selected_option_id', 'is_correct', 'points_earned', 'answered_at'
+            )),
+            [bytes(packed or b'') for packed in sections.values_list('packed_answers', flat=True)],
+        )
+
+    def archive_and_restore(self):
+        attempt = self.start_attempt()
+        self.answer_sections(answered=4)
+        ExamAttempt.objects.filter(pk=attempt.pk).update(end_time=timezone.now() - timedelta(days=400))
+        before = self.snapshot(attempt)
+        results = self.client.get(f'/exams/results/{self.exam.id}/').context['exam_attempt'].total_score
+
+        call_command('archive_attempts', stdout=io.StringIO())
+        self.assertFalse(ExamAttempt.objects.exists())
+        self.assertFalse(SectionAttempt.objects.exists())
+        self.assertFalse(UserAnswer.objects.exists())
+        archived = ArchivedAttempt.objects.get(attempt_id=attempt.pk)
+        self.assertEqual(archived.total_score, before[0][0][1])
+        self.assertEqual(self.client.get(f'/exams/results/{self.exam.id}/').context['exam_attempt'].total_score, results)
+
+        restore_attempt(archived)
+        self.assertFalse(ArchivedAttempt.objects.exists())
+        self.assertEqual(self.snapshot(attempt), before)
+        return before
+
+    def test_archive_and_restore_rows(self):
+        before = self.archive_and_restore()
+        self.assertEqual(len(before[2]), 12)
+
+    @override_settings(EXAM_PACKED_ANSWERS=True)
+    def test_archive_and_restore_packed(self):
+        before = self.archive_and_restore()
+        self.assertTrue(all(before[3]))
+
+
+class AnswerCounterTests(ExamClientTestCase):
+    """The counters kept up to date as answers are written agree with a rebuild from the stored answers"""
+
+    def setUp(self):
+        super().setUp()
+        publish_question_bank(self.exam)
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        settings = override_settings(EXAM_ARCHIVE_DIR=archive_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def login(self, username):
+        self.user = User.objects.create_user(username, f'{username}@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def counters(self):
+        return (
+            list(Question.objects.order_by('id').values_list('id', 'times_served', 'times_answered', 'times_correct')),
+            list(QuestionOption.objects.order_by('id').values_list('id', 'pick_count')),
+        )
+
+    def rebuild(self, *args):
+        out = io.StringIO()
+        call_command('rebuild_answer_counters', *args, stdout=out)
+        return out.getvalue()
+
+    def test_rebuild_agrees_with_incremental_counters(self):
+        # An attempt that changes and clears answers before submitting, then is archived
+        attempt = self.start_attempt()
+        first, second = self.current_questions()[:2]
+        wrong = QuestionOption.objects.filter(question_id=first['id'], is_correct=False).first().id
+        self.assertEqual(self.save_answer(first['id'], wrong).status_code, 200)
+        self.sync_answers(1, [{'question_id': second['id'], 'option_id': self.correct_option(second)}])
+        self.sync_answers(2, [
+            {'question_id': first['id'], 'option_id': self.correct_option(first)},
+            {'question_id': second['id'], 'option_id': None},
+        ])
+        self.client.post(f'/exams/submit-section/{self.exam.id}/')
+        self.client.get(f'/exams/take/{self.exam.id}/')
+        self.client.post(f'/exams/submit/{self.exam.id}/')
+        ExamAttempt.objects.filter(pk=attempt.pk).update(end_time=timezone.now() - timedelta(days=400))
+        call_command('archive_attempts', stdout=io.StringIO())
+        self.assertTrue(ArchivedAttempt.objects.exists())
+
+        # One attempt kept in answer rows and one with packed answers
+        self.login('rows')
+        self.start_attempt()
+        self.answer_sections(answered=2)
+        with self.settings(EXAM_PACKED_ANSWERS=True):
+            self.login('packed')
+            self.start_attempt()
+            self.answer_sections(answered=4)
+            self.assertTrue(SectionAttempt.objects.filter(packed_answers__isnull=False).exists())
+
+        incremental = self.counters()
+        self.assertTrue(any(question[2] for question in incremental[0]))
+        self.assertIn('0 question(s) and 0 option(s)', self.rebuild('--dry-run'))
+
+        Question.objects.update(times_served=0, times_answered=7, times_correct=0)
+        QuestionOption.objects.update(pick_count=3)
+        self.assertNotIn('0 question(s) and 0 option(s)', self.rebuild('--dry-run'))
+        self.rebuild()
+        self.assertEqual(self.counters(), incremental)
+
+
+    def test_concurrent_first_answer_updates_the_winner(self):
+        attempt = self.start_attempt()
+        question = self.current_questions()[0]
+        section_attempt = SectionAttempt.objects.get(exam_attempt=attempt, section=attempt.current_section)
+        wrong = QuestionOption.objects.filter(question_id=question['id'], is_correct=False).first()
+        self.save_answer(question['id'], wrong.id)
+
+        # The other request's insert is not visible yet when this one looks for the answer
+        select_for_update = UserAnswer.objects.select_for_update
+        looked = []
+
+        def racing(*args, **kwargs):
+            queryset = select_for_update(*args, **kwargs)
+            if not looked:
+                looked.append(True)
+                return queryset.none()
+            return queryset
+
+        with mock.patch.object(UserAnswer.objects, 'select_for_update', racing):
+            store_answer(section_attempt, question['id'], self.correct_option(question))
+        self.assertEqual(UserAnswer.objects.get().selected_option_id, self.correct_option(question))
+        self.assertIn('0 question(s) and 0 option(s)', self.rebuild('--dry-run'))
+
+    def test_generated_dataset_counted(self):
+        call_command('generate_dataset', users=3, questions_per_section=5, workers=1, stdout=io.StringIO())
+        self.assertTrue(Question.objects.filter(times_answered__gt=0).exists())
+        self.assertIn('0 question(s) and 0 option(s)', self.rebuild('--dry-run'))
+
+
+class GenerateDatasetTests(TestCase):
+    """generate_dataset is reproducible: the same seed and end date give the same data"""
+
+    def generate(self, seed, prefix):
+        bases = (Question.objects.aggregate(top=Max('id'))['top'] or 0, QuestionOption.objects.aggregate(top=Max('id'))['top'] or 0)
+        call_command(
+            'generate_dataset', seed=seed, prefix=prefix, users=4, questions_per_section=5, answers_per_section=3,
+            end_date='2024-06-01', workers=1, stdout=io.StringIO(),
+        )
+        return self.snapshot(MockExam.objects.latest('id'), *bases)
+
+    def snapshot(self, exam, question_base, option_base):
+        """Generated rows with ids made relative to the run, so two runs can be compared"""
+        questions = list(
+            Question.objects.filter(id__gt=question_base).order_by('id').values_list('question_text', 'difficulty', 'explanation')
+        )
+        options = list(
+            QuestionOption.objects.filter(id__gt=option_base).order_by('id').values_list('option_letter', 'option_text', 'is_correct')
+        )
+        attempts = list(
+            ExamAttempt.objects.filter(exam=exam).order_by('id').values_list(
+                'user__first_name', 'user__last_name', 'status', 'start_time', 'end_time', 'total_score', 'passed', 'paper_seed'
+            )
+        )
+        answers = [
+            (question_id - question_base, option_id - option_base if option_id else None, is_correct, points)
+            for question_id, option_id, is_correct, points in UserAnswer.objects.filter(
+                section_attempt__exam_attempt__exam=exam
+            ).order_by('id').values_list('question_id', 'selected_option_id', 'is_correct', 'points_earned')
+        ]
+        return questions, options, attempts, answers
+
+    def test_same_seed_same_dataset(self):
+        first = self.generate(7, 'first_')
+        self.assertTrue(all(first))
+        self.assertEqual(self.generate(7, 'again_'), first)
+        self.assertNotEqual(self.generate(8, 'other_'), first)
+
+
+class ProfileExamFlowTests(ExamClientTestCase):
+    """profile_exam_flow drives a whole attempt and writes its reports without keeping the attempt"""
+
+    def test_reports_written_and_attempt_rolled_back(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        out = io.StringIO()
+        call_command('profile_exam_flow', exam=self.exam.id, answers=2, admin=True, output_dir=output_dir, stdout=out)
+
+        report_path, = Path(output_dir).glob('*.json')
+        report = json.loads(report_path.read_text())
+        self.assertTrue(list(Path(output_dir).glob('*.html')))
+        self.assertEqual(report['exam']['id'], self.exam.id)
+        self.assertGreater(report['totals']['queries'], 0)
+        self.assertTrue(
+            {'start_exam', 'take_exam', 'get_questions', 'save_answer', 'submit_section', 'exam_results', 'admin mockexam change'}
+            <= {view['label'] for view in report['views']}
+        )
+        self.assertEqual([step['path'] for step in report['steps'] if step['status'] >= 400], [])
+        self.assertIn('requests in', out.getvalue())
+        self.assertFalse(ExamAttempt.objects.exists())
+
+
+class ReplicaRoutingTests(ExamClientTestCase):
+    """Replica reads are opt-in per block or view, and a client that wrote reads from the primary"""
+
+    def test_block_reads_from_replica_until_it_writes(self):
+        router = ReplicaRouter()
+        with mock.patch('exams.routers.replica_alias', return_value='replica'):
+            self.assertIsNone(router.db_for_read(ExamAttempt))
+            with use_replica():
+                self.assertEqual(router.db_for_read(ExamAttempt), 'replica')
+                self.assertIsNone(router.db_for_read(User))
+                # Related rows follow the instance they hang off
+                self.assertEqual(router.db_for_read(ExamSection, instance=self.exam), 'default')
+                self.assertEqual(router.db_for_write(ExamAttempt), 'default')
+                self.assertIsNone(router.db_for_read(ExamAttempt))
+            self.assertIsNone(router.db_for_read(ExamAttempt))
+
+    def test_client_that_wrote_reads_from_primary(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        read_from = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            read_from.append(db_for_read(router, model, **hints))
+            return read_from[-1]
+
+        changelist = '/admin/exams/examattempt/'
+        # Routing to the replica is observed as reads routed to the alias it names
+        with mock.patch('exams.routers.replica_alias', return_value='default'), \
+                mock.patch('exams.middleware.replica_alias', return_value='default'), \
+                mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            self.assertEqual(self.client.get(changelist).status_code, 200)
+            self.assertIn('default', read_from)
+
+            # Taking the exam creates the attempt; the client's next reads stay on the primary
+            response = self.client.get(f'/exams/take/{self.exam.id}/')
+            self.assertIn(PIN_COOKIE, response.cookies)
+            read_from.clear()
+            self.assertEqual(self.client.get(changelist).status_code, 200)
+            self.assertTrue(read_from)
+            self.assertEqual(set(read_from), {None})
+
+
+class WriteQueueTests(ExamClientTestCase):
+    """A group commit isolates each write in a savepoint"""
+
+    def test_failed_write_does_not_undo_the_batch(self):
+        attempt = self.start_attempt()
+        section_attempt = attempt.section_attempts.get(section=attempt.current_section)
+        first, second, third = self.current_questions()[:3]
+
+        def failing_write():
+            store_answer(section_attempt, second['id'], self.correct_option(second))
+            raise ValueError('rejected')
+
+        batch = [
+            PendingWrite(store_answer, (section_attempt, first['id'], self.correct_option(first)), {}),
+            PendingWrite(failing_write, (), {}),
+            PendingWrite(store_answer, (section_attempt, third['id'], self.correct_option(third)), {}),
+        ]
+        # The writer thread idles on its empty queue; the batch is applied here
+        writer = WriteQueue(max_batch=10)
+        writer.apply(batch)
+
+        self.assertTrue(all(pending.done.is_set() for pending in batch))
+        self.assertIsInstance(batch[1].error, ValueError)
+        self.assertIsNone(batch[0].error)
+        self.assertEqual(
+            set(UserAnswer.objects.values_list('question_id', flat=True)), {first['id'], third['id']}
+        )
+        # Its counter change went with it
+        self.assertEqual(Question.objects.get(id=second['id']).times_answered, 0)
+        self.assertEqual((writer.batches, writer.writes), (1, 3))
+
+
+class ActivityTests(ExamClientTestCase):
+    """Activity signals are buffered and written in bulk by a timer, not by the requests recording them"""
+
+    def setUp(self):
+        super().setUp()
+        self.attempt = self.start_attempt()
+        self.section_attempt = self.attempt.section_attempts.first()
+        activity.flush_activity()
+
+    def test_signals_coalesce_into_one_write_per_attempt(self):
+        with self.assertNumQueries(0):
+            for index in (1, 4, 2):
+                activity.record_activity(self.attempt.id, self.section_attempt.id, index)
+        self.assertEqual(activity.flush_activity(), (1, 1))
+        self.section_attempt.refresh_from_db()
+        self.assertEqual(self.section_attempt.current_question_index, 2)
+        self.assertEqual(activity.flush_activity(), (0, 0))
+
+    def test_flusher_writes_on_its_timer(self):
+        activity.record_activity(self.attempt.id, self.section_attempt.id, 3)
+        self.addCleanup(activity._stopped.clear)
+        flush = activity.flush_activity
+
+        def flush_once():
+            flush()
+            activity._stopped.set()
+
+        with mock.patch('exams.activity.flush_activity', side_effect=flush_once) as flushed:
+            activity.run_activity_flusher(0)
+        flushed.assert_called_once()
+        self.section_attempt.refresh_from_db()
+        self.assertEqual(self.section_attempt.current_question_index, 3)
+
+    def test_buffer_written_at_exit(self):
+        ExamAttempt.objects.filter(pk=self.attempt.pk).update(last_activity=None)
+        activity.record_activity(self.attempt.id)
+        # Leave the worker's real flush thread running
+        with mock.patch.object(activity._stopped, 'set'):
+            activity.stop_activity_flusher()
+        self.attempt.refresh_from_db()
+        self.assertIsNotNone(self.attempt.last_activity)
+
+
+class TracingTests(ExamClientTestCase):
+    """SQL spans keep the raw statement until a trace is written, and are written normalized"""
+
+    def written_traces(self, directory):
+        return [json.loads(line) for path in sorted(Path(directory).glob('*.jsonl')) for line in path.read_text().splitlines()]
+
+    def sql_names(self, node):
+        names = [node['name']] if node['kind'] == 'sql' else []
+        for child in node.get('children', []):
+            names += self.sql_names(child)
+        return names
+
+    def test_sampled_trace_normalizes_sql(self):
+        trace_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, trace_dir)
+        with self.settings(EXAM_TRACING=True, EXAM_TRACE_SAMPLE_RATE=1, EXAM_TRACE_DIR=trace_dir):
+            self.start_attempt()
+        traces = self.written_traces(trace_dir)
+        self.assertEqual(len(traces), 2)
+        names = self.sql_names(traces[-1]['root'])
+        self.assertTrue(names)
+        self.assertTrue(all(name == normalize_sql(name) for name in names))
+
+
+@override_settings(EXAM_ADMISSION_ALLOW_LOCAL_CACHE=True)
+class AdmissionTests(ExamClientTestCase):
+    """An admission cap limits the candidates taking an exam at once, not how many start per window"""
+
+    def setUp(self):
+        super().setUp()
+        MockExam.objects.filter(pk=self.exam.pk).update(admission_cap=1)
+        self.exam.refresh_from_db()
+        self.other = User.objects.create_user('waiting', 'waiting@example.com', 'password')
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def take(self, client):
+        return client.get(f'/exams/take/{self.exam.id}/')
+
+    def test_slot_released_on_submit(self):
+        self.assertEqual(self.take(self.client).status_code, 200)
+        self.assertRedirects(self.take(self.other_client), f'/exams/waiting-room/{self.exam.id}/')
+        self.assertEqual(queue_status(self.exam.id)['active'], 1)
+
+        # Windows passing do not let more candidates in while the slot is held
+        with mock.patch('exams.admission.time.time', return_value=time.time() + 60):
+            self.assertEqual(self.take(self.other_client).status_code, 302)
+
+        self.client.post(f'/exams/submit/{self.exam.id}/')
+        self.assertEqual(queue_status(self.exam.id)['active'], 0)
+        self.assertEqual(self.take(self.other_client).status_code, 200)
+        self.assertTrue(ExamAttempt.objects.filter(user=self.other, status='in_progress').exists())
+
+    def test_slot_lapses_without_heartbeats(self):
+        self.assertEqual(self.take(self.client).status_code, 200)
+        self.assertEqual(self.take(self.other_client).status_code, 302)
+        # The candidate closed the tab: nothing renews the lease and it expires
+        cache.delete(f'exams:admission:{self.exam.id}:slot:0')
+        self.assertEqual(self.take(self.other_client).status_code, 200)
+
+    def test_evicted_ticket_counter_restarts(self):
+        self.assertEqual(self.take(self.client).status_code, 200)
+        cache.delete(f'exams:admission:{self.exam.id}:tickets')
+        self.assertEqual(self.take(self.other_client).status_code, 302)
+        self.assertEqual(queue_status(self.exam.id)['issued'], 1)
+
+    def test_resumed_attempt_takes_its_own_slot(self):
+        self.assertEqual(self.take(self.client).status_code, 200)
+        # Same candidate on another device: their slot is theirs again, not a second one
+        device = Client()
+        device.force_login(self.user)
+        self.assertEqual(self.take(device).status_code, 200)
+        self.assertEqual(queue_status(self.exam.id)['active'], 1)
+        self.assertEqual(self.take(self.other_client).status_code, 302)
+
+    def test_resumed_attempt_waits_while_full(self):
+        self.assertEqual(self.take(self.client).status_code, 200)
+        cache.delete(f'exams:admission:{self.exam.id}:slot:0')
+        self.assertEqual(self.take(self.other_client).status_code, 200)
+        # The first candidate's lease lapsed and the slot went to someone else
+        device = Client()
+        device.force_login(self.user)
+        self.assertRedirects(self.take(device), f'/exams/waiting-room/{self.exam.id}/')
+        self.assertEqual(queue_status(self.exam.id)['active'], 1)
+
+    @override_settings(EXAM_ADMISSION_ALLOW_LOCAL_CACHE=False)
+    def test_local_memory_cache_refused(self):
+        errors = check_admission_cache()
+        self.assertEqual([error.id for error in errors], ['exams.E001'])
+        self.assertIn('local-memory cache', errors[0].msg)
+
+
+class TokenBucketTests(TestCase):
+    """Rate limits hold when requests of one client arrive at the same time"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_burst_then_refused(self):
+        waits = [consume_token('bucket', 60, 5) for _ in range(7)]
+        self.assertEqual(waits[:5], [0] * 5)
+        self.assertTrue(all(0 < wait <= 10 for wait in waits[5:]))
+
+    def test_concurrent_requests_all_counted(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            waits = list(pool.map(lambda _: consume_token('bucket', 60, 10), range(40)))
+        self.assertEqual(waits.count(0), 10)
+
+    def test_refills_over_time(self):
+        start = 1_000_000_000.0
+        with mock.patch('exams.throttling.time.time', return_value=start):
+            for _ in range(5):
+                self.assertEqual(consume_token('bucket', 60, 5), 0)
+            self.assertGreater(consume_token('bucket', 60, 5), 0)
+        # Half the bucket has refilled once half of a refill period has gone by
+        with mock.patch('exams.throttling.time.time', return_value=start + 7.5):
+            self.assertEqual([consume_token('bucket', 60, 5) > 0 for _ in range(4)], [False, False, True, True])
+
+    def test_evicted_counter_restarts(self):
+        self.assertEqual(incr(cache, 'counter', 60, 5), 5)
+        cache.delete('counter')
+        self.assertEqual(incr(cache, 'counter', 60), 1)
+        self.assertEqual(incr(cache, 'counter', 60), 2)
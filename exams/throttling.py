@@ -0,0 +1,83 @@
+"""
+Rate limiting and load shedding for the exam API.
+
+``consume_token`` implements a token bucket per (user, URL name) as a
+sliding-window counter in the cache named by ``EXAM_RATE_LIMIT_CACHE``;
+it is updated with ``cache.incr`` only, so concurrent requests are all
+counted. The local-memory default limits per worker, a shared cache
+limits globally.
+
+``LatencyTracker`` keeps a rolling sample of exam API latencies per
+process; while its p99 is above ``EXAM_LOAD_SHED_P99_MS`` the endpoints
+listed in ``EXAM_API_LOW_PRIORITY`` are refused first.
+"""
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cacheutil import incr
+
+
+def consume_token(key, per_minute, burst):
+    """Take a token from a bucket; return 0 when allowed, else seconds until a token frees up"""
+    cache = caches[getattr(settings, 'EXAM_RATE_LIMIT_CACHE', 'default')]
+    rate = per_minute / 60
+    # The bucket is a sliding window as long as a full refill: at most ``burst`` requests in it
+    window = burst / rate
+    index, offset = divmod(time.time(), window)
+    current_key = f'{key}:{int(index)}'
+    # Counters are only ever incremented, so concurrent requests cannot overwrite each other's tokens
+    count = incr(cache, current_key, timeout=int(2 * window) + 1)
+    previous = cache.get(f'{key}:{int(index) - 1}', 0)
+    
+    # Requests in the previous window count for the share of it still inside the sliding window
+    overlap = 1 - offset / window
+    if previous * overlap + count <= burst:
+        return 0
+    
+    # Refused requests do not use up a token
+    try:
+        cache.decr(current_key)
+    except ValueError:
+        pass
+    count -= 1
+    if count < burst:
+        # Wait until enough of the previous window has slid out; a refusal never reports 0
+        return max(0.001, (1 - (burst - count - 1) / previous) * window - offset)
+    # The current window alone is full: wait for the next one and for enough of this one to slide out
+    return window - offset + (1 - (burst - 1) / count) * window
+
+
+class LatencyTracker:
+    """Rolling per-process latency sample with a cached p99"""
+    
+    def __init__(self, size=500):
+        self.samples = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.p99_cache = (0.0, 0.0)  # (computed_at, p99_ms)
+    
+    def record(self, millis):
+        with self.lock:
+            self.samples.append(millis)
+    
+    def p99(self):
+        computed_at, value = self.p99_cache
+        if time.monotonic() - computed_at < 1:
+            return value
+        with self.lock:
+            ordered = sorted(self.samples)
+        value = ordered[int(len(ordered) * 0.99)] if len(ordered) >= 20 else 0.0
+        self.p99_cache = (time.monotonic(), value)
+        return value
+
+
+latency_tracker = LatencyTracker(getattr(settings, 'EXAM_LOAD_SHED_SAMPLE_SIZE', 500))
+
+
+def load_shedding_active():
+    """True while the exam API p99 latency is above the configured threshold"""
+    threshold = getattr(settings, 'EXAM_LOAD_SHED_P99_MS', None)
+    return bool(threshold) and latency_tracker.p99() > threshold
@@ -0,0 +1,256 @@
+"""
+Per-request tracing written to local JSONL files.
+
+While ``EXAM_TRACING`` is on (off by default), ``TracingMiddleware`` opens a trace for each
+request and every span started during it nests under the current one
+(kept in a context variable, so helpers need no extra arguments). Spans
+come from:
+
+- the request itself; its self time is middleware, the ``view`` span
+  opened by ``TraceViewMiddleware`` at the end of the chain covers URL
+  resolution, the view and response rendering
+- every SQL statement, on all database connections
+- template renders through the ``TracedDjangoTemplates`` backend
+- JSON encoding in ``JsonResponse`` below
+- functions decorated with ``@traced`` and blocks wrapped in ``span()``
+
+Requests slower than ``EXAM_TRACE_SLOW_MS`` are always written, others with
+probability ``EXAM_TRACE_SAMPLE_RATE``. Each process appends to its own
+``traces-<date>-<pid>.jsonl`` in ``EXAM_TRACE_DIR``; ``trace_report``
+aggregates them.
+"""
+import contextvars
+import functools
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from django import http
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+from django.utils import timezone
+
+from .querylog import normalize_sql
+
+_current_span = contextvars.ContextVar('exam_trace_span', default=None)
+
+
+class Span:
+    """A timed section of a request; children are the spans started inside it"""
+
+    __slots__ = ('name', 'kind', 'attrs', 'started', 'ended', 'children', 'trace')
+
+    def __init__(self, name, kind, trace, attrs=None):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs or {}
+        self.trace = trace
+        self.children = []
+        self.started = time.perf_counter()
+        self.ended = None
+
+    @property
+    def duration_ms(self):
+        return ((self.ended or time.perf_counter()) - self.started) * 1000
+
+    def to_dict(self, origin):
+        # SQL spans keep the raw statement; it is only normalized for the traces that are written
+        name = normalize_sql(self.name)[:500] if self.kind == 'sql' else self.name
+        data = {
+            'name': name,
+            'kind': self.kind,
+            'start_ms': round((self.started - origin) * 1000, 3),
+            'duration_ms': round(self.duration_ms, 3),
+        }
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.children:
+            data['children'] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+class Trace:
+    """Span tree of one request"""
+
+    def __init__(self, name, max_spans):
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = timezone.now()
+        self.max_spans = max_spans
+        self.span_count = 0
+        self.dropped = 0
+        self.root = Span(name, 'request', self)
+
+
+class span:
+    """
+    Time a block as a child of the current span; does nothing outside a trace.
+
+        with span('build paper', section=section.id):
+            ...
+    """
+
+    __slots__ = ('name', 'kind', 'attrs', '_span', '_token')
+
+    def __init__(self, name, kind='code', **attrs):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self._span = None
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        trace = parent.trace
+        if trace.span_count >= trace.max_spans:
+            trace.dropped += 1
+            return None
+        trace.span_count += 1
+        self._span = Span(self.name, self.kind, trace, self.attrs)
+        parent.children.append(self._span)
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._span is None:
+            return False
+        self._span.ended = time.perf_counter()
+        if exc_type is not None:
+            self._span.attrs['error'] = exc_type.__name__
+        _current_span.reset(self._token)
+        return False
+
+
+def traced(func=None, *, name=None, kind='code'):
+    """Decorator recording each call of a function as a span"""
+    if func is None:
+        return functools.partial(traced, name=name, kind=kind)
+
+    span_name = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_span.get() is None:
+            return func(*args, **kwargs)
+        with span(span_name, kind):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def current_trace():
+    current = _current_span.get()
+    return current.trace if current else None
+
+
+def _sql_span(alias):
+    def wrapper(execute, sql, params, many, context):
+        with span(sql, 'sql', db=alias, many=many):
+            return execute(sql, params, many, context)
+    return wrapper
+
+
+def trace_dir():
+    return Path(getattr(settings, 'EXAM_TRACE_DIR', settings.BASE_DIR / 'var' / 'traces'))
+
+
+def write_trace(trace, request, response, reason):
+    """Append a finished trace as one JSON line to this process's file"""
+    match = getattr(request, 'resolver_match', None)
+    root = trace.root
+    record = {
+        'trace_id': trace.trace_id,
+        'started_at': trace.started_at.isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'endpoint': match.view_name if match else None,
+        'status': response.status_code,
+        'duration_ms': round(root.duration_ms, 3),
+        'reason': reason,
+        'spans': trace.span_count,
+        'dropped_spans': trace.dropped,
+        'root': root.to_dict(root.started),
+    }
+    directory = trace_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'traces-{trace.started_at:%Y%m%d}-{os.getpid()}.jsonl'
+    with open(path, 'a', encoding='utf-8') as handle:
+        handle.write(json.dumps(record, default=str) + '\n')
+
+
+class TracingMiddleware:
+    """Open a trace per request and write the slow and sampled ones (first in MIDDLEWARE)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'EXAM_TRACING', False) or _current_span.get() is not None:
+            return self.get_response(request)
+
+        trace = Trace(f'{request.method} {request.path}', getattr(settings, 'EXAM_TRACE_MAX_SPANS', 2000))
+        token = _current_span.set(trace.root)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_sql_span(alias)))
+                response = self.get_response(request)
+        finally:
+            trace.root.ended = time.perf_counter()
+            _current_span.reset(token)
+
+        if trace.root.duration_ms >= getattr(settings, 'EXAM_TRACE_SLOW_MS', 1000):
+            write_trace(trace, request, response, 'slow')
+        elif random.random() < getattr(settings, 'EXAM_TRACE_SAMPLE_RATE', 0.01):
+            write_trace(trace, request, response, 'sampled')
+        return response
+
+
+class TraceViewMiddleware:
+    """Span for URL resolution, the view and response rendering (last in MIDDLEWARE)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with span('view', 'view'):
+            return self.get_response(request)
+
+
+class TracedTemplate:
+    """Template whose renders are recorded as spans"""
+
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with span(self.origin.template_name or 'template', 'template'):
+            return self.template.render(context, request)
+
+
+class TracedDjangoTemplates(DjangoTemplates):
+    """Django template backend recording template renders in the current trace"""
+
+    def from_string(self, template_code):
+        return TracedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TracedTemplate(super().get_template(template_name))
+
+
+class JsonResponse(http.JsonResponse):
+    """JsonResponse recording the encoding of its payload in the current trace"""
+
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, json_dumps_params=None, **kwargs):
+        with span('json encode', 'json'):
+            super().__init__(data, encoder, safe, json_dumps_params, **kwargs)
@@ -8,6 +8,7 @@ urlpatterns = [
     path('instructions/', views.exam_instructions, name='instructions'),
     path('start/<int:exam_id>/', views.start_exam, name='start_exam'),
     path('take/<int:exam_id>/', views.take_exam, name='take_exam'),
+    path('waiting-room/<int:exam_id>/', views.waiting_room, name='waiting_room'),
     path('section/<int:exam_id>/<str:section>/', views.exam_section, name='exam_section'),
     path('submit/<int:exam_id>/', views.submit_exam, name='submit_exam'),
     path('submit-section/<int:exam_id>/', views.submit_section, name='submit_section'),
@@ -15,9 +16,14 @@ urlpatterns = [
     
     # API endpoints
     path('api/questions/<int:exam_id>/', views.get_questions, name='get_questions'),
+    path('api/bundle/<int:exam_id>/', views.get_exam_bundle, name='get_exam_bundle'),
     path('api/save-answer/', views.save_answer, name='save_answer'),
+    path('api/sync-answers/<int:exam_id>/', views.sync_answers, name='sync_answers'),
     path('api/time-remaining/<int:exam_id>/', views.check_time_remaining, name='check_time_remaining'),
     path('api/auto-save/', views.auto_save_progress, name='auto_save_progress'),
     path('api/session-status/<int:exam_id>/', views.get_session_status, name='get_session_status'),
+    path('api/heartbeat/<int:exam_id>/', views.exam_heartbeat, name='exam_heartbeat'),
+    path('api/queue/<int:exam_id>/', views.admission_queue_status, name='admission_queue_status'),
+    path('api/queue/<int:exam_id>/metrics/', views.admission_queue_metrics, name='admission_queue_metrics'),
     path('recover-session/<int:exam_id>/', views.recover_session, name='recover_session'),
 ]
@@ -1,9 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
 from django.utils import timezone
+from django.core.cache import cache
 from django.db.models import Count, Q
 from django.core.paginator import Paginator
 import json
@@ -11,8 +14,24 @@ from datetime import timedelta
 
 from .models import (
     MockExam, ExamSection, Question, QuestionOption, 
-    ExamAttempt, SectionAttempt, UserAnswer, ExamConfiguration
+    ExamAttempt, SectionAttempt, UserAnswer, ExamConfiguration, ArchivedAttempt
 )
+from .conditional import make_etag, etag_matches, set_etag, not_modified
+from .papers import build_attempt_paper, paper_question_ids, questions_per_paper
+from .bundle import build_bundle, bundle_version, section_key
+from .answers import apply_answer_sync, flush_answer_journal, journal_answer_changes, record_answer_changes, store_answer
+from .journal import journal_enabled
+from .activity import record_activity
+from .admission import check_admission, queue_status, admission_metrics, release_admission, renew_admission
+from .throttling import load_shedding_active
+from .tracing import JsonResponse, traced
+from .writequeue import run_answer_write
+from .plan import get_section_plan, plan_sections, provision_section_attempts
+from .bank import attempt_answer_key, current_bank_version_id
+from .tasks import complete_task, defer
+from .packed import answered_count, is_packed, paper_layout, section_selections
+from .archive import rehydrate_attempt
+from .counters import count_served
 
 
 @login_required
@@ -21,11 +40,9 @@ def exam_list(request):
     exams = MockExam.objects.filter(is_active=True).prefetch_related('sections')
     
     # Add total questions count for each exam
+    sizes = paper_question_counts({section for exam in exams for section in exam.sections.all()})
     for exam in exams:
-        total_questions = 0
-        for section in exam.sections.all():
-            total_questions += section.questions.filter(is_active=True).count()
-        exam.total_questions = total_questions
+        exam.total_questions = sum(sizes[section.id] for section in exam.sections.all())
     
     return render(request, 'exams/exam_list.html', {'exams': exams})
 
@@ -41,7 +58,7 @@ def exam_instructions(request):
     if not config:
         config = ExamConfiguration.objects.create()
     
-    sections = exam.sections.filter(is_active=True).order_by('name')
+    sections = plan_sections(get_section_plan(exam.id))
     total_duration = exam.total_duration()
     
     context = {
@@ -70,9 +87,7 @@ def start_exam(request, exam_id):
         return redirect('exams:take_exam', exam_id=exam.id)
     
     # Calculate total questions
-    total_questions = 0
-    for section in exam.sections.all():
-        total_questions += section.questions.filter(is_active=True).count()
+    total_questions = sum(paper_question_counts(exam.sections.all()).values())
     
     context = {
         'exam': exam,
@@ -86,6 +101,13 @@ def take_exam(request, exam_id):
     """Take exam interface"""
     exam = get_object_or_404(MockExam, id=exam_id, is_active=True)
     
+    # Queue new candidates during start bursts; nothing is created until admission
+    if exam.admission_cap and not request.session.get(f'exam_admission_{exam.id}', {}).get('admitted'):
+        # Resumed attempts take a slot too (their own, if they still hold one), so they count against the cap
+        resuming = ExamAttempt.objects.filter(user=request.user, exam=exam, status='in_progress').exists()
+        if not check_admission(request, exam, resuming=resuming):
+            return redirect('exams:waiting_room', exam_id=exam.id)
+    
     # Get or create exam attempt
     exam_attempt, created = ExamAttempt.objects.get_or_create(
         user=request.user,
@@ -97,20 +119,35 @@ def take_exam(request, exam_id):
         }
     )
     
+    plan = get_section_plan(exam.id)
+    sections = plan_sections(plan)
+    
     if created or exam_attempt.status == 'not_started':
         exam_attempt.status = 'in_progress'
         exam_attempt.start_time = timezone.now()
+        if not exam_attempt.current_section_id:
+            exam_attempt.current_section_id = plan.first()
+        # Papers and scoring of this attempt come from the bank version published at its start
+        if not exam_attempt.bank_version_id:
+            exam_attempt.bank_version_id = current_bank_version_id(exam)
         exam_attempt.save()
+        
+        # Every section attempt of the plan is created up front; transitions only update rows
+        provision_section_attempts(exam_attempt, sections)
     
     # Get current section or first section
-    if not exam_attempt.current_section:
-        first_section = exam.sections.filter(is_active=True).first()
-        exam_attempt.current_section = first_section
-        exam_attempt.save()
-    
-    current_section = exam_attempt.current_section
+    if not exam_attempt.current_section_id:
+        exam_attempt.current_section_id = plan.first()
+        exam_attempt.save(update_fields=['current_section'])
+    
+    # The planned sections were just read; reuse the current one rather than loading it again
+    current_section = next((section for section in sections if section.id == exam_attempt.current_section_id), None)
+    if current_section is None:
+        current_section = exam_attempt.current_section
+    else:
+        exam_attempt.current_section = current_section
     
-    # Get or create section attempt
+    # Attempts started before sections were pre-provisioned may still lack the row
     section_attempt, created = SectionAttempt.objects.get_or_create(
         exam_attempt=exam_attempt,
         section=current_section,
@@ -120,19 +157,61 @@ def take_exam(request, exam_id):
         }
     )
     
+    # The section timer starts the first time the section is shown; only the request that starts it counts the paper as served
     if created:
+        count_served(exam_attempt, current_section)
+    elif not section_attempt.start_time:
         section_attempt.start_time = timezone.now()
-        section_attempt.save()
+        if SectionAttempt.objects.filter(pk=section_attempt.pk, start_time__isnull=True).update(start_time=section_attempt.start_time):
+            count_served(exam_attempt, current_section)
+    
+    record_activity(exam_attempt.id)
+    
+    # The client serves the paper from its cached bundle; release the key for this section
+    existing_answers = section_selections(section_attempt, exam_attempt)
     
     context = {
         'exam': exam,
         'exam_attempt': exam_attempt,
         'current_section': current_section,
         'section_attempt': section_attempt,
+        'bundle_version': bundle_version(exam, sections),
+        'section_key': section_key(exam_attempt, current_section).hex(),
+        'existing_answers': existing_answers,
     }
     return render(request, 'exams/take_exam.html', context)
 
 
+@login_required
+def waiting_room(request, exam_id):
+    """Lightweight page shown to candidates queued for admission"""
+    exam = get_object_or_404(MockExam, id=exam_id, is_active=True)
+    admission = request.session.get(f'exam_admission_{exam.id}')
+    if not exam.admission_cap or not admission or admission.get('admitted'):
+        return redirect('exams:take_exam', exam_id=exam.id)
+    
+    status = queue_status(exam.id)
+    context = {
+        'exam': exam,
+        'ticket': admission['ticket'],
+        'status': status,
+        'ahead': max(0, admission['ticket'] - status['serving']),
+    }
+    return render(request, 'exams/waiting_room.html', context)
+
+
+@cache_control(public=True, max_age=2)
+def admission_queue_status(request, exam_id):
+    """Cacheable API endpoint with the queue position currently being served"""
+    return JsonResponse(queue_status(exam_id))
+
+
+@staff_member_required
+def admission_queue_metrics(request, exam_id):
+    """Queue depth and wait-time metrics for staff"""
+    return JsonResponse(admission_metrics(exam_id))
+
+
 @login_required
 def exam_section(request, exam_id, section):
     """Individual exam section"""
@@ -162,7 +241,7 @@ def get_questions(request, exam_id):
     
     exam = get_object_or_404(MockExam, id=exam_id, is_active=True)
     exam_attempt = get_object_or_404(
-        ExamAttempt,
+        ExamAttempt.objects.select_related('current_section'),
         user=request.user,
         exam=exam,
         status='in_progress'
@@ -172,45 +251,35 @@ def get_questions(request, exam_id):
     if not current_section:
         return JsonResponse({'error': 'No current section'}, status=400)
     
-    # Get questions for current section
-    questions = Question.objects.filter(
-        section=current_section,
-        is_active=True
-    ).prefetch_related('options').order_by('id')
-    
     # Get existing answers
     section_attempt = SectionAttempt.objects.filter(
         exam_attempt=exam_attempt,
         section=current_section
     ).first()
     
+    # The paper only changes with the section content or the candidate's answers
+    etag = make_etag(
+        'questions',
+        current_section.id,
+        current_section.content_version,
+        section_attempt.id if section_attempt else 0,
+        section_attempt.answer_revision if section_attempt else 0,
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
     existing_answers = {}
     if section_attempt:
-        answers = UserAnswer.objects.filter(section_attempt=section_attempt)
-        existing_answers = {
-            answer.question.id: answer.selected_option.option_letter 
-            for answer in answers if answer.selected_option
-        }
-    
-    # Format questions for JSON response
-    questions_data = []
-    for question in questions:
-        options_data = []
-        for option in question.options.all():
-            options_data.append({
-                'id': option.id,
-                'letter': option.option_letter,
-                'text': option.option_text,
-            })
-        
-        questions_data.append({
-            'id': question.id,
-            'text': question.question_text,
-            'points': question.points,
-            'negative_points': question.negative_points,
-            'options': options_data,
-            'selected_answer': existing_answers.get(question.id),
-        })
+        existing_answers = section_selections(section_attempt, exam_attempt)
+    
+    # Format questions for JSON response; selected_answer is the letter shown to this attempt
+    questions_data = build_attempt_paper(exam_attempt, current_section)
+    for question_data in questions_data:
+        selected = existing_answers.get(question_data['id'])
+        question_data['selected_answer'] = next(
+            (option['letter'] for option in question_data['options'] if option['id'] == selected),
+            None
+        )
     
     # Calculate time remaining
     time_remaining = 0
@@ -222,7 +291,7 @@ def get_questions(request, exam_id):
     else:
         time_remaining = current_section.duration_minutes * 60
     
-    return JsonResponse({
+    response = JsonResponse({
         'questions': questions_data,
         'section': {
             'id': current_section.id,
@@ -232,6 +301,30 @@ def get_questions(request, exam_id):
         },
         'existing_answers': existing_answers,
     })
+    return set_etag(response, etag)
+
+
+@login_required
+def get_exam_bundle(request, exam_id):
+    """API endpoint returning the papers of every section for offline caching"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    exam = get_object_or_404(MockExam, id=exam_id, is_active=True)
+    exam_attempt = get_object_or_404(
+        ExamAttempt,
+        user=request.user,
+        exam=exam,
+        status='in_progress'
+    )
+    
+    sections = plan_sections(get_section_plan(exam.id))
+    etag = make_etag('bundle', exam_attempt.id, bundle_version(exam, sections))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    response = JsonResponse(build_bundle(exam, exam_attempt, sections))
+    return set_etag(response, etag)
 
 
 @csrf_exempt
@@ -243,12 +336,12 @@ def save_answer(request):
     
     try:
         data = json.loads(request.body)
-        question_id = data.get('question_id')
-        option_id = data.get('option_id')
-        
-        question = get_object_or_404(Question, id=question_id, is_active=True)
-        option = get_object_or_404(QuestionOption, id=option_id, question=question)
-        
+        question_id = int(data.get('question_id'))
+        option_id = int(data.get('option_id'))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+    
+    try:
         # Get current exam attempt and section attempt
         exam_attempt = ExamAttempt.objects.filter(
             user=request.user,
@@ -258,22 +351,49 @@ def save_answer(request):
         if not exam_attempt:
             return JsonResponse({'error': 'No active exam'}, status=400)
         
+        # Pinned attempts validate against their published answer key, whatever has been edited since
+        answer_key = attempt_answer_key(exam_attempt)
+        if answer_key is not None:
+            entry = answer_key.get(question_id)
+            section_id = entry.section_id if entry and option_id in entry.option_ids else None
+        else:
+            section_id = QuestionOption.objects.filter(
+                id=option_id,
+                question_id=question_id,
+                question__is_active=True
+            ).values_list('question__section_id', flat=True).first()
+        
+        if section_id is None:
+            return JsonResponse({'error': 'Question or option not found'}, status=404)
+        
+        # Only the section being taken: started and not yet submitted
         section_attempt = SectionAttempt.objects.filter(
             exam_attempt=exam_attempt,
-            section=question.section
-        ).first()
+            section_id=section_id,
+            start_time__isnull=False,
+            is_completed=False
+        ).select_related('section').first()
         
         if not section_attempt:
             return JsonResponse({'error': 'No active section'}, status=400)
         
+        # Sampled papers only take answers to the questions drawn for this attempt
+        section = section_attempt.section
+        if questions_per_paper(exam_attempt, section) and question_id not in paper_question_ids(exam_attempt, section):
+            return JsonResponse({'error': 'Question is not on this paper'}, status=404)
+        
+        if journal_enabled():
+            # Acknowledge once journaled; the flusher writes it, scoring flushes first
+            journal_answer_changes(exam_attempt, [{'question_id': question_id, 'option_id': option_id}])
+            is_correct, points_earned = entry.score(option_id) if answer_key is not None else (None, None)
+            return JsonResponse({
+                'success': True,
+                'is_correct': is_correct,
+                'points_earned': points_earned,
+            })
+        
         # Save or update answer
-        answer, created = UserAnswer.objects.update_or_create(
-            section_attempt=section_attempt,
-            question=question,
-            defaults={
-                'selected_option': option,
-            }
-        )
+        answer = run_answer_write(store_answer, section_attempt, question_id, option_id, answer_key)
         
         return JsonResponse({
             'success': True,
@@ -285,6 +405,47 @@ def save_answer(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+def sync_answers(request, exam_id):
+    """API endpoint applying sequenced answer changes at most once"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        # Beacons on page unload post a form with the JSON in a "payload" field
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+        else:
+            data = json.loads(request.POST.get('payload', '{}'))
+        seq = int(data.get('seq', 0))
+        changes = data.get('changes', [])
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+    
+    exam_attempt = ExamAttempt.objects.filter(
+        user=request.user,
+        exam_id=exam_id,
+        status='in_progress'
+    ).first()
+    
+    if not exam_attempt:
+        return JsonResponse({'error': 'No active exam'}, status=400)
+    
+    try:
+        ack, applied, duplicate = run_answer_write(apply_answer_sync, exam_attempt, seq, changes)
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+    
+    record_activity(exam_attempt.id)
+    
+    return JsonResponse({
+        'success': True,
+        'ack': ack,
+        'applied': applied,
+        'duplicate': duplicate,
+    })
+
+
 @login_required
 def submit_section(request, exam_id):
     """Submit current section and move to next or finish exam"""
@@ -312,72 +473,106 @@ def submit_section(request, exam_id):
     
     if section_attempt:
         # Calculate section score
-        calculate_section_score(section_attempt)
+        if scoring_deferred():
+            # Journaled answers go in while the section still accepts them; the task scores what is stored
+            flush_answer_journal()
+        else:
+            calculate_section_score(section_attempt)
         
         # Mark section as completed
         section_attempt.is_completed = True
         section_attempt.end_time = timezone.now()
-        section_attempt.save()
+        section_attempt.save(update_fields=['is_completed', 'end_time'])
+        
+        if scoring_deferred():
+            defer_section_score(section_attempt)
     
     # Get next section
-    exam_sections = list(exam.sections.filter(is_active=True).order_by('name'))
-    completed_sections = SectionAttempt.objects.filter(
-        exam_attempt=exam_attempt,
-        is_completed=True
-    ).values_list('section_id', flat=True)
-    
-    next_section = None
-    for section in exam_sections:
-        if section.id not in completed_sections:
-            next_section = section
-            break
+    next_section = get_next_section(exam_attempt)
     
     if next_section:
         # Move to next section
         exam_attempt.current_section = next_section
-        exam_attempt.save()
+        exam_attempt.save(update_fields=['current_section'])
         
         messages.success(request, f'Section completed! Moving to {next_section.display_name}.')
         return redirect('exams:take_exam', exam_id=exam.id)
     else:
         # All sections completed - finish exam
-        finish_exam(exam_attempt)
+        if scoring_deferred():
+            defer_finish_exam(exam_attempt)
+        else:
+            finish_exam(exam_attempt)
+        release_admission(request, exam.id)
         messages.success(request, 'Exam completed successfully!')
         return redirect('exams:results', exam_id=exam.id)
 
 
+@traced
 def calculate_section_score(section_attempt):
     """Calculate score for a section attempt"""
+    # Journaled answers must be in the database before they are counted
+    flush_answer_journal()
+    
     answers = UserAnswer.objects.filter(section_attempt=section_attempt)
+    # Only answers to the attempt's paper count, whatever else was stored (packed answers hold nothing else)
+    exam_attempt = section_attempt.exam_attempt
+    if not is_packed(section_attempt) and questions_per_paper(exam_attempt, section_attempt.section):
+        answers = answers.filter(question_id__in=paper_question_ids(exam_attempt, section_attempt.section))
     
     total_score = 0
     questions_answered = 0
     questions_correct = 0
     
-    for answer in answers:
-        if answer.selected_option:
+    answer_key = attempt_answer_key(section_attempt.exam_attempt)
+    if is_packed(section_attempt):
+        # Packed answers are scored position by position against the paper's answer key
+        section_attempt.refresh_from_db(fields=['packed_answers'])
+        layout = paper_layout(section_attempt.exam_attempt, section_attempt.section)
+        total_score, questions_answered, questions_correct = layout.score(section_attempt.packed_answers)
+    elif answer_key is not None:
+        # Pinned attempts are scored from the published answer key, without joining questions or options
+        selections = answers.filter(selected_option__isnull=False).values_list('question_id', 'selected_option_id')
+        for question_id, option_id in selections:
+            entry = answer_key.get(question_id)
+            if not entry:
+                continue
+            questions_answered += 1
+            is_correct, points = entry.score(option_id)
+            if is_correct:
+                questions_correct += 1
+            total_score += points
+    else:
+        negative_marking = section_attempt.section.has_negative_marking
+        for answer in answers.filter(selected_option__isnull=False).select_related('question'):
             questions_answered += 1
             if answer.is_correct:
                 questions_correct += 1
                 total_score += answer.question.points
-            elif section_attempt.section.has_negative_marking:
+            elif negative_marking:
                 total_score -= answer.question.negative_points
     
     section_attempt.score = max(0, total_score)  # Don't allow negative scores
     section_attempt.questions_answered = questions_answered
     section_attempt.questions_correct = questions_correct
-    section_attempt.save()
+    # Only the score; answers may have been written meanwhile
+    section_attempt.save(update_fields=['score', 'questions_answered', 'questions_correct'])
     
     return section_attempt
 
 
+@traced
 def finish_exam(exam_attempt):
     """Finish exam and calculate total score"""
-    exam_attempt.status = 'completed'
-    exam_attempt.end_time = timezone.now()
+    flush_answer_journal()
+    
+    # An attempt closed by submit_exam, or before its scoring was deferred, keeps its status and end time
+    if exam_attempt.status == 'in_progress':
+        exam_attempt.status = 'completed'
+    exam_attempt.end_time = exam_attempt.end_time or timezone.now()
     
     # Calculate total score
-    section_attempts = SectionAttempt.objects.filter(exam_attempt=exam_attempt)
+    section_attempts = SectionAttempt.objects.filter(exam_attempt=exam_attempt).select_related('section')
     total_score = sum(sa.score or 0 for sa in section_attempts)
     max_possible_score = sum(sa.max_possible_score or 0 for sa in section_attempts)
     
@@ -390,7 +585,7 @@ def finish_exam(exam_attempt):
     # Check if passed (all sections must meet minimum pass score)
     passed = True
     for sa in section_attempts:
-        if sa.score < sa.section.min_pass_score:
+        if (sa.score or 0) < sa.section.min_pass_score:
             passed = False
             break
     
@@ -400,6 +595,39 @@ def finish_exam(exam_attempt):
     return exam_attempt
 
 
+def scoring_deferred():
+    return getattr(settings, 'EXAM_DEFER_SCORING', False)
+
+
+def score_section_task(section_attempt_id):
+    """Background task: score a submitted section"""
+    calculate_section_score(SectionAttempt.objects.select_related('section', 'exam_attempt').get(id=section_attempt_id))
+
+
+def finish_exam_task(exam_attempt_id):
+    """Background task: score sections whose own task has not run yet, then total the attempt"""
+    exam_attempt = ExamAttempt.objects.get(id=exam_attempt_id)
+    unscored = SectionAttempt.objects.filter(exam_attempt=exam_attempt, is_completed=True, score__isnull=True)
+    for section_attempt in unscored.select_related('section'):
+        calculate_section_score(section_attempt)
+    finish_exam(exam_attempt)
+
+
+def defer_section_score(section_attempt):
+    """Queue scoring of a section that has just been marked completed"""
+    defer(score_section_task, key=f'score-section:{section_attempt.id}', section_attempt_id=section_attempt.id)
+
+
+def defer_finish_exam(exam_attempt):
+    """Close the attempt now and queue its scoring; the results page waits for the task if needed"""
+    flush_answer_journal()
+    if exam_attempt.status == 'in_progress':
+        exam_attempt.status = 'completed'
+    exam_attempt.end_time = timezone.now()
+    exam_attempt.save(update_fields=['status', 'end_time'])
+    defer(finish_exam_task, key=f'finish-exam:{exam_attempt.id}', exam_attempt_id=exam_attempt.id)
+
+
 @login_required
 def submit_exam(request, exam_id):
     """Submit entire exam (emergency submit or time up)"""
@@ -419,14 +647,23 @@ def submit_exam(request, exam_id):
         ).first()
         
         if section_attempt and not section_attempt.is_completed:
-            calculate_section_score(section_attempt)
+            if scoring_deferred():
+                flush_answer_journal()
+            else:
+                calculate_section_score(section_attempt)
             section_attempt.is_completed = True
             section_attempt.end_time = timezone.now()
-            section_attempt.save()
+            section_attempt.save(update_fields=['is_completed', 'end_time'])
+            if scoring_deferred():
+                defer_section_score(section_attempt)
     
     # Finish exam
     exam_attempt.status = 'auto_submitted'
-    finish_exam(exam_attempt)
+    if scoring_deferred():
+        defer_finish_exam(exam_attempt)
+    else:
+        finish_exam(exam_attempt)
+    release_admission(request, exam.id)
     
     messages.warning(request, 'Exam has been automatically submitted.')
     return redirect('exams:results', exam_id=exam.id)
@@ -444,19 +681,32 @@ def exam_results(request, exam_id):
         status__in=['completed', 'auto_submitted']
     ).order_by('-end_time').first()
     
+    section_attempts = None
+    if not exam_attempt:
+        # Old attempts may have been moved to cold storage; read the latest back from its archive file
+        archived = ArchivedAttempt.objects.filter(user=request.user, exam=exam).first()
+        if archived:
+            exam_attempt, section_attempts = rehydrate_attempt(archived)
+    
     if not exam_attempt:
         messages.error(request, 'No completed exam found.')
         return redirect('exams:exam_list')
     
+    if scoring_deferred() and exam_attempt.total_score is None:
+        # Scoring was deferred; run it here if no worker has got to it yet
+        complete_task(f'finish-exam:{exam_attempt.id}')
+        exam_attempt.refresh_from_db()
+    
     # Get section attempts
-    section_attempts = SectionAttempt.objects.filter(
-        exam_attempt=exam_attempt
-    ).select_related('section').order_by('section__name')
+    positions = get_section_plan(exam.id).positions
+    if section_attempts is None:
+        section_attempts = SectionAttempt.objects.filter(exam_attempt=exam_attempt).select_related('section')
+    section_attempts = sorted(section_attempts, key=lambda sa: positions.get(sa.section_id, len(positions)))
     
     # Add percentage to each section attempt
     for sa in section_attempts:
         if sa.max_possible_score and sa.max_possible_score > 0:
-            sa.percentage = (sa.score / sa.max_possible_score) * 100
+            sa.percentage = ((sa.score or 0) / sa.max_possible_score) * 100
         else:
             sa.percentage = 0
     
@@ -567,48 +817,22 @@ def auto_save_progress(request):
         if not exam_attempt:
             return JsonResponse({'error': 'No active exam'}, status=400)
         
-        # Update last activity timestamp
-        exam_attempt.last_activity = timezone.now()
-        exam_attempt.save()
-        
-        # Save current question index and section progress
+        # Update last activity and question index (buffered, written in bulk)
+        section_attempt_id = None
+        question_index = None
         if 'current_question_index' in data:
-            section_attempt = SectionAttempt.objects.filter(
+            question_index = max(0, int(data['current_question_index']))
+            section_attempt_id = SectionAttempt.objects.filter(
                 exam_attempt=exam_attempt,
-                section=exam_attempt.current_section,
+                section_id=exam_attempt.current_section_id,
                 is_completed=False
-            ).first()
-            
-            if section_attempt:
-                section_attempt.current_question_index = data['current_question_index']
-                section_attempt.save()
+            ).values_list('id', flat=True).first()
+        record_activity(exam_attempt.id, section_attempt_id, question_index)
         
         # Save any pending answers
         saved_answers = 0
         if 'answers' in data:
-            for answer_data in data['answers']:
-                question_id = answer_data.get('question_id')
-                option_id = answer_data.get('option_id')
-                
-                if question_id and option_id:
-                    try:
-                        question = Question.objects.get(id=question_id, is_active=True)
-                        option = QuestionOption.objects.get(id=option_id, question=question)
-                        
-                        section_attempt = SectionAttempt.objects.filter(
-                            exam_attempt=exam_attempt,
-                            section=question.section
-                        ).first()
-                        
-                        if section_attempt:
-                            UserAnswer.objects.update_or_create(
-                                section_attempt=section_attempt,
-                                question=question,
-                                defaults={'selected_option': option}
-                            )
-                            saved_answers += 1
-                    except (Question.DoesNotExist, QuestionOption.DoesNotExist):
-                        continue
+            saved_answers = run_answer_write(record_answer_changes, exam_attempt, data['answers'])
         
         return JsonResponse({
             'success': True,
@@ -643,6 +867,7 @@ def recover_session(request, exam_id):
         if time_since_activity.total_seconds() > 3600:  # 1 hour timeout
             exam_attempt.status = 'abandoned'
             exam_attempt.save()
+            release_admission(request, exam.id)
             messages.warning(request, 'Session expired. Please start a new exam.')
             return redirect('exams:exam_list')
     
@@ -664,19 +889,23 @@ def recover_session(request, exam_id):
                 calculate_section_score(current_section_attempt)
                 current_section_attempt.is_completed = True
                 current_section_attempt.end_time = timezone.now()
-                current_section_attempt.save()
+                current_section_attempt.save(update_fields=['is_completed', 'end_time'])
                 
                 # Move to next section or finish exam
                 next_section = get_next_section(exam_attempt)
                 if next_section:
                     exam_attempt.current_section = next_section
-                    exam_attempt.save()
+                    exam_attempt.save(update_fields=['current_section'])
                     messages.warning(request, f'Previous section time expired. Starting {next_section.display_name}.')
                 else:
                     finish_exam(exam_attempt)
+                    release_admission(request, exam.id)
                     messages.info(request, 'Exam completed. All sections finished.')
                     return redirect('exams:results', exam_id=exam.id)
     
+    # Written directly so the recovered session is not reported as interrupted again
+    ExamAttempt.objects.filter(pk=exam_attempt.pk).update(last_activity=timezone.now())
+    
     messages.success(request, 'Session recovered successfully. Continuing from where you left off.')
     return redirect('exams:take_exam', exam_id=exam.id)
 
@@ -690,39 +919,57 @@ def get_session_status(request, exam_id):
         user=request.user,
         exam=exam,
         status='in_progress'
-    ).first()
+    ).select_related('current_section').first()
     
     if not exam_attempt:
         return JsonResponse({'session_exists': False})
     
-    # Get progress information
-    total_sections = exam.sections.filter(is_active=True).count()
-    completed_sections = SectionAttempt.objects.filter(
-        exam_attempt=exam_attempt,
-        is_completed=True
-    ).count()
-    
     current_section_attempt = None
-    current_progress = 0
-    
     if exam_attempt.current_section:
         current_section_attempt = SectionAttempt.objects.filter(
             exam_attempt=exam_attempt,
             section=exam_attempt.current_section,
             is_completed=False
         ).first()
+    
+    # A session counts as interrupted once no activity has been seen for a while
+    interrupted = bool(
+        exam_attempt.last_activity and
+        (timezone.now() - exam_attempt.last_activity).total_seconds() >
+        getattr(settings, 'EXAM_SESSION_INTERRUPTED_AFTER', 120)
+    )
+    
+    # Status only moves when the section changes or an answer is saved
+    etag = make_etag(
+        'status',
+        exam_attempt.id,
+        exam_attempt.last_activity,
+        interrupted,
+        exam_attempt.current_section_id,
+        exam_attempt.current_section.content_version if exam_attempt.current_section else 0,
+        current_section_attempt.id if current_section_attempt else 0,
+        current_section_attempt.answer_revision if current_section_attempt else 0,
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    # Get progress information
+    total_sections = len(get_section_plan(exam.id))
+    completed_sections = SectionAttempt.objects.filter(
+        exam_attempt=exam_attempt,
+        is_completed=True
+    ).count()
+    
+    current_progress = 0
+    if current_section_attempt:
+        # Calculate progress in current section
+        total_questions = section_question_count(exam_attempt.current_section)
+        answered_questions = answered_count(current_section_attempt)
         
-        if current_section_attempt:
-            # Calculate progress in current section
-            total_questions = exam_attempt.current_section.questions.filter(is_active=True).count()
-            answered_questions = UserAnswer.objects.filter(
-                section_attempt=current_section_attempt
-            ).count()
-            
-            if total_questions > 0:
-                current_progress = (answered_questions / total_questions) * 100
+        if total_questions > 0:
+            current_progress = (answered_questions / total_questions) * 100
     
-    return JsonResponse({
+    response = JsonResponse({
         'session_exists': True,
         'exam_name': exam.name,
         'current_section': exam_attempt.current_section.display_name if exam_attempt.current_section else None,
@@ -730,18 +977,126 @@ def get_session_status(request, exam_id):
         'completed_sections': completed_sections,
         'current_section_progress': current_progress,
         'last_activity': exam_attempt.last_activity.isoformat() if exam_attempt.last_activity else None,
+        'interrupted': interrupted,
         'can_resume': True
     })
+    return set_etag(response, etag)
 
+@traced
 def get_next_section(exam_attempt):
-    """Helper function to get the next section"""
-    exam_sections = list(exam_attempt.exam.sections.filter(is_active=True).order_by('name'))
-    completed_sections = SectionAttempt.objects.filter(
+    """Helper function to get the section that follows the current one in the exam's plan"""
+    next_section_id = get_section_plan(exam_attempt.exam_id).next_after(exam_attempt.current_section_id)
+    if next_section_id is None:
+        return None
+    return ExamSection.objects.filter(pk=next_section_id).first()
+
+
+def resolve_attempt_context(user, exam_id):
+    """Resolve the in-progress attempt and its current section attempt in two queries"""
+    exam_attempt = ExamAttempt.objects.filter(
+        user=user,
+        exam_id=exam_id,
+        exam__is_active=True,
+        status='in_progress'
+    ).select_related('exam', 'current_section').first()
+    
+    if not exam_attempt or not exam_attempt.current_section:
+        return exam_attempt, None
+    
+    section_attempt = SectionAttempt.objects.filter(
         exam_attempt=exam_attempt,
-        is_completed=True
-    ).values_list('section_id', flat=True)
+        section=exam_attempt.current_section
+    ).first()
+    return exam_attempt, section_attempt
+
+
+def section_question_count(section):
+    """Number of questions in a section's paper, cached per content version"""
+    return paper_question_counts([section])[section.id]
+
+
+def paper_question_counts(sections):
+    """Paper sizes of several sections with one cache round trip and at most one query"""
+    keys = {section.id: f'exams:question-count:{section.id}:{section.content_version}' for section in sections}
+    counts = cache.get_many(keys.values())
+    
+    missing = [section_id for section_id, key in keys.items() if key not in counts]
+    if missing:
+        active = dict(
+            Question.objects.filter(section_id__in=missing, is_active=True)
+            .values('section_id').annotate(count=Count('id')).values_list('section_id', 'count')
+        )
+        fresh = {keys[section_id]: active.get(section_id, 0) for section_id in missing}
+        cache.set_many(fresh, timeout=None)
+        counts.update(fresh)
+    
+    sizes = {}
+    for section in sections:
+        count = counts[keys[section.id]]
+        sizes[section.id] = min(count, section.questions_per_paper) if section.questions_per_paper else count
+    return sizes
+
+
+@login_required
+def exam_heartbeat(request, exam_id):
+    """Single polling endpoint: syncs answers and progress, returns timer and transition state"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+    
+    exam_attempt, section_attempt = resolve_attempt_context(request.user, exam_id)
+    if not exam_attempt:
+        return JsonResponse({'active': False})
+    
+    current_section = exam_attempt.current_section
+    
+    # Piggybacked answer changes follow the same sequencing as sync_answers
+    ack = exam_attempt.answer_sync_seq
+    try:
+        if data.get('changes'):
+            ack, _, _ = run_answer_write(apply_answer_sync, exam_attempt, int(data.get('seq', 0)), data['changes'])
+        question_index = data.get('current_question_index')
+        question_index = max(0, int(question_index)) if question_index is not None else None
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+    
+    record_activity(exam_attempt.id, section_attempt.id if section_attempt else None, question_index)
+    # Heartbeats keep the candidate's admission slot; it lapses once they stop
+    renew_admission(request, exam_id)
+    
+    # Calculate time remaining
+    time_remaining = current_section.duration_minutes * 60 if current_section else 0
+    if section_attempt and section_attempt.start_time:
+        elapsed = timezone.now() - section_attempt.start_time
+        remaining = timedelta(minutes=current_section.duration_minutes) - elapsed
+        time_remaining = max(0, int(remaining.total_seconds()))
+    
+    answered = 0
+    total_questions = 0
+    if section_attempt:
+        answered = answered_count(section_attempt)
+        total_questions = section_question_count(current_section)
+    
+    # Poll less often while there is time left (and under load), landing on the deadline near the end
+    interval = getattr(settings, 'EXAM_HEARTBEAT_INTERVAL', 30)
+    if load_shedding_active():
+        interval *= 2
+    next_poll = max(1, min(interval, time_remaining)) if time_remaining else interval
     
-    for section in exam_sections:
-        if section.id not in completed_sections:
-            return section
-    return None
+    return JsonResponse({
+        'active': True,
+        'ack': ack,
+        'section_id': current_section.id if current_section else None,
+        'section_name': current_section.display_name if current_section else None,
+        'time_remaining': time_remaining,
+        'answered': answered,
+        'total_questions': total_questions,
+        'progress': (answered / total_questions) * 100 if total_questions else 0,
+        'auto_submit': bool(section_attempt) and time_remaining <= 0,
+        'section_changed': 'section_id' in data and str(data['section_id']) != str(current_section.id if current_section else None),
+        'next_poll': next_poll,
+    })
@@ -0,0 +1,125 @@
+"""
+Group commit of answer writes.
+
+SQLite serialises writers, so many small answer transactions from
+concurrent requests mostly wait on each other for the lock. With
+``EXAM_ANSWER_WRITE_QUEUE`` on, request threads hand their answer writes to
+one writer thread per process instead. The writer runs everything queued
+while its previous transaction was committing as one short transaction,
+each write in its own savepoint so one failure does not undo the others,
+and then wakes the requests. A request still only answers after its write
+has committed.
+
+Writes are only batched between threads of one process, so this pays off
+with threaded workers (``GUNICORN_THREADS``). With the queue off,
+``run_answer_write`` calls the function directly.
+"""
+import contextvars
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import UserAnswer
+
+
+class PendingWrite:
+    __slots__ = ('func', 'args', 'kwargs', 'context', 'done', 'result', 'error')
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        # Run in the request's context so tracing spans and read-your-writes routing see the write
+        self.context = contextvars.copy_context()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class WriteQueue:
+    """One writer thread applying queued writes in batched transactions"""
+
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self.items = queue.SimpleQueue()
+        self.batches = 0
+        self.writes = 0
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self.run, name='answer-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        pending = PendingWrite(func, args, kwargs)
+        self.items.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def run(self):
+        while True:
+            batch = [self.items.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.items.get_nowait())
+                except queue.Empty:
+                    break
+            self.apply(batch)
+
+    def lock_for_writing(self):
+        """Take SQLite's write lock before the batch reads anything"""
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            return
+        # A deferred transaction that has read cannot wait for the lock later; upgrading fails at
+        # once with "database is locked" when another process wrote meanwhile. A write that changes
+        # nothing takes the lock up front, waiting up to the busy timeout
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {UserAnswer._meta.db_table} SET id = id WHERE 0')
+
+    def apply(self, batch):
+        try:
+            with transaction.atomic():
+                self.lock_for_writing()
+                for pending in batch:
+                    try:
+                        with transaction.atomic():
+                            pending.result = pending.context.run(pending.func, *pending.args, **pending.kwargs)
+                    except Exception as exc:
+                        pending.error = exc
+        except Exception as exc:
+            # The commit itself failed; none of the batch is stored
+            for pending in batch:
+                pending.result = None
+                pending.error = pending.error or exc
+        finally:
+            self.batches += 1
+            self.writes += len(batch)
+            for pending in batch:
+                pending.done.set()
+            connections['default'].close_if_unusable_or_obsolete()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def write_queue():
+    """This process's queue, started on first use (and again in a forked child)"""
+    global _queue
+    if _queue is None or _queue.pid != os.getpid():
+        with _queue_lock:
+            if _queue is None or _queue.pid != os.getpid():
+                _queue = WriteQueue(getattr(settings, 'EXAM_WRITE_QUEUE_MAX_BATCH', 200))
+    return _queue
+
+
+def run_answer_write(func, *args, **kwargs):
+    """Run an answer write through the group-commit queue when it is enabled"""
+    # Inside a transaction the write has to stay on this connection to be part of it
+    if not getattr(settings, 'EXAM_ANSWER_WRITE_QUEUE', False) or connections['default'].in_atomic_block:
+        return func(*args, **kwargs)
+    return write_queue().submit(func, *args, **kwargs)
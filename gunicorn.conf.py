@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration for the exam site.
+
+Run: gunicorn -c gunicorn.conf.py
+
+The application is imported once in the master (preload_app) and the
+question pools are loaded there before any worker forks, so every worker
+shares the same copy of them instead of building its own.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'uas_exam.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# More than one thread switches to the gthread worker; needed for EXAM_ANSWER_WRITE_QUEUE to batch
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+preload_app = True
+
+
+def when_ready(server):
+    from django.db import connections
+    from exams.answers import flush_answer_journal
+    from exams.papers import warm_up
+
+    # Apply journaled answers a previous run left unflushed before serving anyone
+    recovered = flush_answer_journal()
+    if recovered:
+        server.log.info("Recovered %d journaled answer changes", recovered)
+
+    sections, banks = warm_up()
+    server.log.info("Warmed %d section pools and %d published banks", sections, banks)
+
+    # Workers must open their own database connections
+    connections.close_all()
+
+    # Keep the warmed objects out of the cyclic GC so collections in workers do not write to their pages
+    gc.freeze()
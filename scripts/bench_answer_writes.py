@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Benchmark: answer writes per second on SQLite with 1, 4 and 16 worker
+processes, comparing the old connection defaults, the WAL profile from
+settings and the WAL profile with the group-commit answer write queue.
+
+Every worker process runs --threads request threads, each saving answers
+for its own candidate as fast as it can for --seconds. Each run uses a
+fresh database file in a temporary directory.
+
+Run: python scripts/bench_answer_writes.py [--seconds 5] [--threads 4]
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from bench_common import setup_file_database, create_benchmark_exam, create_candidate
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+
+PROFILES = {
+    # Django's SQLite defaults before the WAL profile
+    'rollback journal': {'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'}, 'timeout': 5, 'queue': False},
+    'wal': {'pragmas': None, 'timeout': None, 'queue': False},
+    'wal + write queue': {'pragmas': None, 'timeout': None, 'queue': True},
+}
+WORKER_COUNTS = [1, 4, 16]
+
+
+def configure(profile):
+    if profile['pragmas'] is not None:
+        settings.EXAM_SQLITE_PRAGMAS = profile['pragmas']
+    if profile['timeout'] is not None:
+        connection.settings_dict['OPTIONS'] = {'timeout': profile['timeout']}
+    settings.EXAM_ANSWER_WRITE_QUEUE = profile['queue']
+
+
+def create_candidates(exam, count):
+    """Started attempts with their first section attempt, one per writing thread"""
+    from exams.models import ExamAttempt, SectionAttempt
+
+    section = exam.section_plan.select_related('section').first().section
+    candidates = []
+    for number in range(count):
+        attempt = ExamAttempt.objects.create(
+            user=create_candidate(f'writer{number}'), exam=exam, status='in_progress', current_section=section
+        )
+        candidates.append(SectionAttempt.objects.create(exam_attempt=attempt, section=section).id)
+    return section, candidates
+
+
+def write_answers(section_attempt_id, seconds, seed, totals, lock):
+    from exams.answers import store_answer
+    from exams.models import Question, SectionAttempt
+    from exams.writequeue import run_answer_write
+
+    rng = random.Random(seed)
+    section_attempt = SectionAttempt.objects.get(id=section_attempt_id)
+    questions = list(Question.objects.filter(section_id=section_attempt.section_id).prefetch_related('options'))
+    choices = [(question, list(question.options.all())) for question in questions]
+
+    writes = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        question, options = rng.choice(choices)
+        try:
+            run_answer_write(store_answer, section_attempt, question.id, rng.choice(options).id)
+            writes += 1
+        except OperationalError:
+            errors += 1
+    connection.close()
+    with lock:
+        totals[0] += writes
+        totals[1] += errors
+
+
+def run_worker(candidates, seconds, write_fd):
+    totals = [0, 0]
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=write_answers, args=(candidate, seconds, candidate, totals, lock))
+        for candidate in candidates
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    os.write(write_fd, f'{totals[0]} {totals[1]}'.encode())
+
+
+def run_profile(name, seconds, threads):
+    configure(PROFILES[name])
+    for workers in WORKER_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            setup_file_database(Path(directory) / 'bench.sqlite3')
+            exam = create_benchmark_exam()
+            _, candidates = create_candidates(exam, workers * threads)
+            connections.close_all()
+
+            pipes = []
+            for worker in range(workers):
+                read_fd, write_fd = os.pipe()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(read_fd)
+                    run_worker(candidates[worker * threads:(worker + 1) * threads], seconds, write_fd)
+                    os._exit(0)
+                os.close(write_fd)
+                pipes.append((pid, read_fd))
+
+            writes = errors = 0
+            for pid, read_fd in pipes:
+                with os.fdopen(read_fd) as reader:
+                    worker_writes, worker_errors = map(int, reader.read().split())
+                writes += worker_writes
+                errors += worker_errors
+                os.waitpid(pid, 0)
+        print(f'{name:<20}{workers:>8}{workers * threads:>9}{writes / seconds:>14.0f}{errors:>14}', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=4, help="Request threads per worker process")
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args.profile, args.seconds, args.threads)
+        return
+
+    print(f"{'profile':<20}{'workers':>8}{'threads':>9}{'writes/s':>14}{'lock errors':>14}")
+    for name in PROFILES:
+        subprocess.run([sys.executable, __file__, '--profile', name] + sys.argv[1:], check=True)
+
+
+if __name__ == '__main__':
+    main()
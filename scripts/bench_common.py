@@ -0,0 +1,78 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Benchmarks run against a throwaway test database so they never touch
+db.sqlite3. Import this module before any model imports.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Setup Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uas_exam.settings')
+
+import django
+
+django.setup()
+
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+SECTION_NAMES = ['reasoning', 'english', 'mathematical', 'advanced_math', 'ethical', 'emotional']
+
+
+def setup_benchmark_database():
+    """Create and migrate a throwaway test database"""
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def create_benchmark_exam(questions_per_section=20, section_names=SECTION_NAMES):
+    """Create a mock exam with the given number of 4-option questions per section"""
+    from exams.models import ExamSection, Question, QuestionOption, MockExam, MockExamSection
+
+    sections = []
+    for name in section_names:
+        section = ExamSection.objects.create(
+            name=name,
+            display_name=name.replace('_', ' ').title(),
+            duration_minutes=25,
+        )
+        questions = Question.objects.bulk_create([
+            Question(section=section, question_text=f'{name} question {number}',
+                     difficulty=('easy', 'medium', 'hard')[number % 3])
+            for number in range(questions_per_section)
+        ])
+        QuestionOption.objects.bulk_create([
+            QuestionOption(question=question, option_letter=letter, option_text=f'Option {letter}',
+                           is_correct=(index == question.id % 4))
+            for question in questions
+            for index, letter in enumerate('ABCD')
+        ])
+        sections.append(section)
+
+    exam = MockExam.objects.create(name='Benchmark Mock Exam')
+    MockExamSection.objects.bulk_create([
+        MockExamSection(exam=exam, section=section, position=position)
+        for position, section in enumerate(sections)
+    ])
+    return exam
+
+
+def create_candidate(username='candidate', password='benchmark-pass-1'):
+    """Create a candidate user"""
+    from django.contrib.auth.models import User
+
+    return User.objects.create_user(username=username, email=f'{username}@example.com', password=password)
+
+
+def setup_file_database(path):
+    """Point the default database at a fresh SQLite file and migrate it, for benchmarks that fork"""
+    from django.core.management import call_command
+
+    connection.close()
+    connection.settings_dict['NAME'] = str(path)
+    call_command('migrate', verbosity=0)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Benchmark: polling requests and queries per candidate-minute, comparing the
+separate timer/auto-save round-trips with the unified heartbeat endpoint.
+
+Run: python scripts/bench_heartbeat.py [--minutes 10]
+"""
+
+import argparse
+import json
+import time
+
+from bench_common import setup_benchmark_database, create_benchmark_exam, create_candidate
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+AUTO_SAVE_PERIOD = 15  # seconds, the client's former auto-save interval
+TIME_SYNC_PERIOD = 60  # seconds, the client's former server time sync
+
+
+def run_candidate_minutes(client, requests_per_minute, minutes):
+    """Replay a per-minute request schedule and count requests, queries and time"""
+    count = 0
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(minutes):
+            for method, url, body in requests_per_minute:
+                if method == 'GET':
+                    client.get(url)
+                else:
+                    client.post(url, json.dumps(body), content_type='application/json')
+                count += 1
+    elapsed = time.perf_counter() - started
+    return count / minutes, len(queries.captured_queries) / minutes, elapsed * 1000 / minutes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--minutes', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_benchmark_database()
+    exam = create_benchmark_exam()
+    client = Client()
+    client.force_login(create_candidate())
+    client.get(f'/exams/take/{exam.id}/')
+    section_id = exam.examattempt_set.get().current_section_id
+
+    separate = (
+        [('POST', '/exams/api/auto-save/', {'current_question_index': 3})] * (60 // AUTO_SAVE_PERIOD) +
+        [('GET', f'/exams/api/time-remaining/{exam.id}/', None)] * (60 // TIME_SYNC_PERIOD)
+    )
+    heartbeat = [
+        ('POST', f'/exams/api/heartbeat/{exam.id}/', {'current_question_index': 3, 'section_id': section_id})
+    ] * (60 // settings.EXAM_HEARTBEAT_INTERVAL)
+
+    print(f"{'client':<22}{'requests/min':>14}{'queries/min':>14}{'server ms/min':>16}")
+    # The schedules are replayed back to back, which rate limits would answer with 429s
+    with override_settings(EXAM_API_RATE_LIMITS={}):
+        for label, schedule in (('separate endpoints', separate), ('unified heartbeat', heartbeat)):
+            requests, queries, millis = run_candidate_minutes(client, schedule, args.minutes)
+            print(f'{label:<22}{requests:>14.1f}{queries:>14.1f}{millis:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Benchmark: logins per second on one core, password login (PBKDF2) versus
+exam-day access codes (HMAC check plus one UPDATE).
+
+Run: python scripts/bench_login.py [--logins 20]
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from bench_common import setup_benchmark_database, create_benchmark_exam, create_candidate
+
+from django.test import Client
+from django.utils import timezone
+
+from exams.access_codes import format_access_code
+from exams.models import ExamAccessCode
+
+
+def measure(logins, post):
+    started = time.perf_counter()
+    for index in range(logins):
+        response = post(Client(), index)
+        assert response.status_code == 302, response.status_code
+    return logins / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logins', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_benchmark_database()
+    exam = create_benchmark_exam(questions_per_section=1)
+    user = create_candidate(password='benchmark-pass-1')
+    now = timezone.now()
+    codes = [
+        format_access_code(code) for code in ExamAccessCode.objects.bulk_create([
+            ExamAccessCode(user=user, exam=exam, valid_from=now, valid_until=now + timedelta(hours=1))
+            for _ in range(args.logins)
+        ])
+    ]
+
+    password_rate = measure(args.logins, lambda client, index: client.post(
+        '/accounts/login/', {'username': user.username, 'password': 'benchmark-pass-1'}))
+    code_rate = measure(args.logins, lambda client, index: client.post(
+        '/accounts/exam-login/', {'access_code': codes[index]}))
+
+    print(f"{'login mode':<16}{'logins/s/core':>16}")
+    print(f"{'password':<16}{password_rate:>16.1f}")
+    print(f"{'access code':<16}{code_rate:>16.1f}")
+    print(f"speed-up: {code_rate / password_rate:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Benchmark: storage size and scoring speed of answers kept as UserAnswer
+rows versus packed into SectionAttempt.packed_answers.
+
+Creates --candidates completed attempts pinned to a published bank, each
+answering most of a --questions-question paper, measures the database file
+tables holding the answers (UserAnswer and SectionAttempt, with their
+indexes) after VACUUM, times scoring every section, then converts them with
+manage.py pack_answers and measures both again.
+
+Run: python scripts/bench_packed_answers.py [--candidates 500] [--questions 100]
+"""
+
+import argparse
+import io
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from bench_common import setup_file_database, create_benchmark_exam
+
+from django.core.management import call_command
+from django.db import connection
+
+
+def create_answered_attempts(exam, candidates, answer_rate, seed):
+    """Completed pinned attempts with UserAnswer rows for about ``answer_rate`` of each paper"""
+    from django.contrib.auth.models import User
+    from exams.bank import current_bank_version_id
+    from exams.models import ExamAttempt, SectionAttempt, UserAnswer
+    from exams.papers import build_attempt_paper
+
+    rng = random.Random(seed)
+    version_id = current_bank_version_id(exam)
+    sections = [placement.section for placement in exam.section_plan.select_related('section')]
+    # Candidates never log in here; skip hashing a password for each
+    users = User.objects.bulk_create([User(username=f'packer{number}') for number in range(candidates)])
+    for user in users:
+        attempt = ExamAttempt.objects.create(user=user, exam=exam, status='completed', bank_version_id=version_id)
+        answers = []
+        for section in sections:
+            section_attempt = SectionAttempt.objects.create(
+                exam_attempt=attempt, section=section, max_possible_score=section.max_score, is_completed=True
+            )
+            for question in build_attempt_paper(attempt, section):
+                if rng.random() < answer_rate:
+                    answers.append(UserAnswer(
+                        section_attempt=section_attempt,
+                        question_id=question['id'],
+                        selected_option_id=rng.choice(question['options'])['id'],
+                    ))
+        UserAnswer.objects.bulk_create(answers)
+
+
+def answer_storage_size():
+    """Bytes of the pages holding UserAnswer and SectionAttempt rows and their indexes"""
+    from exams.models import SectionAttempt, UserAnswer
+
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM')
+        cursor.execute(
+            'SELECT SUM(dbstat.pgsize) FROM dbstat JOIN sqlite_master ON sqlite_master.name = dbstat.name '
+            'WHERE sqlite_master.tbl_name IN (%s, %s)',
+            [UserAnswer._meta.db_table, SectionAttempt._meta.db_table],
+        )
+        return cursor.fetchone()[0]
+
+
+def time_scoring():
+    """Milliseconds to score every section attempt, and the scores"""
+    from exams.models import SectionAttempt
+    from exams.views import calculate_section_score
+
+    section_attempts = list(SectionAttempt.objects.select_related('exam_attempt', 'section').order_by('id'))
+    started = time.perf_counter()
+    scores = [calculate_section_score(section_attempt).score for section_attempt in section_attempts]
+    return (time.perf_counter() - started) * 1000, len(section_attempts), scores
+
+
+def time_layout_scoring():
+    """Milliseconds to score every packed section in memory, without the database round-trips"""
+    from exams.models import SectionAttempt
+    from exams.packed import paper_layout
+
+    section_attempts = list(SectionAttempt.objects.select_related('exam_attempt', 'section'))
+    layouts = [paper_layout(sa.exam_attempt, sa.section) for sa in section_attempts]
+    started = time.perf_counter()
+    for section_attempt, layout in zip(section_attempts, layouts):
+        layout.score(section_attempt.packed_answers)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--candidates', type=int, default=500)
+    parser.add_argument('--questions', type=int, default=100, help="Questions per section")
+    parser.add_argument('--sections', type=int, default=2)
+    parser.add_argument('--answer-rate', type=float, default=0.9, help="Share of each paper answered")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from exams.bank import publish_question_bank
+    from exams.models import UserAnswer
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_file_database(Path(directory) / 'bench.sqlite3')
+        exam = create_benchmark_exam(args.questions, section_names=['reasoning', 'english', 'mathematical'][:args.sections])
+        publish_question_bank(exam)
+        create_answered_attempts(exam, args.candidates, args.answer_rate, args.seed)
+
+        answers = UserAnswer.objects.count()
+        rows_size = answer_storage_size()
+        rows_ms, sections, rows_scores = time_scoring()
+
+        call_command('pack_answers', stdout=io.StringIO())
+        packed_size = answer_storage_size()
+        packed_ms, _, packed_scores = time_scoring()
+        layout_ms = time_layout_scoring()
+
+    print(f"{args.candidates} candidates, {sections} section attempts, {answers} answers")
+    print(f"{'storage':<10}{'bytes':>14}{'bytes/answer':>14}{'score all ms':>14}{'ms/section':>12}")
+    print(f"{'rows':<10}{rows_size:>14}{rows_size / answers:>14.1f}{rows_ms:>14.0f}{rows_ms / sections:>12.2f}")
+    print(f"{'packed':<10}{packed_size:>14}{packed_size / answers:>14.1f}{packed_ms:>14.0f}{packed_ms / sections:>12.2f}")
+    print(f"In-memory scoring of the packed bytes alone: {layout_ms:.1f} ms ({layout_ms * 1000 / sections:.1f} us/section)")
+    print(f"Scores identical: {rows_scores == packed_scores}")
+
+
+if __name__ == '__main__':
+    main()
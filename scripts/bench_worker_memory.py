@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Benchmark: per-worker memory of question pools preloaded before fork, comparing
+cached ORM instances with the compact pools used by exams.papers.
+
+Each mode runs in its own process acting as a preloading master: it loads the
+pools, freezes the GC and forks workers that then build papers. Private RSS
+(memory no longer shared with the master) is read from /proc, so this only
+runs on Linux.
+
+Run: python scripts/bench_worker_memory.py [--questions-per-section 2000] [--workers 4]
+"""
+
+import argparse
+import gc
+import os
+import random
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from bench_common import setup_benchmark_database, create_benchmark_exam
+
+MODES = ['orm', 'compact']
+
+
+def memory_kib():
+    """(rss, private) of this process in KiB"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values['Rss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def load_orm(sections):
+    from exams.models import Question
+
+    return {
+        section.id: list(Question.objects.filter(section=section, is_active=True).prefetch_related('options').order_by('id'))
+        for section in sections
+    }
+
+
+def orm_paper(questions, seed, count):
+    rng = random.Random(seed)
+    return [
+        {
+            'id': question.id,
+            'text': question.question_text,
+            'points': question.points,
+            'negative_points': question.negative_points,
+            'options': [
+                {'id': option.id, 'letter': option.option_letter, 'text': option.option_text}
+                for option in question.options.all()
+            ],
+        }
+        for question in rng.sample(questions, count)
+    ]
+
+
+def run_mode(mode, questions_per_section, workers, papers, per_paper):
+    setup_benchmark_database()
+    exam = create_benchmark_exam(questions_per_section=questions_per_section)
+    sections = list(exam.sections.all())
+    for section in sections:
+        section.questions_per_paper = per_paper
+
+    started = time.perf_counter()
+    if mode == 'orm':
+        cache = load_orm(sections)
+    else:
+        from exams.papers import build_attempt_paper, warm_up
+        warm_up()
+    load_ms = (time.perf_counter() - started) * 1000
+    gc.collect()
+    gc.freeze()
+    master_rss, _ = memory_kib()
+
+    results = []
+    for worker in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _, startup_private = memory_kib()
+            for number in range(papers):
+                section = sections[number % len(sections)]
+                if mode == 'orm':
+                    orm_paper(cache[section.id], number, per_paper)
+                else:
+                    build_attempt_paper(SimpleNamespace(bank_version_id=None, paper_seed=number + 1), section)
+            _, steady_private = memory_kib()
+            os.write(write_fd, f'{startup_private} {steady_private}'.encode())
+            os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as reader:
+            results.append(tuple(map(int, reader.read().split())))
+        os.waitpid(pid, 0)
+
+    startup = sum(result[0] for result in results) / len(results)
+    steady = sum(result[1] for result in results) / len(results)
+    print(f'{mode:<10}{load_ms:>10.0f}{master_rss / 1024:>14.1f}{startup / 1024:>16.1f}{steady / 1024:>16.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions-per-section', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--papers', type=int, default=300, help="Papers built by each worker")
+    parser.add_argument('--per-paper', type=int, default=40, help="Questions drawn per paper")
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.questions_per_section, args.workers, args.papers, args.per_paper)
+        return
+
+    print(f'{args.questions_per_section * 6} questions, {args.workers} workers, {args.papers} papers each')
+    print(f"{'pools':<10}{'load ms':>10}{'master MiB':>14}{'worker startup':>16}{'worker steady':>16}")
+    print(f"{'':<10}{'':>10}{'':>14}{'private MiB':>16}{'private MiB':>16}")
+    for mode in MODES:
+        subprocess.run([sys.executable, __file__, '--mode', mode] + sys.argv[1:], check=True)
+
+
+if __name__ == '__main__':
+    main()
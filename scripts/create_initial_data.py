@@ -12,7 +12,7 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uas_exam.settings')
 django.setup()
 
-from exams.models import ExamSection, Question, QuestionOption, MockExam, ExamConfiguration
+from exams.models import ExamSection, Question, QuestionOption, MockExam, MockExamSection, ExamConfiguration
 
 
 def create_exam_sections():
@@ -198,7 +198,12 @@ def create_mock_exam():
     )
     
     if created:
-        mock_exam.sections.set(sections)
+        # Sections are taken in the order they are listed in SECTION_CHOICES
+        order = [name for name, _ in ExamSection.SECTION_CHOICES]
+        MockExamSection.objects.bulk_create([
+            MockExamSection(exam=mock_exam, section=section, position=order.index(section.name))
+            for section in sections
+        ])
         print(f"Created mock exam: {mock_exam.name}")
     else:
         print(f"Mock exam already exists: {mock_exam.name}")
@@ -8,12 +8,14 @@ class ExamManager {
     this.answers = {}
     this.timeRemaining = 0
     this.timerInterval = null
-    this.autoSaveInterval = null
+    this.heartbeatTimeout = null
+    this.sectionId = document.querySelector("[data-section-id]")?.dataset.sectionId || null
     this.sectionName = ""
     this.bootstrap = window.bootstrap // Declare bootstrap variable
-    this.pendingAnswers = [] // Track pending answers for batch save
+    this.unsyncedChanges = new Map() // Latest change per question not yet acknowledged by the server
+    this.syncSeq = Number.parseInt(document.querySelector("[data-sync-ack]")?.dataset.syncAck || "0", 10)
+    this.syncInFlight = false
     this.lastSaveTime = Date.now()
-    this.saveInProgress = false
 
     this.init()
   }
@@ -22,9 +24,13 @@ class ExamManager {
     try {
       await this.loadQuestions()
       this.setupEventListeners()
+      // A revalidated (304) paper carries the time remaining from when it was cached
+      await this.sendHeartbeat()
       this.startTimer()
       this.startAutoSave()
-      this.displayQuestion(0)
+      // Resume at the question the candidate was last on
+      const savedIndex = Number.parseInt(document.querySelector("[data-question-index]")?.dataset.questionIndex || "0", 10)
+      this.displayQuestion(Math.min(savedIndex, this.questions.length - 1))
       this.updateQuestionNavigator()
 
       // Mark body as exam in progress
@@ -36,8 +42,14 @@ class ExamManager {
   }
 
   async loadQuestions() {
+    // Serve the paper from the cached exam bundle when possible
+    if (await this.loadQuestionsFromBundle()) {
+      return
+    }
+
     try {
-      const response = await fetch(`/exams/api/questions/${this.examId}/`)
+      // Revalidate with the server's ETag; an unchanged paper comes back as a 304
+      const response = await fetch(`/exams/api/questions/${this.examId}/`, { cache: "no-cache" })
       if (!response.ok) {
         throw new Error("Failed to load questions")
       }
@@ -47,18 +59,116 @@ class ExamManager {
       this.answers = data.existing_answers || {}
       this.timeRemaining = data.section.time_remaining
       this.sectionName = data.section.name
-
-      // Update section name in UI
-      const sectionNameElement = document.querySelector(".exam-title small")
-      if (sectionNameElement) {
-        sectionNameElement.textContent = this.sectionName
-      }
+      this.updateSectionName()
     } catch (error) {
       console.error("Error loading questions:", error)
       throw error
     }
   }
 
+  updateSectionName() {
+    const sectionNameElement = document.querySelector(".exam-title small")
+    if (sectionNameElement) {
+      sectionNameElement.textContent = this.sectionName
+    }
+  }
+
+  async loadQuestionsFromBundle() {
+    const root = document.querySelector("[data-exam-id]")
+    if (!root || !root.dataset.bundleVersion || !window.indexedDB || !window.crypto?.subtle) {
+      return false
+    }
+
+    try {
+      // One bundle per attempt; refetch only when the exam content changed
+      const cacheKey = `${this.examId}:${root.dataset.attemptId}`
+      let bundle = await this.readCachedBundle(cacheKey)
+      if (!bundle || bundle.version !== root.dataset.bundleVersion) {
+        const response = await fetch(`/exams/api/bundle/${this.examId}/`, { cache: "no-cache" })
+        if (!response.ok) {
+          return false
+        }
+        bundle = await response.json()
+        await this.writeCachedBundle(cacheKey, bundle)
+      }
+
+      const section = bundle.sections.find((s) => String(s.id) === root.dataset.sectionId)
+      if (!section || section.status === "completed") {
+        return false
+      }
+
+      const existingAnswers = document.getElementById("existingAnswers")
+      this.questions =
+        section.status === "locked" ? await this.decryptSection(section, root.dataset.sectionKey) : section.questions
+      this.answers = existingAnswers ? JSON.parse(existingAnswers.textContent) : {}
+      this.timeRemaining = section.duration_minutes * 60 // Corrected by the server sync in init()
+      this.sectionName = section.name
+      this.updateSectionName()
+      return true
+    } catch (error) {
+      console.error("Falling back to per-section question fetch:", error)
+      return false
+    }
+  }
+
+  openBundleStore() {
+    return new Promise((resolve, reject) => {
+      const request = indexedDB.open("uas-exam", 1)
+      request.onupgradeneeded = () => request.result.createObjectStore("bundles")
+      request.onsuccess = () => resolve(request.result)
+      request.onerror = () => reject(request.error)
+    })
+  }
+
+  async readCachedBundle(key) {
+    const db = await this.openBundleStore()
+    return new Promise((resolve, reject) => {
+      const request = db.transaction("bundles").objectStore("bundles").get(key)
+      request.onsuccess = () => resolve(request.result)
+      request.onerror = () => reject(request.error)
+    })
+  }
+
+  async writeCachedBundle(key, bundle) {
+    const db = await this.openBundleStore()
+    return new Promise((resolve, reject) => {
+      const transaction = db.transaction("bundles", "readwrite")
+      const store = transaction.objectStore("bundles")
+      store.clear() // Bundles of earlier attempts are never needed again
+      store.put(bundle, key)
+      transaction.oncomplete = () => resolve()
+      transaction.onerror = () => reject(transaction.error)
+    })
+  }
+
+  async decryptSection(section, keyHex) {
+    // HMAC-SHA256 counter-mode keystream, mirrored by exams/bundle.py
+    const hexToBytes = (hex) => new Uint8Array(hex.match(/../g).map((byte) => Number.parseInt(byte, 16)))
+    const key = await crypto.subtle.importKey("raw", hexToBytes(keyHex), { name: "HMAC", hash: "SHA-256" }, false, [
+      "sign",
+    ])
+    const nonce = hexToBytes(section.nonce)
+    const data = Uint8Array.from(atob(section.ciphertext), (c) => c.charCodeAt(0))
+
+    const blocks = await Promise.all(
+      Array.from({ length: Math.ceil(data.length / 32) }, (_, counter) => {
+        const message = new Uint8Array(nonce.length + 4)
+        message.set(nonce)
+        new DataView(message.buffer).setUint32(nonce.length, counter)
+        return crypto.subtle.sign("HMAC", key, message)
+      }),
+    )
+    blocks.forEach((block, counter) => {
+      const pad = new Uint8Array(block)
+      for (let i = 0; i < pad.length && counter * 32 + i < data.length; i++) {
+        data[counter * 32 + i] ^= pad[i]
+      }
+    })
+
+    const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream("deflate"))
+    return JSON.parse(await new Response(stream).text())
+  }
+
   displayQuestion(index) {
     if (index < 0 || index >= this.questions.length) return
 
@@ -83,7 +193,8 @@ class ExamManager {
         optionElement.setAttribute("data-question", question.id)
         optionElement.setAttribute("data-option", option.id)
 
-        if (this.answers[question.id] === option.letter) {
+        // Answers are tracked by option id; letters only reflect this attempt's option order
+        if (this.answers[question.id] === option.id) {
           optionElement.classList.add("selected")
         }
 
@@ -113,7 +224,7 @@ class ExamManager {
 
   async selectOption(questionId, optionId, optionLetter) {
     // Update local state
-    this.answers[questionId] = optionLetter
+    this.answers[questionId] = optionId
 
     // Update visual selection
     const questionOptions = document.querySelectorAll(`[data-question="${questionId}"]`)
@@ -124,48 +235,74 @@ class ExamManager {
       selectedOption.classList.add("selected")
     }
 
-    this.pendingAnswers.push({
-      question_id: questionId,
-      option_id: optionId,
-    })
+    // Update navigator
+    this.updateQuestionNavigator()
 
-    // Show saving indicator
+    // Save answer to server
+    this.queueAnswerChange(questionId, optionId)
+  }
+
+  queueAnswerChange(questionId, optionId) {
+    // Every change gets the next sequence number; the server applies each sequence once
+    this.syncSeq++
+    this.unsyncedChanges.set(questionId, { question_id: questionId, option_id: optionId, seq: this.syncSeq })
     this.showAutoSaveIndicator("saving")
+    this.syncAnswers()
+  }
 
-    // Save answer to server
-    try {
-      await this.saveAnswer(questionId, optionId)
-    } catch (error) {
-      console.error("Failed to save answer:", error)
+  buildSyncPayload() {
+    return {
+      seq: this.syncSeq,
+      changes: Array.from(this.unsyncedChanges.values(), ({ question_id, option_id }) => ({ question_id, option_id })),
     }
+  }
 
-    // Update navigator
-    this.updateQuestionNavigator()
+  acknowledgeChanges(ack) {
+    this.syncSeq = Math.max(this.syncSeq, ack)
+    for (const [questionId, change] of this.unsyncedChanges) {
+      if (change.seq <= ack) {
+        this.unsyncedChanges.delete(questionId)
+      }
+    }
   }
 
-  async saveAnswer(questionId, optionId) {
+  async syncAnswers() {
+    if (this.syncInFlight || this.unsyncedChanges.size === 0) {
+      return
+    }
+
+    this.syncInFlight = true
+    let synced = false
+
     try {
-      const response = await fetch("/exams/api/save-answer/", {
+      const response = await fetch(`/exams/api/sync-answers/${this.examId}/`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          "X-CSRFToken": this.getCSRFToken(),
         },
-        body: JSON.stringify({
-          question_id: questionId,
-          option_id: optionId,
-        }),
+        body: JSON.stringify(this.buildSyncPayload()),
       })
 
       if (!response.ok) {
-        throw new Error("Failed to save answer")
+        throw new Error("Failed to sync answers")
       }
 
       const data = await response.json()
-      console.log("Answer saved:", data)
+      this.acknowledgeChanges(data.ack)
+      this.lastSaveTime = Date.now()
+      this.showAutoSaveIndicator("saved")
+      synced = true
     } catch (error) {
-      console.error("Error saving answer:", error)
-      // Show user-friendly error message
-      this.showNotification("Failed to save answer. Please try again.", "error")
+      console.error("Error syncing answers:", error)
+      this.showAutoSaveIndicator("error")
+    } finally {
+      this.syncInFlight = false
+    }
+
+    // Changes made while the request was in flight go out in the next batch
+    if (synced && this.unsyncedChanges.size > 0) {
+      await this.syncAnswers()
     }
   }
 
@@ -226,11 +363,6 @@ class ExamManager {
 
       this.timeRemaining--
       this.updateTimerDisplay()
-
-      // Check server time every minute
-      if (this.timeRemaining % 60 === 0) {
-        await this.syncTimeWithServer()
-      }
     }, 1000)
   }
 
@@ -266,90 +398,79 @@ class ExamManager {
     }
   }
 
-  async syncTimeWithServer() {
+  async sendHeartbeat() {
+    // One round-trip syncs answers and progress, corrects the timer and reports forced transitions
+    clearTimeout(this.heartbeatTimeout)
+    let nextPoll = 30
+
     try {
-      const response = await fetch(`/exams/api/time-remaining/${this.examId}/`)
+      const payload = {
+        ...this.buildSyncPayload(),
+        current_question_index: this.currentQuestionIndex,
+        section_id: this.sectionId,
+      }
+      const response = await fetch(`/exams/api/heartbeat/${this.examId}/`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          "X-CSRFToken": this.getCSRFToken(),
+        },
+        body: JSON.stringify(payload),
+      })
+
       if (response.ok) {
         const data = await response.json()
+        if (!data.active) {
+          this.cleanup()
+          window.location.href = `/exams/results/${this.examId}/`
+          return
+        }
+
+        if (payload.changes.length > 0) {
+          this.acknowledgeChanges(data.ack)
+          this.lastSaveTime = Date.now()
+        }
         this.timeRemaining = data.time_remaining
+        nextPoll = data.next_poll
 
         if (data.auto_submit) {
           await this.autoSubmitSection()
+          return
+        }
+        if (data.section_changed) {
+          // The section moved on elsewhere (another tab or a server-side transition)
+          this.cleanup()
+          window.location.href = `/exams/take/${this.examId}/`
+          return
         }
       }
     } catch (error) {
-      console.error("Failed to sync time with server:", error)
+      console.error("Heartbeat failed:", error)
     }
+
+    this.heartbeatTimeout = setTimeout(() => this.sendHeartbeat(), nextPoll * 1000)
   }
 
   startAutoSave() {
-    // Auto-save every 15 seconds (more frequent)
-    this.autoSaveInterval = setInterval(async () => {
-      await this.performAutoSave()
-    }, 15000)
-
     // Also save on page visibility change (user switching tabs/minimizing)
     document.addEventListener("visibilitychange", () => {
       if (document.hidden) {
-        this.performAutoSave()
+        this.sendHeartbeat()
       }
     })
 
     // Save before page unload
     window.addEventListener("beforeunload", (e) => {
-      if (this.pendingAnswers.length > 0) {
-        // Synchronous save for page unload
-        navigator.sendBeacon(
-          "/exams/api/auto-save/",
-          JSON.stringify({
-            answers: this.pendingAnswers,
-            current_question_index: this.currentQuestionIndex,
-          }),
-        )
+      if (this.unsyncedChanges.size > 0) {
+        // Beacons cannot set headers, so the CSRF token travels as a form field
+        const form = new FormData()
+        form.append("csrfmiddlewaretoken", this.getCSRFToken())
+        form.append("payload", JSON.stringify(this.buildSyncPayload()))
+        navigator.sendBeacon(`/exams/api/sync-answers/${this.examId}/`, form)
       }
     })
   }
 
-  async performAutoSave() {
-    if (this.saveInProgress || this.pendingAnswers.length === 0) {
-      return
-    }
-
-    this.saveInProgress = true
-
-    try {
-      const response = await fetch("/exams/api/auto-save/", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "X-CSRFToken": this.getCSRFToken(),
-        },
-        body: JSON.stringify({
-          answers: this.pendingAnswers,
-          current_question_index: this.currentQuestionIndex,
-        }),
-      })
-
-      if (response.ok) {
-        const data = await response.json()
-        if (data.success) {
-          this.pendingAnswers = [] // Clear saved answers
-          this.lastSaveTime = Date.now()
-          this.showAutoSaveIndicator("saved")
-        } else {
-          this.showAutoSaveIndicator("error")
-        }
-      } else {
-        this.showAutoSaveIndicator("error")
-      }
-    } catch (error) {
-      console.error("Auto-save failed:", error)
-      this.showAutoSaveIndicator("error")
-    } finally {
-      this.saveInProgress = false
-    }
-  }
-
   showAutoSaveIndicator(status) {
     const indicator = document.getElementById("autoSaveIndicator")
     if (!indicator) return
@@ -387,13 +508,13 @@ class ExamManager {
 
   async autoSubmitSection() {
     clearInterval(this.timerInterval)
-    clearInterval(this.autoSaveInterval)
+    clearTimeout(this.heartbeatTimeout)
 
     this.showNotification("Time is up! Section will be automatically submitted.", "warning")
 
-    // Submit section
+    // Submit section (submit_section only accepts POST)
     setTimeout(() => {
-      window.location.href = `/exams/submit-section/${this.examId}/`
+      this.submitSection()
     }, 2000)
   }
 
@@ -497,6 +618,8 @@ class ExamManager {
     if (currentQuestion) {
       delete this.answers[currentQuestion.id]
       this.displayQuestion(this.currentQuestionIndex)
+      this.updateQuestionNavigator()
+      this.queueAnswerChange(currentQuestion.id, null)
     }
   }
 
@@ -536,7 +659,7 @@ class ExamManager {
   submitSection() {
     // Clear intervals
     clearInterval(this.timerInterval)
-    clearInterval(this.autoSaveInterval)
+    clearTimeout(this.heartbeatTimeout)
 
     // Remove exam in progress class
     document.body.classList.remove("exam-in-progress")
@@ -584,18 +707,18 @@ class ExamManager {
     if (this.timerInterval) {
       clearInterval(this.timerInterval)
     }
-    if (this.autoSaveInterval) {
-      clearInterval(this.autoSaveInterval)
+    if (this.heartbeatTimeout) {
+      clearTimeout(this.heartbeatTimeout)
     }
     document.body.classList.remove("exam-in-progress")
   }
 
   async checkSessionRecovery() {
     try {
-      const response = await fetch(`/exams/api/session-status/${this.examId}/`)
+      const response = await fetch(`/exams/api/session-status/${this.examId}/`, { cache: "no-cache" })
       if (response.ok) {
         const data = await response.json()
-        if (data.session_exists && data.can_resume) {
+        if (data.session_exists && data.can_resume && data.interrupted) {
           const shouldRecover = confirm(
             `You have an interrupted exam session for "${data.exam_name}". ` +
               `You were in section "${data.current_section}" with ${data.completed_sections}/${data.total_sections} sections completed. ` +
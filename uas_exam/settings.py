@@ -30,20 +30,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'exams.tracing.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'exams.middleware.QueryBudgetMiddleware',
+    'exams.middleware.ExamAPIGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'exams.middleware.ReplicaRoutingMiddleware',
+    'exams.middleware.ExamAPIThrottleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'exams.tracing.TraceViewMiddleware',
 ]
 
 ROOT_URLCONF = 'uas_exam.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'exams.tracing.TracedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,9 +70,71 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,  # seconds a writer waits for the lock before "database is locked"
+        },
+        'CONN_MAX_AGE': 600,  # keep connections (and their PRAGMAs) across requests
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Applied to every new SQLite connection (exams/signals.py). WAL lets readers run alongside the single
+# writer; synchronous=NORMAL only syncs at checkpoints, which is safe from corruption in WAL mode
+EXAM_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -32000,  # KiB
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
+
+# Group commit of answer writes between threads of a worker (exams/writequeue.py); use with GUNICORN_THREADS > 1
+EXAM_ANSWER_WRITE_QUEUE = False
+EXAM_WRITE_QUEUE_MAX_BATCH = 200  # writes per transaction
+
+# Write-behind answer journal (exams/journal.py): save_answer appends to a per-node file and returns,
+# workers flush it to the database in batches. Point the directory at local disk shared by the node's workers
+EXAM_ANSWER_JOURNAL = False
+EXAM_ANSWER_JOURNAL_DIR = BASE_DIR / 'var' / 'journal'
+EXAM_ANSWER_JOURNAL_FSYNC = False  # fsync every append: survives power loss, costs a disk flush per answer
+EXAM_ANSWER_JOURNAL_FLUSH_INTERVAL = 1.0  # seconds between background flushes (0: only at scoring and startup)
+
+# Attempts pinned to a published bank keep each section's answers as one byte per question instead of
+# UserAnswer rows (exams/packed.py); convert completed sections with manage.py pack_answers
+EXAM_PACKED_ANSWERS = False
+
+# Cold storage of old completed attempts (exams/archive.py), moved by manage.py archive_attempts
+EXAM_ARCHIVE_DIR = BASE_DIR / 'var' / 'archive'
+EXAM_ARCHIVE_AFTER_DAYS = 180  # default --older-than
+EXAM_ARCHIVE_CHUNK_ATTEMPTS = 5000  # attempts per compressed chunk file
+
+# Optional read replica for results, admin lists and analytics (see exams/routers.py). To try it locally
+# with two files, set EXAM_REPLICA_DB=db-replica.sqlite3 and copy the primary over with manage.py sync_replica
+if os.environ.get('EXAM_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': os.environ.get('EXAM_REPLICA_ENGINE', DATABASES['default']['ENGINE']),
+        'NAME': os.environ['EXAM_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['exams.routers.ReplicaRouter']
+EXAM_REPLICA_ALIAS = 'replica'
+EXAM_REPLICA_APPS = ['exams']  # apps whose models are read from the replica
+EXAM_READ_YOUR_WRITES_SECONDS = 30  # a client that wrote reads from the primary this long
+EXAM_REPLICA_VIEWS = [
+    'exams:results',
+    'admin:exams_examattempt_changelist',
+    'admin:exams_sectionattempt_changelist',
+    'admin:exams_useranswer_changelist',
+    'admin:exams_questionbankversion_changelist',
+]
+
+# Authentication backends (exam-day access codes skip password hashing)
+AUTHENTICATION_BACKENDS = [
+    'django.contrib.auth.backends.ModelBackend',
+    'accounts.backends.ExamAccessCodeBackend',
+]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -112,6 +180,75 @@ LOGOUT_REDIRECT_URL = '/'
 SESSION_COOKIE_AGE = 7200  # 2 hours
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
+# Exam API settings
+EXAM_API_PATH_PREFIX = '/exams/api/'
+EXAM_API_GZIP_MIN_LENGTH = 1024  # bytes; smaller JSON bodies are sent uncompressed
+EXAM_ACTIVITY_FLUSH_INTERVAL = 60  # seconds between background bulk writes of buffered activity (0: write at once)
+EXAM_SESSION_INTERRUPTED_AFTER = 120  # seconds without activity before offering recovery
+EXAM_HEARTBEAT_INTERVAL = 30  # seconds between client heartbeats (shortened near the deadline)
+EXAM_SECTION_PLAN_TTL = 60  # seconds a worker keeps a mock exam's section order in memory
+EXAM_BANK_STORE_DIR = BASE_DIR / 'var' / 'banks'  # compiled question-bank files, mapped by every worker
+EXAM_ADMISSION_WINDOW = 10  # seconds between waiting-room polls
+EXAM_ADMISSION_LEASE = 300  # seconds an admission slot outlives the candidate's last heartbeat
+EXAM_ADMISSION_CACHE = 'default'  # must be shared by every worker (Memcached, Redis)
+EXAM_ADMISSION_ALLOW_LOCAL_CACHE = DEBUG  # allow a local-memory admission cache (single worker process only)
+
+# Exam API rate limits per URL name in exams/urls.py: (requests per minute, burst)
+EXAM_RATE_LIMIT_CACHE = 'default'  # point at a shared cache to limit across workers
+EXAM_API_RATE_LIMITS = {
+    'get_questions': (30, 10),
+    'get_exam_bundle': (10, 5),
+    'save_answer': (120, 30),
+    'sync_answers': (120, 30),
+    'auto_save_progress': (12, 6),
+    'check_time_remaining': (12, 6),
+    'exam_heartbeat': (20, 10),
+    'get_session_status': (12, 6),
+    'admission_queue_status': (30, 10),
+}
+
+# Load shedding: refuse low-priority endpoints while the exam API p99 is above the threshold
+EXAM_LOAD_SHED_P99_MS = 1500
+EXAM_LOAD_SHED_RETRY_AFTER = 30  # seconds
+EXAM_API_LOW_PRIORITY = ['get_session_status', 'check_time_remaining']
+
+# Query budgets: max SQL statements per request by URL name, and repeats of one statement shape from one
+# call site (N+1). Checked by QueryBudgetMiddleware while enforced; turn both flags on in tests.
+EXAM_QUERY_BUDGET_ENFORCE = DEBUG
+EXAM_QUERY_BUDGET_RAISE = False  # raise QueryBudgetExceeded instead of only logging in DEBUG
+EXAM_QUERY_BUDGET_REPEATS = 3
+EXAM_QUERY_BUDGETS = {
+    'exams:exam_list': 8,
+    'exams:start_exam': 12,
+    'exams:take_exam': 18,
+    'exams:get_questions': 10,
+    'exams:save_answer': 14,  # its row-locking transaction is a savepoint pair when nested (tests, group commit)
+    'exams:submit_section': 16,
+    'exams:results': 8,
+    'admin:exams_examsection_changelist': 10,
+    'admin:exams_question_changelist': 10,
+    'admin:exams_mockexam_changelist': 12,
+    'admin:exams_mockexam_change': 15,
+    'admin:exams_examattempt_changelist': 10,
+    'admin:exams_examattempt_change': 16,
+    'admin:exams_sectionattempt_changelist': 10,
+    'admin:exams_useranswer_changelist': 10,
+}
+
+# Request tracing to local JSONL files (see exams/tracing.py); summarise with manage.py trace_report.
+# Every request pays for its spans, sampled or not, so only turn it on while investigating.
+EXAM_TRACING = False
+EXAM_TRACE_SAMPLE_RATE = 0.01  # share of ordinary requests written
+EXAM_TRACE_SLOW_MS = 1000  # requests at least this slow are always written
+EXAM_TRACE_MAX_SPANS = 2000  # per request; later spans are counted as dropped
+EXAM_TRACE_DIR = BASE_DIR / 'var' / 'traces'
+
+# Background tasks stored in the database and run by manage.py run_tasks (see exams/tasks.py)
+EXAM_TASK_MAX_ATTEMPTS = 3
+EXAM_TASK_RETRY_DELAY = 5  # seconds before the first retry; doubled for each further attempt
+EXAM_TASK_STALE_AFTER = 300  # seconds a task may stay running before it is queued again
+EXAM_DEFER_SCORING = False  # score submitted sections and exams in run_tasks instead of the request
+
 # Jazzmin admin configuration
 JAZZMIN_SETTINGS = {
     # Title of the window (Will default to current_admin_site.site_title if absent or None)